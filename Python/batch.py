@@ -0,0 +1,371 @@
+"""Command line batch fitting of LG4X-V2.
+
+Applies one .dat preset to every spectrum of a directory (or glob pattern) and writes the usual _fit.txt and
+_fit.csv files. The spectra are fitted in parallel in a process pool, no GUI is needed. With --series the spectra
+are fitted one after the other instead, each fit starting from the result of the previous spectrum.
+
+Usage:
+    lg4x-batch PRESET INPUT [INPUT ...] [-o OUTPUT_DIR] [-j WORKERS] [--mode {fit,eva}] [--fixed-bg] [--series]
+               [--summary SUMMARY] [--fft-tougaard] [--no-jacobian]
+"""
+import argparse
+import configparser
+import glob
+import logging
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# the modules of LG4X-V2 import each other by their plain names
+script_directory = os.path.dirname(os.path.abspath(__file__))
+if script_directory not in sys.path:
+    sys.path.insert(0, script_directory)
+
+from fit_engine import (
+    load_preset,
+    fit_spectrum,
+    fit_series,
+    fit_text,
+    write_fit_csv,
+    result_row,
+    component_results,
+    result_export,
+    ResultsStore,
+)
+from spectrum_io import load_spectrum
+from version import __version__
+
+config_file_path = os.path.join(script_directory, "../config/config.ini")
+# the [Import] settings of config/config.ini, used if the config file is missing (it is not installed with pip)
+default_import_settings = {
+    "separator": ",",
+    "columns": "[0, 1]",
+    "header_row": "1",
+    "has_header": "True",
+    "remember_settings": "True",
+}
+
+
+def read_config():
+    """Read the config of LG4X-V2, the [Import] section falls back to the default settings if it is missing.
+
+    Returns:
+        configparser.ConfigParser: The config with an [Import] section.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file_path)
+    if not config.has_section("Import"):
+        config.read_dict({"Import": default_import_settings})
+    return config
+
+
+def collect_files(inputs):
+    """Collect the spectra to fit.
+
+    Args:
+        inputs (list): Directories, glob patterns or file paths. Directories are searched for .csv and .txt files
+            like the directory import of the GUI, exported _fit.csv/_fit.txt files are skipped.
+
+    Returns:
+        list: Absolute paths of the spectra, without duplicates.
+    """
+    files = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            entries = os.listdir(entry)
+            entries.sort(key=lambda x: (os.path.splitext(x)[1] != ".txt", x))
+            files += [
+                os.path.join(entry, name)
+                for name in entries
+                if os.path.splitext(name)[1] in [".csv", ".txt"]
+            ]
+        else:
+            files += sorted(glob.glob(entry)) if glob.has_magic(entry) else [entry]
+    files = [
+        os.path.abspath(path)
+        for path in files
+        if not os.path.splitext(path)[0].endswith("_fit")
+    ]
+    return list(dict.fromkeys(files))
+
+
+def write_results(filepath, res, output_dir, rows_lightened=1):
+    """Write the _fit.txt and _fit.csv files of a fit.
+
+    Args:
+        filepath (str): Path of the spectrum.
+        res (fit_engine.FitOutput): The fit result.
+        output_dir (str): Directory of the output files, the directory of the spectrum if None.
+        rows_lightened (int, optional): Number of rows which were combined into one data point. Default is 1.
+    """
+    meta_result_export = result_export(component_results(res.out, res.x, res.pre, res.metrics), res.pre)
+    if output_dir is None:
+        output_dir = os.path.dirname(filepath)
+    savename = os.path.join(
+        output_dir, os.path.splitext(os.path.basename(filepath))[0]
+    )
+    Text = fit_text(
+        "LG4X: LMFit GUI for XPS curve fitting v{}".format(__version__),
+        os.path.basename(filepath),
+        res.pre,
+        res.out,
+        res.out.init_params,
+        meta_result_export,
+    )
+    with open(savename + "_fit.txt", "w") as file:
+        file.write(Text)
+    write_fit_csv(savename + "_fit.csv", res.result, rows_lightened)
+
+
+def fit_file(filepath, pre, output_dir, mode="fit", fixed_bg=False, tougaard_fft=False, jacobian=True):
+    """Fit one spectrum and write its _fit.txt and _fit.csv files.
+
+    Runs in the worker processes, therefore errors are returned instead of raised.
+
+    Args:
+        filepath (str): Path of the spectrum.
+        pre (list): The preset list.
+        output_dir (str): Directory of the output files, the directory of the spectrum if None.
+        mode (str, optional): 'fit' or 'eva'. Default is 'fit'.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT. Default is False.
+        jacobian (bool, optional): Fit with the analytic Jacobian instead of finite differences. Default is True.
+
+    Returns:
+        tuple: (filepath, row, error) with the results row (see fit_engine.result_row) and error None on success.
+    """
+    try:
+        config = read_config()
+        x, y, rows_lightened = load_spectrum(filepath, config)
+        res = fit_spectrum(
+            x,
+            y,
+            pre,
+            mode=mode,
+            rows_lightened=rows_lightened,
+            fixed_bg=fixed_bg,
+            tougaard_fft=tougaard_fft,
+            jacobian=jacobian,
+        )
+        write_results(filepath, res, output_dir, rows_lightened)
+        logging.debug(f"Fit profile of {filepath}: {res.profile.to_json()}")
+        return filepath, result_row(filepath, res.out, res.metrics), None
+    except Exception:
+        return filepath, None, traceback.format_exc()
+
+
+def fit_files_in_series(
+    files, pre, output_dir, fixed_bg=False, store=None, tougaard_fft=False, jacobian=True
+):
+    """Fit the spectra one after the other in the given order, each fit starts from the previous result.
+
+    Args:
+        files (list): Paths of the spectra, in the order of the series.
+        pre (list): The preset list of the first fit.
+        output_dir (str): Directory of the output files, the directory of each spectrum if None.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT. Default is False.
+        store (fit_engine.ResultsStore, optional): Collects the results of the fits.
+        jacobian (bool, optional): Fit with the analytic Jacobian instead of finite differences. Default is True.
+
+    Returns:
+        int: Number of spectra which could not be read or fitted.
+    """
+    config = read_config()
+    loaded = []
+    failed = 0
+    for filepath in files:
+        try:
+            loaded.append((filepath, load_spectrum(filepath, config)))
+        except Exception:
+            failed += 1
+            logging.error(f"{filepath} could not be read:\n{traceback.format_exc()}")
+    spectra = [spectrum for filepath, spectrum in loaded]
+    for n, res, error in fit_series(
+        spectra, pre, fixed_bg=fixed_bg, tougaard_fft=tougaard_fft, jacobian=jacobian
+    ):
+        filepath, (x, y, rows_lightened) = loaded[n]
+        if error is None:
+            try:
+                write_results(filepath, res, output_dir, rows_lightened)
+            except OSError:
+                error = traceback.format_exc()
+        if error is None:
+            if store is not None:
+                store.add(filepath, res.out, res.metrics)
+            logging.info(
+                f"[{n + 1}/{len(loaded)}] {filepath}: r chi-sqr = {res.out.redchi:.4g}, "
+                f"# func evals = {res.out.nfev}"
+            )
+            logging.debug(f"Fit profile of {filepath}: {res.profile.to_json()}")
+        else:
+            failed += 1
+            logging.error(f"[{n + 1}/{len(loaded)}] {filepath} failed:\n{error}")
+    return failed
+
+
+def fit_files_in_parallel(
+    files,
+    pre,
+    output_dir,
+    mode="fit",
+    fixed_bg=False,
+    workers=None,
+    store=None,
+    tougaard_fft=False,
+    jacobian=True,
+):
+    """Fit the spectra in parallel in a process pool.
+
+    Args:
+        files (list): Paths of the spectra.
+        pre (list): The preset list.
+        output_dir (str): Directory of the output files, the directory of each spectrum if None.
+        mode (str, optional): 'fit' or 'eva'. Default is 'fit'.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT. Default is False.
+        workers (int, optional): Number of worker processes, the number of CPUs if None.
+        store (fit_engine.ResultsStore, optional): Collects the results of the fits.
+        jacobian (bool, optional): Fit with the analytic Jacobian instead of finite differences. Default is True.
+
+    Returns:
+        int: Number of spectra which could not be read or fitted.
+    """
+    failed = 0
+    rows = dict()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                fit_file, filepath, pre, output_dir, mode, fixed_bg, tougaard_fft, jacobian
+            )
+            for filepath in files
+        ]
+        for n, future in enumerate(as_completed(futures), start=1):
+            filepath, row, error = future.result()
+            if error is None:
+                rows[filepath] = row
+                logging.info(
+                    f"[{n}/{len(files)}] {filepath}: r chi-sqr = {row['redchi']:.4g}"
+                )
+            else:
+                failed += 1
+                logging.error(f"[{n}/{len(files)}] {filepath} failed:\n{error}")
+    if store is not None:
+        # rows in the order of the files, not in the order the fits finished
+        for filepath in files:
+            if filepath in rows:
+                store.add_row(rows[filepath])
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="lg4x-batch",
+        description="Fit all spectra of a directory or glob pattern with one LG4X-V2 preset.",
+    )
+    parser.add_argument("preset", help="preset file (.dat) saved from LG4X-V2")
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="directories, glob patterns (e.g. 'data/*.csv') or files to fit",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=None,
+        help="directory for the _fit.txt/_fit.csv files (default: next to each spectrum)",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["fit", "eva"],
+        default="fit",
+        help="fit the spectra or only evaluate the preset (default: fit)",
+    )
+    parser.add_argument(
+        "--fixed-bg", action="store_true", help="keep all background parameters fixed"
+    )
+    parser.add_argument(
+        "--series",
+        action="store_true",
+        help="fit the spectra one after the other in the given order, each fit starts from the result of the "
+        "previous spectrum (e.g. depth profiles or temperature series)",
+    )
+    parser.add_argument(
+        "--fft-tougaard",
+        action="store_true",
+        help="calculate the Tougaard backgrounds by FFT, much faster for wide energy ranges",
+    )
+    parser.add_argument(
+        "--no-jacobian",
+        dest="jacobian",
+        action="store_false",
+        help="fit with finite differences instead of the analytic derivatives of the peak shapes",
+    )
+    parser.add_argument(
+        "--summary",
+        default=None,
+        help="write the results of all spectra to one table, one row per spectrum; the format is chosen by the "
+        "extension: .csv, .parquet or .feather (the latter two need pyarrow)",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    try:
+        pre = load_preset(args.preset)
+    except (OSError, ValueError, SyntaxError) as e:
+        logging.error(f"Could not load preset {args.preset}: {e}")
+        return 2
+    files = collect_files(args.inputs)
+    if len(files) == 0:
+        logging.error("No spectra found.")
+        return 2
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    store = ResultsStore()
+    if args.series:
+        if args.mode != "fit":
+            logging.error("--series can only be used with --mode fit.")
+            return 2
+        failed = fit_files_in_series(
+            files,
+            pre,
+            args.output_dir,
+            args.fixed_bg,
+            store=store,
+            tougaard_fft=args.fft_tougaard,
+            jacobian=args.jacobian,
+        )
+    else:
+        failed = fit_files_in_parallel(
+            files,
+            pre,
+            args.output_dir,
+            args.mode,
+            args.fixed_bg,
+            workers=args.workers,
+            store=store,
+            tougaard_fft=args.fft_tougaard,
+            jacobian=args.jacobian,
+        )
+    logging.info(f"{len(files) - failed} of {len(files)} spectra fitted.")
+    if args.summary is not None:
+        try:
+            store.export(args.summary)
+        except (ImportError, ValueError, OSError) as e:
+            logging.error(f"Could not write the summary {args.summary}: {e}")
+            return 2
+        logging.info(f"Summary of {len(store)} spectra written to {args.summary}.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
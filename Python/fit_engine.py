@@ -0,0 +1,3574 @@
+"""Headless fit engine of LG4X-V2.
+
+Builds the lmfit model from a preset list (the same nested list which is stored in the .dat preset files), runs
+the fit and prepares the component curves and areas. Nothing in here depends on Qt, so the engine can be used
+without a QApplication, e.g. for batch fitting on compute nodes.
+"""
+import ast
+import copy
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import operator
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from scipy import integrate, signal
+from scipy.special import wofz
+from lmfit import Model, lineshapes
+from lmfit.model import CompositeModel
+from lmfit.models import (
+    ExponentialGaussianModel,
+    SkewedGaussianModel,
+    SkewedVoigtModel,
+    DoniachModel,
+    BreitWignerModel,
+    LognormalModel,
+)
+from lmfit.models import (
+    GaussianModel,
+    LorentzianModel,
+    VoigtModel,
+    PseudoVoigtModel,
+    PolynomialModel,
+    StepModel,
+)
+from lmfitxps.models import (
+    ConvGaussianDoniachDublett,
+    ConvGaussianDoniachSinglett,
+    FermiEdgeModel,
+    TougaardBG,
+    ShirleyBG,
+    SlopeBG,
+)
+import lmfitxps.backgrounds as xpy
+import lmfitxps.lineshapes as xps_lineshapes
+
+list_shape = [
+    "g: Gaussian",
+    "l: Lorentzian",
+    "v: Voigt",
+    "p: PseudoVoigt",
+    "e: ExponentialGaussian",
+    "s: SkewedGaussian",
+    "a: SkewedVoigt",
+    "b: BreitWigner",
+    "n: Lognormal",
+    "d: Doniach",
+    "gdd: Convolution Gaussian/Doniach-Dublett",
+    "gds: Convolution Gaussian/Doniach-Singlett",
+    "fe:Convolution FermiDirac/Gaussian",
+]
+
+
+def model_selector(index: int, strind: str, index_pk: int):
+    """
+    Returns a model based on the index parameter.
+
+    Args:
+        index (int): An integer index to select the model.
+        prefix (str): A string prefix to identify the model.
+        index_pk (int): An integer index to identify the peak.
+
+    Returns:
+        Model: A model selected based on the index parameter.
+    """
+    model_options = {
+        0: GaussianModel,
+        1: LorentzianModel,
+        2: VoigtModel,
+        3: PseudoVoigtModel,
+        4: ExponentialGaussianModel,
+        5: SkewedGaussianModel,
+        6: SkewedVoigtModel,
+        7: BreitWignerModel,
+        8: LognormalModel,
+        9: DoniachModel,
+        10: ConvGaussianDoniachDublett,
+        11: ConvGaussianDoniachSinglett,
+        12: FermiEdgeModel,
+    }
+
+    selected_model = model_options.get(index)
+
+    if selected_model is not None:
+        # only the selected model is instantiated
+        return selected_model(prefix=strind + str(index_pk + 1) + "_")
+    else:
+        raise ValueError(f"No model found for index {index}.")
+
+
+def fit_range(x, y, xmin, xmax):
+    """Crop a spectrum to the fit range.
+
+    The limits are found by binary search, so the energy axis has to be monotonic, either ascending (XAS in photon
+    energy scale, XPS in kinetic energy scale) or descending (XPS in binding energy scale).
+
+    Args:
+        x (numpy.ndarray): Energy axis.
+        y (numpy.ndarray): Intensities.
+        xmin (float): One limit of the fit range.
+        xmax (float): The other limit of the fit range.
+
+    Returns:
+        list: [xn, yn] the points with xmin <= x <= xmax. These are views of x and y, not copies.
+    """
+    if xmin > xmax:
+        xmin, xmax = xmax, xmin
+    if x[0] < x[-1]:
+        # XAS in photon energy scale or XPS in kinetic energy scale
+        lmidx = np.searchsorted(x, xmin, side="left")
+        rmidx = np.searchsorted(x, xmax, side="right")
+    else:
+        # XPS in binding energy scale, search in the reversed (ascending) view
+        x_ascending = x[::-1]
+        lmidx = len(x) - np.searchsorted(x_ascending, xmax, side="right")
+        rmidx = len(x) - np.searchsorted(x_ascending, xmin, side="left")
+    return [x[lmidx:rmidx], y[lmidx:rmidx]]
+
+
+class BackgroundCache:
+    """LRU cache of the static backgrounds.
+
+    The entries are keyed by a hash of the data (see data_digest) and the background parameters, therefore the cache
+    is shared by all spectra: evaluating or fitting a spectrum again with an unchanged fit range and unchanged
+    background parameters, e.g. while tuning the peaks, does not calculate the background again.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value of key or None, a hit marks the entry as recently used."""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Store a value, the least recently used entry is dropped if the cache is full."""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+static_bg_cache = BackgroundCache()
+
+
+def data_digest(x, y):
+    """Returns a hash of the energy axis and intensities of a spectrum, used as key of the background cache."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(x, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def shirley_static(x, y, tol, maxit):
+    """Static Shirley background (xpy.shirley_calculate), cached in static_bg_cache.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        tol (float): Convergence tolerance.
+        maxit (int): Maximum number of iterations, floats from the background table are converted.
+
+    Returns:
+        numpy.ndarray: The background, a copy which can be modified.
+    """
+    key = ("shirley", data_digest(x, y), float(tol), int(maxit))
+    bg = static_bg_cache.get(key)
+    if bg is None:
+        bg = np.asarray(xpy.shirley_calculate(x, y, tol, int(maxit)))
+        static_bg_cache.put(key, bg)
+    return bg.copy()
+
+
+def tougaard_static(x, y, B, C, C_d, D, maxit, fft=False):
+    """Static Tougaard background (xpy.tougaard_calculate or tougaard_calculate_fft), cached in static_bg_cache.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        B (float): Start value of the B parameter, it is optimized if maxit > 1.
+        C (float): C parameter of the loss function.
+        C_d (float): C' parameter of the loss function.
+        D (float): D parameter of the loss function.
+        maxit (int): Maximum number of iterations to optimize B, floats from the background table are converted.
+        fft (bool, optional): Use tougaard_calculate_fft. Default is False.
+
+    Returns:
+        tuple: (bg, B) with a copy of the background and the optimized B parameter.
+    """
+    digest = data_digest(x, y)
+    params = (float(C), float(C_d), float(D), int(maxit))
+    name = "tougaard_static_fft" if fft else "tougaard"
+    key = (name, digest, float(B)) + params
+    cached = static_bg_cache.get(key)
+    if cached is None:
+        calculate = tougaard_calculate_fft if fft else xpy.tougaard_calculate
+        bg, B_new = calculate(x, y, B, C, C_d, D, int(maxit))
+        cached = (np.asarray(bg), B_new)
+        static_bg_cache.put(key, cached)
+        # With a converged B the calculation returns the same background and B again. The preset is updated with B,
+        # so the next evaluation starts from it and should be a cache hit as well.
+        toB = cached[0][0] - y[-1]
+        if abs(toB - (y[0] - y[-1])) < 0.000001 * toB:
+            static_bg_cache.put((name, digest, float(B_new)) + params, cached)
+    return cached[0].copy(), cached[1]
+
+
+def is_equidistant(x, rtol=0.01):
+    """Checks if the energy axis has a constant step.
+
+    Deviations of the steps up to rtol of the mean step are accepted, as the energies are usually stored with a
+    limited number of digits.
+    """
+    if len(x) < 2:
+        return False
+    steps = np.diff(np.asarray(x, dtype=float))
+    step = (x[-1] - x[0]) / (len(x) - 1)
+    return step != 0 and bool(np.all(np.abs(steps - step) <= rtol * abs(step)))
+
+
+def tougaard_sum(x, z, C, C_d, D):
+    """Sum of the intensities weighted with the 4-PIESCS loss function for every energy of an equidistant axis.
+
+    Calculates s[k] = sum_{m >= k} z[m] * T / ((C + C_d * T**2)**2 + D * T**2) with T = |x[m] - x[k]|. As T only
+    depends on m - k, the sum is a correlation of z with the loss function and is calculated by FFT in O(n log n)
+    instead of the O(n**2) of the direct summation.
+
+    Args:
+        x (numpy.ndarray): Equidistant energy axis, ascending or descending.
+        z (numpy.ndarray): Intensities.
+        C (float): C parameter of the loss function.
+        C_d (float): C' parameter of the loss function.
+        D (float): D parameter of the loss function.
+
+    Returns:
+        numpy.ndarray: The sums, same length as z.
+    """
+    n = len(z)
+    T = np.arange(n) * (abs(x[-1] - x[0]) / (n - 1))
+    loss = T / ((C + C_d * T**2) ** 2 + D * T**2)
+    return signal.fftconvolve(np.asarray(z, dtype=float), loss[::-1])[n - 1 :]
+
+
+def tougaard_calculate_fft(x, y, tb=2866, tc=1643, tcd=1, td=1, maxit=100):
+    """Static Tougaard background, FFT version of xpy.tougaard_calculate.
+
+    The B parameter only scales the background, so the loss function sum is calculated once by tougaard_sum and
+    B is iterated the same way as in xpy.tougaard_calculate. For an exactly equidistant energy axis both agree within
+    floating point round-off (about 1e-14 of the background step). Energies stored with a limited number of digits
+    are replaced by an equidistant axis, which changes background and B by up to about 1e-4 relative (1e-5 for the
+    Au 4f test file); integer backgrounds are truncated like in the original and may differ by one count. Energy
+    axes which are not equidistant fall back to xpy.tougaard_calculate.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        tb (float): Start value of the B parameter, it is optimized if maxit > 1.
+        tc (float): C parameter of the loss function.
+        tcd (float): C' parameter of the loss function.
+        td (float): D parameter of the loss function.
+        maxit (int): Maximum number of iterations to optimize B.
+
+    Returns:
+        tuple: (bg, tb) with the background and the optimized B parameter.
+    """
+    if not (np.any(x) and np.any(y)) or not is_equidistant(x):
+        return xpy.tougaard_calculate(x, y, tb, tc, tcd, td, maxit)
+    base = tougaard_sum(x, y - y[-1], tc, tcd, td) * abs(x[1] - x[0])
+    Btou = np.zeros_like(y)
+    it = 0
+    while it < maxit:
+        Btou[:] = base * tb
+        Boffset = Btou[0] - (y[0] - y[-1])
+        if abs(Boffset) < (0.000001 * Btou[0]) or maxit == 1:
+            break
+        else:
+            tb = tb - (Boffset / Btou[0]) * tb * 0.5
+        it += 1
+    logging.debug(f"Tougaard B: {tb}, C: {tc}, C': {tcd}, D: {td}")
+    return np.asarray(y[-1] + Btou), tb
+
+
+def tougaard_fft_base(x, y, C, C_d, D, extend=0):
+    """Active Tougaard background for B = 1, FFT version of the lmfitxps TougaardBG model function.
+
+    The spectrum is extended by extend (in eV) with the mean of the last ten intensities, like in TougaardBG. The sum
+    over the data is calculated by tougaard_sum, the contribution of the extension (which uses a slightly different
+    step) directly. The backgrounds are cached in static_bg_cache, as they do not depend on B which is the only
+    parameter varied in the fit. Energy axes which are not equidistant fall back to the direct summation of lmfitxps.
+
+    Returns:
+        numpy.ndarray: The background for B = 1, shared with the cache and must not be modified.
+    """
+    extend = int(extend)
+    key = ("tougaard_fft", data_digest(x, y), float(C), float(C_d), float(D), extend)
+    bg = static_bg_cache.get(key)
+    if bg is not None:
+        return bg
+    if not is_equidistant(x):
+        bg = xpy.tougaard_closure()(x, y, 1, C, C_d, D, extend)
+    else:
+        delta_x = abs((x[-1] - x[0])) / len(x)
+        bg = tougaard_sum(x, y, C, C_d, D) * delta_x
+        len_padded = abs(int(extend / delta_x))
+        if len_padded > 0:
+            padded_x = np.linspace(
+                x[-1] + delta_x, x[-1] + delta_x * len_padded, len_padded
+            )
+            padded_y = np.mean(y[-10:]) * delta_x
+            # evaluated in blocks of rows to limit the memory of the distance matrix
+            rows = max(1, 2**20 // len_padded)
+            for start in range(0, len(x), rows):
+                dx = padded_x - np.asarray(x[start : start + rows], dtype=float)[:, None]
+                denominator = (C + C_d * dx**2) ** 2 + D * dx**2
+                bg[start : start + rows] += np.sum(np.abs(dx) / denominator, axis=1) * padded_y
+    static_bg_cache.put(key, bg)
+    return bg
+
+
+def tougaard_fft(x, y, B, C, C_d, D, extend=0):
+    """Model function of TougaardFFTBG.
+
+    If x is another energy axis than the one of the data y, e.g. the oversampled axis of component_curves, the
+    background is calculated for the data on an equidistant axis of the same range and interpolated on x.
+    """
+    if len(x) == len(y):
+        return B * tougaard_fft_base(x, y, C, C_d, D, extend)
+    x_data = np.linspace(x[0], x[-1], len(y))
+    bg = tougaard_fft_base(x_data, y, C, C_d, D, extend)
+    if x_data[0] > x_data[-1]:
+        return B * np.interp(x, x_data[::-1], bg[::-1])
+    return B * np.interp(x, x_data, bg)
+
+
+class TougaardFFTBG(TougaardBG):
+    """Active Tougaard background calculated by FFT, see tougaard_fft_base.
+
+    Same parameters, parameter hints and guess as the lmfitxps TougaardBG model, only the model function differs.
+    """
+
+    def __init__(self, *args, **kwargs):
+        Model.__init__(self, tougaard_fft, *args, **kwargs)
+        self._set_paramhints_prefix()
+
+
+class ShirleyIntegral:
+    """Cumulative integral of the data used by the active Shirley background, reused between the evaluations.
+
+    During a fit the model is evaluated with the same data array in every iteration, only k and const change. The
+    integral is therefore calculated once and reused as long as the model is evaluated with the same array, which
+    must not be modified in place. Evaluations, integrations and the time spent in them are counted to show the
+    cost per evaluation.
+    """
+
+    def __init__(self):
+        self.y = None
+        self.integral = None
+        self.evaluations = 0
+        self.integrations = 0
+        self.evaluation_time = 0.0
+        self.integration_time = 0.0
+
+    def __call__(self, y):
+        if y is not self.y:
+            start = time.perf_counter()
+            self.integral = np.cumsum(y[::-1])[::-1]
+            self.integration_time += time.perf_counter() - start
+            self.integrations += 1
+            self.y = y
+        return self.integral
+
+    def summary(self):
+        """Returns the number of evaluations and the cost per evaluation with and without reusing the integral."""
+        if self.evaluations == 0 or self.integrations == 0:
+            return "Active Shirley BG: not evaluated."
+        cost = self.evaluation_time / self.evaluations
+        integration = self.integration_time / self.integrations
+        cost_cold = cost + integration * (self.evaluations - self.integrations) / self.evaluations
+        return (
+            f"Active Shirley BG: {self.evaluations} evaluations, {self.integrations} integrations, "
+            f"{cost * 1e6:.3g} us per evaluation ({cost_cold * 1e6:.3g} us without reusing the integral)"
+        )
+
+
+class ShirleyWarmBG(ShirleyBG):
+    """Active Shirley background which reuses the integral of the data between the evaluations of a fit.
+
+    Same parameters and results as the lmfitxps ShirleyBG model, which integrates the data in every evaluation. The
+    ShirleyIntegral with the cost per evaluation is available as the integral attribute.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.integral = ShirleyIntegral()
+        integral = self.integral
+
+        def shirley(y, k, const):
+            start = time.perf_counter()
+            bg = k * integral(y) + const
+            integral.evaluations += 1
+            integral.evaluation_time += time.perf_counter() - start
+            return bg
+
+        Model.__init__(self, shirley, *args, **kwargs)
+        self._set_paramhints_prefix()
+
+
+def shirley_integral(mod):
+    """Returns the ShirleyIntegral of the active Shirley background of a (composite) model, None if there is none."""
+    for component in getattr(mod, "components", [mod]):
+        if isinstance(component, ShirleyWarmBG):
+            return component.integral
+    return None
+
+
+def bg_selector(x, y, mode, idx_bg, pre, fixed_bg=False, tougaard_fft=False):
+    """Build the background model for a single background index.
+
+    Static backgrounds (Shirley idx 0, Tougaard idx 1) are calculated directly (cached in static_bg_cache) and
+    returned as an array, all other backgrounds are returned as lmfit model with their parameters.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        mode (str): One of 'fit', 'eva' or 'sim'.
+        idx_bg (int): Background index as used in dictBG.
+        pre (list): The preset list, the Tougaard B value in pre[1][1][1] is updated for idx_bg 1.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+
+    Returns:
+        list: [mod, bg_mod, pars] with the lmfit model (or None), the static background (or 0) and the parameters (or None).
+    """
+    if idx_bg == 0:
+        shA = pre[1][0][1]
+        shB = pre[1][0][3]
+        pars = None
+        mod = None
+        bg_mod = shirley_static(x, y, shA, shB)
+    if idx_bg == 100:
+        mod = ShirleyWarmBG(independent_vars=["y"], prefix="bg_shirley_")
+        k = pre[1][0][5]
+        const = pre[1][0][7]
+        pars = mod.make_params()
+        pars["bg_shirley_k"].value = float(k)
+        pars["bg_shirley_const"].value = float(const)
+        if pre[1][0][4] == 2:
+            pars["bg_shirley_k"].vary = False
+        if pre[1][0][6] == 2:
+            pars["bg_shirley_const"].vary = False
+        bg_mod = 0
+    if idx_bg == 1:
+        toB = pre[1][1][1]
+        toC = pre[1][1][3]
+        toCd = pre[1][1][5]
+        toD = pre[1][1][7]
+        toT0 = pre[1][1][9]
+        pars = None
+        mod = None
+        if mode == "fit":
+            toM = pre[1][0][3]
+            [bg_mod, bg_toB] = tougaard_static(
+                x, y, toB, toC, toCd, toD, toM, fft=tougaard_fft
+            )
+        else:
+            toM = 1
+            [bg_mod, bg_toB] = tougaard_static(
+                x, y, toB, toC, toCd, toD, toM, fft=tougaard_fft
+            )
+        pre[1][1][1] = bg_toB
+    if idx_bg == 101:
+        if tougaard_fft:
+            mod = TougaardFFTBG(independent_vars=["x", "y"], prefix="bg_tougaard_")
+        else:
+            mod = TougaardBG(independent_vars=["x", "y"], prefix="bg_tougaard_")
+        if (
+            pre[1][1][1] is None
+            or pre[1][1][3] is None
+            or pre[1][1][5] is None
+            or pre[1][1][7] is None
+            or pre[1][1][9] is None
+            or len(str(pre[1][1][1])) == 0
+            or len(str(pre[1][1][3])) == 0
+            or len(str(pre[1][1][5])) == 0
+            or len(str(pre[1][1][7])) == 0
+            or len(str(pre[1][1][9])) == 0
+        ):
+            pars = mod.guess(y, x=x, y=y)
+        else:
+            pars = mod.make_params()
+            pars["bg_tougaard_B"].value = pre[1][1][1]
+            if pre[1][1][0] == 2:
+                pars["bg_tougaard_B"].vary = False
+            pars["bg_tougaard_C"].value = pre[1][1][3]
+            pars["bg_tougaard_C"].vary = False
+            pars["bg_tougaard_C_d"].value = pre[1][1][5]
+            pars["bg_tougaard_C_d"].vary = False
+            pars["bg_tougaard_D"].value = pre[1][1][7]
+            pars["bg_tougaard_D"].vary = False
+            pars["bg_tougaard_extend"].value = pre[1][1][9]
+            pars["bg_tougaard_extend"].vary = False
+        bg_mod = 0
+    if idx_bg == 3:
+        mod = StepModel(prefix="bg_arctan_", form="arctan")
+        if (
+            pre[1][idx_bg + 1][1] is None
+            or pre[1][idx_bg + 1][3] is None
+            or pre[1][idx_bg + 1][5] is None
+            or len(str(pre[1][idx_bg + 1][1])) == 0
+            or len(str(pre[1][idx_bg + 1][3])) == 0
+            or len(str(pre[1][idx_bg + 1][5])) == 0
+        ):
+            pars = mod.guess(y, x=x)
+        else:
+            pars = mod.make_params()
+            pars["bg_arctan_amplitude"].value = pre[1][idx_bg + 1][1]
+            if pre[1][idx_bg + 1][0] == 2:
+                pars["bg_arctan_amplitude"].vary = False
+            pars["bg_arctan_center"].value = pre[1][idx_bg + 1][3]
+            if pre[1][idx_bg + 1][2] == 2:
+                pars["bg_arctan_center"].vary = False
+            pars["bg_arctan_sigma"].value = pre[1][idx_bg + 1][5]
+            if pre[1][idx_bg + 1][4] == 2:
+                pars["bg_arctan_sigma"].vary = False
+        bg_mod = 0
+    if idx_bg == 4:
+        mod = StepModel(prefix="bg_step_", form="erf")
+        if (
+            pre[1][idx_bg + 1][1] is None
+            or pre[1][idx_bg + 1][3] is None
+            or pre[1][idx_bg + 1][5] is None
+            or len(str(pre[1][idx_bg + 1][1])) == 0
+            or len(str(pre[1][idx_bg + 1][3])) == 0
+            or len(str(pre[1][idx_bg + 1][5])) == 0
+        ):
+            pars = mod.guess(y, x=x)
+        else:
+            pars = mod.make_params()
+            pars["bg_step_amplitude"].value = pre[1][idx_bg + 1][1]
+            if pre[1][idx_bg + 1][0] == 2:
+                pars["bg_step_amplitude"].vary = False
+            pars["bg_step_center"].value = pre[1][idx_bg + 1][3]
+            if pre[1][idx_bg + 1][2] == 2:
+                pars["bg_step_center"].vary = False
+            pars["bg_step_sigma"].value = pre[1][idx_bg + 1][5]
+            if pre[1][idx_bg + 1][4] == 2:
+                pars["bg_step_sigma"].vary = False
+        bg_mod = 0
+
+    if idx_bg == 5:
+        if (x[0] > x[-1] and y[0] > y[-1]) or (x[0] < x[-1] and y[0] < y[-1]):
+            # VBM
+            def poly2vbm(x, ctr, d1, d2, d3, d4):
+                return (
+                    d1 * (x - ctr)
+                    + d2 * (x - ctr) ** 2
+                    + d3 * (x - ctr) ** 3
+                    + d4 * (x - ctr) ** 4
+                ) * (x >= ctr)
+
+        else:
+            # cutoff/wf
+            def poly2vbm(x, ctr, d1, d2, d3, d4):
+                return (
+                    d1 * (x - ctr)
+                    + d2 * (x - ctr) ** 2
+                    + d3 * (x - ctr) ** 3
+                    + d4 * (x - ctr) ** 4
+                ) * (x <= ctr)
+
+        mod = Model(poly2vbm, prefix="bg_vbm_")
+        pars = mod.make_params()
+        if (
+            pre[1][idx_bg + 1][1] is None
+            or pre[1][idx_bg + 1][3] is None
+            or pre[1][idx_bg + 1][5] is None
+            or pre[1][idx_bg + 1][7] is None
+            or pre[1][idx_bg + 1][9] is None
+            or len(str(pre[1][idx_bg + 1][1])) == 0
+            or len(str(pre[1][idx_bg + 1][3])) == 0
+            or len(str(pre[1][idx_bg + 1][5])) == 0
+            or len(str(pre[1][idx_bg + 1][7])) == 0
+            or len(str(pre[1][idx_bg + 1][9])) == 0
+        ):
+            pars["bg_vbm_ctr"].value = (x[0] + x[-1]) / 2
+            pars["bg_vbm_d1"].value = 0
+            pars["bg_vbm_d2"].value = 0
+            pars["bg_vbm_d3"].value = 0
+            pars["bg_vbm_d4"].value = 0
+        else:
+            pars["bg_vbm_ctr"].value = pre[1][idx_bg + 1][1]
+            if pre[1][idx_bg + 1][0] == 2:
+                pars["bg_vbm_ctr"].vary = False
+            pars["bg_vbm_d1"].value = pre[1][idx_bg + 1][3]
+            if pre[1][idx_bg + 1][2] == 2:
+                pars["bg_vbm_d1"].vary = False
+            pars["bg_vbm_d2"].value = pre[1][idx_bg + 1][5]
+            if pre[1][idx_bg + 1][5] == 2:
+                pars["bg_vbm_d2"].vary = False
+            pars["bg_vbm_d3"].value = pre[1][idx_bg + 1][7]
+            if pre[1][idx_bg + 1][6] == 2:
+                pars["bg_vbm_d3"].vary = False
+            pars["bg_vbm_d4"].value = pre[1][idx_bg + 1][9]
+            if pre[1][idx_bg + 1][8] == 2:
+                pars["bg_vbm_d4"].vary = False
+        bg_mod = 0
+    if idx_bg == 2:
+        mod = PolynomialModel(4, prefix="bg_poly_")
+        bg_mod = 0
+        if (
+            pre[1][2][1] is None
+            or pre[1][2][3] is None
+            or pre[1][2][5] is None
+            or pre[1][2][7] is None
+            or pre[1][2][9] is None
+            or len(str(pre[1][2][1])) == 0
+            or len(str(pre[1][2][3])) == 0
+            or len(str(pre[1][2][5])) == 0
+            or len(str(pre[1][2][7])) == 0
+            or len(str(pre[1][2][9])) == 0
+        ):
+            pars = mod.guess(y, x=x)
+        else:
+            pars = mod.make_params()
+            for index in range(5):
+                pars["bg_poly_c" + str(index)].value = pre[1][2][2 * index + 1]
+                if pre[1][2][2 * index] == 2:
+                    pars["bg_poly_c" + str(index)].vary = False
+            pars["bg_poly_c0"].max = np.mean(y[-5:])
+            # pars['bg_poly_c0'].min = 0
+    if idx_bg == 6:
+        mod = SlopeBG(independent_vars=["y"], prefix="bg_slope_")
+        bg_mod = 0
+        if pre[1][3][1] is None or len(str(pre[1][3][1])) == 0:
+            pars = mod.guess(y, x=x)
+        else:
+            pars = mod.make_params()
+            pars["bg_slope_k"].value = pre[1][3][1]
+            if pre[1][3][0] == 2:
+                pars["bg_slope_k"].vary = False
+    if fixed_bg and pars != None:
+        for par in pars:
+            pars[par].vary = False
+    return [mod, bg_mod, pars]
+
+
+def bg_model_creator(x, y, mode, idx_bgs, pre, fixed_bg=False, tougaard_fft=False):
+    """Combine all selected backgrounds into one model.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        mode (str): One of 'fit', 'eva' or 'sim'.
+        idx_bgs (list): Background indices as used in dictBG.
+        pre (list): The preset list.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+
+    Returns:
+        tuple: (mod, bg_mod, pars) with the combined model, the sum of the static backgrounds and the parameters.
+    """
+    temp_res = bg_selector(
+        x, y, mode, idx_bgs[0], pre, fixed_bg=fixed_bg, tougaard_fft=tougaard_fft
+    )
+    mod = temp_res[0]
+    bg_mod = temp_res[1]
+    pars = temp_res[2]
+
+    for idx_bg in idx_bgs[1:]:
+        temp_res = bg_selector(
+            x, y, mode, idx_bg, pre, fixed_bg=fixed_bg, tougaard_fft=tougaard_fft
+        )
+        if mod is None and temp_res[0] is None:
+            mod = None
+        elif mod is None and temp_res[0] is not None:
+            mod = temp_res[0]
+        elif mod is not None and temp_res[0] is None:
+            mod = mod
+        elif mod is not None and temp_res[0] is not None:
+            mod += temp_res[0]
+        bg_mod += temp_res[1]
+        if pars is not None:
+            pars.update(temp_res[2])
+        else:
+            pars = temp_res[2]
+    return mod, bg_mod, pars
+
+
+@functools.lru_cache(maxsize=32)
+def component_models(shapes):
+    """Build the models of the components and their default parameters.
+
+    The result only depends on the line shapes of the components, so it is cached: as long as the structure of the
+    preset does not change (e.g. in refine-fit-refine loops), the models are not instantiated again and the
+    parameters do not have to be created and parsed from the model functions.
+
+    Args:
+        shapes (tuple): The index of the line shape (see list_shape) of each component.
+
+    Returns:
+        tuple: (models, pars) with the model and the default parameters of each component. Both are shared between
+            calls, peak_selector works on copies of them so that the cached objects are never modified.
+    """
+    models = []
+    pars = []
+    for index_pk, index in enumerate(shapes):
+        strind = list_shape[index].split(":", 1)[0]
+        modp = model_selector(index, strind, index_pk)
+        models.append(modp)
+        pars.append(modp.make_params())
+    return tuple(models), tuple(pars)
+
+
+def peak_selector(mod, pre, binding_ener=False):
+    """Add all components of the preset to the model and set up their parameters.
+
+    Args:
+        mod (lmfit.Model): Background model the components are added to, may be None.
+        pre (list): The preset list.
+        binding_ener (bool, optional): The energy axis is a binding energy scale. Default is False.
+
+    Returns:
+        list: [mod, pars] with the composite model and the parameters of all components.
+    """
+    ncomponent = len(pre[2][0])
+    ncomponent = int(ncomponent / 2)
+    models, default_pars = component_models(
+        tuple(pre[2][0][2 * index_pk + 1] for index_pk in range(ncomponent))
+    )
+    for index_pk in range(ncomponent):
+        # a shallow copy per call, the model of a fit must not be shared with other fits (e.g. FitProfile)
+        modp = copy.copy(models[index_pk])
+        if mod is not None:
+            mod += modp
+        else:
+            mod = modp
+        if index_pk == 0:
+            pars = copy.deepcopy(default_pars[index_pk])
+        else:
+            pars.update(copy.deepcopy(default_pars[index_pk]))
+        pars = component_values(pars, pre, index_pk, binding_ener=binding_ener)
+    return [mod, pars]
+
+
+def add_parameter(pars, name, **kwargs):
+    """Add a parameter, or set the value and bounds of the parameter if pars already has one of that name."""
+    if name in pars:
+        pars[name].set(**kwargs)
+    else:
+        pars.add(name, **kwargs)
+
+
+def component_values(pars, pre, index_pk, binding_ener=False):
+    """Set the values, bounds and constraints of a component from the preset.
+
+    Used by peak_selector for new parameters and by build_model for the cached parameters of a preset with the same
+    structure (see model_key), which are reset by reset_parameters before.
+
+    Args:
+        pars (lmfit.Parameters): Parameters of the model, the parameters of the ratios and differences of the
+            component (e.g. amp_ratio) are added if they do not exist yet.
+        pre (list): The preset list.
+        index_pk (int): Index of the component.
+        binding_ener (bool, optional): The energy axis is a binding energy scale. Default is False.
+
+    Returns:
+        lmfit.Parameters: The updated parameters.
+
+    Raises:
+        ValueError: If a parameter references itself.
+    """
+    index = pre[2][0][2 * index_pk + 1]
+    strind = list_shape[index]
+    strind = strind.split(":", 1)[0]
+    # fit parameters from pre
+    if (
+        pre[2][1][2 * index_pk + 1] is not None
+        and len(str(pre[2][1][2 * index_pk + 1])) > 0
+    ):
+        pars[strind + str(index_pk + 1) + "_center"].value = float(
+            pre[2][1][2 * index_pk + 1]
+        )
+        if pre[2][1][2 * index_pk] == 2:
+            pars[strind + str(index_pk + 1) + "_center"].vary = False
+    if (
+        pre[2][2][2 * index_pk + 1] is not None
+        and len(str(pre[2][2][2 * index_pk + 1])) > 0
+    ):
+        pars[strind + str(index_pk + 1) + "_amplitude"].value = float(
+            pre[2][2][2 * index_pk + 1]
+        )
+        pars[strind + str(index_pk + 1) + "_amplitude"].min = 0.0
+        if pre[2][2][2 * index_pk] == 2:
+            pars[strind + str(index_pk + 1) + "_amplitude"].vary = False
+    if (
+        pre[2][14][2 * index_pk + 1] is not None
+        and len(str(pre[2][14][2 * index_pk + 1])) > 0
+    ):
+        add_parameter(
+            pars,
+            strind + str(index_pk + 1) + "_center_diff",
+            value=float(pre[2][14][2 * index_pk + 1]),
+        )
+        if pre[2][14][2 * index_pk] == 2:
+            pars[strind + str(index_pk + 1) + "_center_diff"].vary = False
+    if (
+        pre[2][16][2 * index_pk + 1] is not None
+        and len(str(pre[2][16][2 * index_pk + 1])) > 0
+    ):
+        add_parameter(
+            pars,
+            strind + str(index_pk + 1) + "_amp_ratio",
+            value=float(pre[2][16][2 * index_pk + 1]),
+            min=0,
+        )
+        if pre[2][16][2 * index_pk] == 2:
+            pars[strind + str(index_pk + 1) + "_amp_ratio"].vary = False
+    if (
+        index == 0
+        or index == 2
+        or index == 4
+        or index == 5
+        or index == 6
+        or index == 7
+        or index == 8
+        or index == 12
+    ):
+        if (
+            pre[2][4][2 * index_pk + 1] is not None
+            and len(str(pre[2][4][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_sigma"].value = float(
+                pre[2][4][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_sigma"].min = 0
+            if pre[2][4][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_sigma"].vary = False
+        if (
+            pre[2][20][2 * index_pk + 1] is not None
+            and len(str(pre[2][20][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_gaussian_ratio",
+                value=float(pre[2][20][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][20][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_gaussian_ratio"].vary = (
+                    False
+                )
+    if index == 10 or index == 11:
+        if (
+            pre[2][4][2 * index_pk + 1] is not None
+            and len(str(pre[2][4][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_gaussian_sigma"].value = float(
+                pre[2][4][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_gaussian_sigma"].min = 0
+            if pre[2][4][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_gaussian_sigma"].vary = (
+                    False
+                )
+        if (
+            pre[2][20][2 * index_pk + 1] is not None
+            and len(str(pre[2][20][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_gaussian_ratio",
+                value=float(pre[2][20][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][20][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_gaussian_ratio"].vary = (
+                    False
+                )
+    if index == 1 or index == 3 or index == 9 or index == 10 or index == 11:
+        if (
+            pre[2][3][2 * index_pk + 1] is not None
+            and len(str(pre[2][3][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_sigma"].value = float(
+                pre[2][3][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_sigma"].min = 0
+            if pre[2][3][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_sigma"].vary = False
+        if (
+            pre[2][18][2 * index_pk + 1] is not None
+            and len(str(pre[2][18][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_lorentzian_ratio",
+                value=float(pre[2][18][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][18][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_lorentzian_ratio"].vary = (
+                    False
+                )
+    if index == 2 or index == 6:
+        if (
+            pre[2][3][2 * index_pk + 1] is not None
+            and len(str(pre[2][3][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_gamma"].value = float(
+                pre[2][3][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_gamma"].min = 0
+            if pre[2][3][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_gamma"].vary = False
+        if (
+            pre[2][18][2 * index_pk + 1] is not None
+            and len(str(pre[2][18][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_lorentzian_ratio",
+                value=float(pre[2][18][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][18][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_lorentzian_ratio"].vary = (
+                    False
+                )
+    if index == 4 or index == 5 or index == 9 or index == 10 or index == 11:
+        if (
+            pre[2][5][2 * index_pk + 1] is not None
+            and len(str(pre[2][5][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_gamma"].value = float(
+                pre[2][5][2 * index_pk + 1]
+            )
+            if binding_ener:
+                pars[strind + str(index_pk + 1) + "_gamma"].max = 0
+                pars[strind + str(index_pk + 1) + "_gamma"].min = -1
+            else:
+                pars[strind + str(index_pk + 1) + "_gamma"].min = 0
+                pars[strind + str(index_pk + 1) + "_gamma"].max = 1
+            pars[strind + str(index_pk + 1) + "_gamma"].max = 1
+            if pre[2][5][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_gamma"].vary = False
+        if (
+            pre[2][22][2 * index_pk + 1] is not None
+            and len(str(pre[2][22][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_gamma_ratio",
+                value=float(pre[2][22][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][22][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_gamma_ratio"].vary = False
+    if index == 3:
+        if (
+            pre[2][6][2 * index_pk + 1] is not None
+            and len(str(pre[2][6][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_fraction"].value = float(
+                pre[2][6][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_fraction"].min = 0
+            pars[strind + str(index_pk + 1) + "_fraction"].max = 1
+            if pre[2][6][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_fraction"].vary = False
+    if index == 6:
+        if (
+            pre[2][7][2 * index_pk + 1] is not None
+            and len(str(pre[2][7][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_skew"].value = float(
+                pre[2][7][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_skew"].min = -1
+            pars[strind + str(index_pk + 1) + "_skew"].max = 1
+            if pre[2][7][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_skew"].vary = False
+    if index == 7:
+        if (
+            pre[2][8][2 * index_pk + 1] is not None
+            and len(str(pre[2][8][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_q"].value = float(
+                pre[2][8][2 * index_pk + 1]
+            )
+            if pre[2][8][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_q"].vary = False
+    if index == 12:
+        if (
+            pre[2][9][2 * index_pk + 1] is not None
+            and len(str(pre[2][9][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_kt"].value = float(
+                pre[2][9][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_kt"].min = 0
+            pars[strind + str(index_pk + 1) + "_kt"].max = 1
+            if pre[2][9][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_kt"].vary = False
+
+    if index == 10:
+        if (
+            pre[2][10][2 * index_pk + 1] is not None
+            and len(str(pre[2][10][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_soc"].value = float(
+                pre[2][10][2 * index_pk + 1]
+            )
+            if pre[2][10][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_soc"].vary = False
+        if (
+            pre[2][24][2 * index_pk + 1] is not None
+            and len(str(pre[2][24][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_soc_ratio",
+                value=float(pre[2][24][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][24][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_soc_ratio"].vary = False
+        if (
+            pre[2][11][2 * index_pk + 1] is not None
+            and len(str(pre[2][11][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_height_ratio"].value = float(
+                pre[2][11][2 * index_pk + 1]
+            )
+            pars[strind + str(index_pk + 1) + "_height_ratio"].min = 0
+            if pre[2][11][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_height_ratio"].vary = False
+        if (
+            pre[2][26][2 * index_pk + 1] is not None
+            and len(str(pre[2][26][2 * index_pk + 1])) > 0
+        ):
+            add_parameter(
+                pars,
+                strind + str(index_pk + 1) + "_rel_height_ratio",
+                value=float(pre[2][26][2 * index_pk + 1]),
+                min=0,
+            )
+            if pre[2][26][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_rel_height_ratio"].vary = (
+                    False
+                )
+        if (
+            pre[2][12][2 * index_pk + 1] is not None
+            and len(str(pre[2][12][2 * index_pk + 1])) > 0
+        ):
+            pars[strind + str(index_pk + 1) + "_fct_coster_kronig"].value = (
+                float(pre[2][12][2 * index_pk + 1])
+            )
+            pars[strind + str(index_pk + 1) + "_fct_coster_kronig"].min = 0
+            if pre[2][12][2 * index_pk] == 2:
+                pars[strind + str(index_pk + 1) + "_fct_coster_kronig"].vary = (
+                    False
+                )
+    pars = ratio_setup(pars, index_pk, strind, index, pre)
+    return pars
+
+
+def assign_expr_safe(
+        pars,
+        target_id: str,
+        current_id: str,
+        param_name: str,
+        expr: str,
+) -> None:
+    """
+    Assign an expression to a parameter if it's not self-referencing.
+    Otherwise, raise an error.
+
+    Args:
+        pars: Parameter dictionary (e.g., from lmfit).
+        target_id (str): Target peak ID.
+        current_id (str): Current peak ID.
+        param_name (str): Name of the parameter (e.g. "sigma", "gamma").
+        expr (str): Expression to assign (e.g. "C1_sigma * C2_ratio").
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the parameter references itself.
+    """
+    if target_id == current_id:
+        raise ValueError(
+            f"Parameter '{current_id}_{param_name}' references itself.\n"
+            f"This is invalid. Please select another peak or leave it blank."
+        )
+    pars[f"{current_id}_{param_name}"].expr = expr
+
+
+def ratio_setup(pars, index_pk, strind, index, pre):
+    """Set the expressions of the reference/ratio constraints of one component.
+
+    Args:
+        pars (lmfit.Parameters): Parameters of the model.
+        index_pk (int): Index of the component.
+        strind (str): Prefix of the component's line shape (e.g. 'g', 'gdd').
+        index (int): Index of the component's line shape in list_shape.
+        pre (list): The preset list.
+
+    Returns:
+        lmfit.Parameters: The updated parameters.
+    """
+    if (
+        index == 2 or index == 6
+    ):  # unset default expression which sets sigma and gamma for the voigt and skewed-voigt always to the same value
+        pars[strind + str(index_pk + 1) + "_gamma"].expr = ""
+        if not pre[2][3][2 * index_pk] == 2:
+            pars[strind + str(index_pk + 1) + "_gamma"].vary = True
+    # amp ratio setup
+    if pre[2][15][2 * index_pk + 1] > 0:
+        pktar = pre[2][15][2 * index_pk + 1]
+        strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+        strtar = strtar_raw.split(":", 1)[0]
+
+        if (
+                pre[2][16][2 * index_pk + 1] is not None and
+                str(pre[2][16][2 * index_pk + 1]).strip()
+        ):
+            target_id = strtar + str(pktar)
+            current_id = strind + str(index_pk + 1)
+            expr = f"{target_id}_amplitude * {current_id}_amp_ratio"
+
+            assign_expr_safe(pars, target_id, current_id, "amplitude", expr)
+
+    # BE diff setup
+    if pre[2][13][2 * index_pk + 1] > 0:
+        pktar = pre[2][13][2 * index_pk + 1]
+        strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+        strtar = strtar_raw.split(":", 1)[0]
+
+        if (
+                pre[2][14][2 * index_pk + 1] is not None and
+                str(pre[2][14][2 * index_pk + 1]).strip()
+        ):
+            target_id = strtar + str(pktar)
+            current_id = strind + str(index_pk + 1)
+            expr = f"{target_id}_center + {current_id}_center_diff"
+
+            assign_expr_safe(pars, target_id, current_id, "center", expr)
+
+    # lorentzian sigma ref setup
+    if pre[2][17][2 * index_pk + 1] > 0:
+        pktar = pre[2][17][2 * index_pk + 1]
+        strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+        strtar = strtar_raw.split(":", 1)[0]
+
+        if (
+                pre[2][18][2 * index_pk + 1] is not None and
+                str(pre[2][18][2 * index_pk + 1]).strip()
+        ):
+            target_id = strtar + str(pktar)
+            current_id = strind + str(index_pk + 1)
+
+            # Assign sigma expression
+            if index in [1, 3, 9, 10, 11]:
+                if strtar in ["v", "a"]:
+                    expr = f"{target_id}_gamma * {current_id}_lorentzian_ratio"
+                else:
+                    expr = f"{target_id}_sigma * {current_id}_lorentzian_ratio"
+
+                assign_expr_safe(pars, target_id, current_id, "sigma", expr)
+
+            # Assign gamma expression
+            if index in [2, 6]:
+                if strtar not in ["v", "a"]:
+                    expr = f"{target_id}_sigma * {current_id}_lorentzian_ratio"
+                else:
+                    expr = f"{target_id}_gamma * {current_id}_lorentzian_ratio"
+
+                assign_expr_safe(pars, target_id, current_id, "gamma", expr)
+
+    # gaussian sigma ref setup
+    if pre[2][19][2 * index_pk + 1] > 0:
+        pktar = pre[2][19][2 * index_pk + 1]
+        strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+        strtar = strtar_raw.split(":", 1)[0]
+
+        if (
+                pre[2][20][2 * index_pk + 1] is not None and
+                str(pre[2][20][2 * index_pk + 1]).strip()
+        ):
+            target_id = strtar + str(pktar)
+            current_id = strind + str(index_pk + 1)
+
+            # For sigma assignment
+            if index in [0, 2, 4, 5, 6, 7, 8, 12]:
+                if strtar in ["gds", "gdd"]:
+                    expr = f"{target_id}_gaussian_sigma * {current_id}_gaussian_ratio"
+                else:
+                    expr = f"{target_id}_sigma * {current_id}_gaussian_ratio"
+
+                assign_expr_safe(pars, target_id, current_id, "sigma", expr)
+
+            # For gaussian_sigma assignment
+            if index in [10, 11]:
+                if strtar not in ["gds", "gdd"]:
+                    expr = f"{target_id}_sigma * {current_id}_gaussian_ratio"
+                else:
+                    expr = f"{target_id}_gaussian_sigma * {current_id}_gaussian_ratio"
+
+                assign_expr_safe(pars, target_id, current_id, "gaussian_sigma", expr)
+
+    # gamma ref setup
+    if pre[2][21][2 * index_pk + 1] > 0:
+        pktar = pre[2][21][2 * index_pk + 1]
+        strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+        strtar = strtar_raw.split(":", 1)[0]
+
+        if (
+                pre[2][22][2 * index_pk + 1] is not None and
+                str(pre[2][22][2 * index_pk + 1]).strip()
+        ):
+            current_id = strind + str(index_pk + 1)
+            target_id = strtar + str(pktar)
+
+            valid_gamma_refs = (
+                    (index in [9, 10, 11] and strtar in ["d", "gdd", "gds"]) or
+                    (index == 4 and strtar == "e") or
+                    (index == 5 and strtar == "s")
+            )
+
+            if valid_gamma_refs:
+                expr = f"{target_id}_gamma * {current_id}_gamma_ratio"
+                assign_expr_safe(pars, target_id, current_id, "gamma", expr)
+
+    # soc ref and height ratio ref setup
+    if index == 10:
+        current_id = strind + str(index_pk + 1)
+
+        # SOC reference
+        if pre[2][23][2 * index_pk + 1] > 0:
+            pktar = pre[2][23][2 * index_pk + 1]
+            strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+            strtar = strtar_raw.split(":", 1)[0]
+
+            if pre[2][24][2 * index_pk + 1] is not None and str(pre[2][24][2 * index_pk + 1]).strip():
+                target_id = strtar + str(pktar)
+                expr = f"{target_id}_soc * {current_id}_soc_ratio"
+                assign_expr_safe(pars, target_id, current_id, "soc", expr)
+
+        # Height ratio reference
+        if pre[2][25][2 * index_pk + 1] > 0:
+            pktar = pre[2][25][2 * index_pk + 1]
+            strtar_raw = list_shape[pre[2][0][2 * pktar - 1]]
+            strtar = strtar_raw.split(":", 1)[0]
+
+            if pre[2][26][2 * index_pk + 1] is not None and str(pre[2][26][2 * index_pk + 1]).strip():
+                target_id = strtar + str(pktar)
+                expr = f"{target_id}_height_ratio * {current_id}_rel_height_ratio"
+                assign_expr_safe(pars, target_id, current_id, "height_ratio", expr)
+
+    return pars
+
+
+def peak_limits(pars, pre):
+    """Apply the min/max limits of the limits table (pre[3]) to the parameters.
+
+    Args:
+        pars (lmfit.Parameters): Parameters of the model.
+        pre (list): The preset list.
+
+    Returns:
+        lmfit.Parameters: The updated parameters.
+    """
+    nrows = len(pre[3])
+    ncols = len(pre[3][0])
+    ncols = int(ncols / 3)
+    for index_pk in range(ncols):
+        index = pre[2][0][2 * index_pk + 1]
+        strind = list_shape[index]
+        strind = strind.split(":", 1)[0]
+        for row in range(nrows):
+            if row == 0 and pre[3][row][3 * index_pk] == 2:
+                if (
+                    pre[3][row][3 * index_pk + 1] is not None
+                    and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_center"].min = pre[3][
+                        row
+                    ][3 * index_pk + 1]
+                if (
+                    pre[3][row][3 * index_pk + 2] is not None
+                    and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_center"].max = pre[3][
+                        row
+                    ][3 * index_pk + 2]
+            if row == 1 and pre[3][row][3 * index_pk] == 2:
+                if (
+                    pre[3][row][3 * index_pk + 1] is not None
+                    and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_amplitude"].min = pre[
+                        3
+                    ][row][3 * index_pk + 1]
+                if (
+                    pre[3][row][3 * index_pk + 2] is not None
+                    and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_amplitude"].max = pre[
+                        3
+                    ][row][3 * index_pk + 2]
+            if row == 12 and pre[3][row][3 * index_pk] == 2:
+                if (
+                    pre[3][row][3 * index_pk + 1] is not None
+                    and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_center_diff"].min = (
+                        pre[3][row][3 * index_pk + 1]
+                    )
+                if (
+                    pre[3][row][3 * index_pk + 2] is not None
+                    and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_center_diff"].max = (
+                        pre[3][row][3 * index_pk + 2]
+                    )
+            if row == 13 and pre[3][row][3 * index_pk] == 2:
+                if (
+                    pre[3][row][3 * index_pk + 1] is not None
+                    and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_amp_ratio"].min = pre[
+                        3
+                    ][row][3 * index_pk + 1]
+                if (
+                    pre[3][row][3 * index_pk + 2] is not None
+                    and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                ):
+                    pars[strind + str(index_pk + 1) + "_amp_ratio"].max = pre[
+                        3
+                    ][row][3 * index_pk + 2]
+            if (
+                index == 0
+                or index == 2
+                or index == 4
+                or index == 5
+                or index == 6
+                or index == 7
+                or index == 8
+                or index == 12
+            ):
+                if row == 3 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_sigma"].min = pre[
+                            3
+                        ][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_sigma"].max = pre[
+                            3
+                        ][row][3 * index_pk + 2]
+                if row == 15 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gaussian_ratio"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gaussian_ratio"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+            if index == 10 or index == 11:
+                if row == 3 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gaussian_sigma"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gaussian_sigma"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+                if row == 15 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gaussian_ratio"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gaussian_ratio"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+            if index == 1 or index == 3 or index == 9 or index == 10 or index == 11:
+                if row == 2 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_sigma"].min = pre[
+                            3
+                        ][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_sigma"].max = pre[
+                            3
+                        ][row][3 * index_pk + 2]
+                if row == 14 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_lorentzian_ratio"
+                        ].min = pre[3][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_lorentzian_ratio"
+                        ].max = pre[3][row][3 * index_pk + 2]
+            if index == 2 or index == 6:
+                if row == 2 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gamma"].min = pre[
+                            3
+                        ][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gamma"].max = pre[
+                            3
+                        ][row][3 * index_pk + 2]
+                if row == 14 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_lorentzian_ratio"
+                        ].min = pre[3][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_lorentzian_ratio"
+                        ].max = pre[3][row][3 * index_pk + 2]
+            if index == 4 or index == 5 or index == 9 or index == 10 or index == 11:
+                if row == 4 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gamma"].min = pre[
+                            3
+                        ][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gamma"].max = pre[
+                            3
+                        ][row][3 * index_pk + 2]
+                if row == 16 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gamma_ratio"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_gamma_ratio"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+            if index == 3:
+                if row == 5 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_fraction"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_fraction"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+            if index == 6:
+                if row == 6 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_skew"].min = pre[
+                            3
+                        ][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_skew"].max = pre[
+                            3
+                        ][row][3 * index_pk + 2]
+            if index == 7:
+                if row == 7 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_q"].min = pre[3][
+                            row
+                        ][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_q"].max = pre[3][
+                            row
+                        ][3 * index_pk + 2]
+            if index == 12:
+                if row == 8 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_kt"].min = pre[3][
+                            row
+                        ][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_kt"].max = pre[3][
+                            row
+                        ][3 * index_pk + 2]
+
+            if index == 10:
+                if row == 9 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_soc"].min = pre[3][
+                            row
+                        ][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_soc"].max = pre[3][
+                            row
+                        ][3 * index_pk + 2]
+                if row == 17 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_soc_ratio"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_soc_ratio"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+                if row == 10 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_height_ratio"].min = (
+                            pre[3][row][3 * index_pk + 1]
+                        )
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[strind + str(index_pk + 1) + "_height_ratio"].max = (
+                            pre[3][row][3 * index_pk + 2]
+                        )
+                if row == 18 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_rel_height_ratio"
+                        ].min = pre[3][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_rel_height_ratio"
+                        ].max = pre[3][row][3 * index_pk + 2]
+                if row == 11 and pre[3][row][3 * index_pk] == 2:
+                    if (
+                        pre[3][row][3 * index_pk + 1] is not None
+                        and len(str(pre[3][row][3 * index_pk + 1])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_fct_coster_kronig"
+                        ].min = pre[3][row][3 * index_pk + 1]
+                    if (
+                        pre[3][row][3 * index_pk + 2] is not None
+                        and len(str(pre[3][row][3 * index_pk + 2])) > 0
+                    ):
+                        pars[
+                            strind + str(index_pk + 1) + "_fct_coster_kronig"
+                        ].max = pre[3][row][3 * index_pk + 2]
+    return pars
+
+
+def bg_result_to_pre(out_params, mode, idx_bgs, pre):
+    """Write the fitted background parameters back into the preset list.
+
+    Args:
+        out_params (lmfit.Parameters): Parameters of the fit result.
+        mode (str): One of 'fit', 'eva' or 'sim'.
+        idx_bgs (list): Background indices used in the fit.
+        pre (list): The preset list which is updated in place.
+    """
+    for idx_bg in idx_bgs:
+        if idx_bg == 6:
+            pre[1][3][1] = out_params["bg_slope_k"].value
+        if idx_bg == 100:
+            if mode != "eva" and mode != "sim":
+                pre[1][0][5] = out_params["bg_shirley_k"].value
+                pre[1][0][7] = out_params["bg_shirley_const"].value
+        if idx_bg == 101:
+            pre[1][1][1] = out_params["bg_tougaard_B"].value
+            pre[1][1][3] = out_params["bg_tougaard_C"].value
+            pre[1][1][5] = out_params["bg_tougaard_C_d"].value
+            pre[1][1][7] = out_params["bg_tougaard_D"].value
+            pre[1][1][9] = out_params["bg_tougaard_extend"].value
+        if idx_bg == 3:
+            pre[1][idx_bg + 1][1] = out_params["bg_arctan_amplitude"].value
+            pre[1][idx_bg + 1][3] = out_params["bg_arctan_center"].value
+            pre[1][idx_bg + 1][5] = out_params["bg_arctan_sigma"].value
+
+        if idx_bg == 4:
+            pre[1][idx_bg + 1][1] = out_params["bg_step_amplitude"].value
+            pre[1][idx_bg + 1][3] = out_params["bg_step_center"].value
+            pre[1][idx_bg + 1][5] = out_params["bg_step_sigma"].value
+        if idx_bg == 5:
+            pre[1][idx_bg + 1][1] = out_params["bg_vbm_ctr"].value
+            pre[1][idx_bg + 1][3] = out_params["bg_vbm_d1"].value
+            pre[1][idx_bg + 1][5] = out_params["bg_vbm_d2"].value
+            pre[1][idx_bg + 1][7] = out_params["bg_vbm_d3"].value
+            pre[1][idx_bg + 1][9] = out_params["bg_vbm_d4"].value
+        if idx_bg == 2:
+            for index in range(5):
+                pre[1][2][2 * index + 1] = out_params[
+                    "bg_poly_c" + str(index)
+                ].value
+
+
+def peak_result_to_pre(out_params, mode, pre):
+    """Write the fitted component parameters back into the preset list.
+
+    Args:
+        out_params (lmfit.Parameters): Parameters of the fit result.
+        mode (str): One of 'fit', 'eva' or 'sim'.
+        pre (list): The preset list which is updated in place.
+    """
+    ncomponent = len(pre[2][0])
+    nrows = len(pre[2])
+    ncomponent = int(ncomponent / 2)
+    for index_pk in range(ncomponent):
+        index = pre[2][0][2 * index_pk + 1]
+        strind = list_shape[index]
+        strind = strind.split(":", 1)[0]
+        # fit parameters from pre
+        pre[2][1][2 * index_pk + 1] = out_params[
+            strind + str(index_pk + 1) + "_center"
+        ].value
+        pre[2][2][2 * index_pk + 1] = out_params[
+            strind + str(index_pk + 1) + "_amplitude"
+        ].value
+        pre[2][14][2 * index_pk + 1] = out_params[
+            strind + str(index_pk + 1) + "_center_diff"
+        ].value
+        pre[2][16][2 * index_pk + 1] = out_params[
+            strind + str(index_pk + 1) + "_amp_ratio"
+        ].value
+        if (
+            index == 0
+            or index == 2
+            or index == 4
+            or index == 5
+            or index == 6
+            or index == 7
+            or index == 8
+            or index == 12
+        ):
+            pre[2][4][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_sigma"
+            ].value
+            pre[2][20][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_gaussian_ratio"
+            ].value
+        if index == 10 or index == 11:
+            pre[2][4][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_gaussian_sigma"
+            ].value
+            pre[2][20][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_gaussian_ratio"
+            ].value
+        if index == 1 or index == 3 or index == 9 or index == 10 or index == 11:
+            pre[2][3][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_sigma"
+            ].value
+            pre[2][18][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_lorentzian_ratio"
+            ].value
+        if index == 2 or index == 6:
+            pre[2][3][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_gamma"
+            ].value
+            pre[2][18][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_lorentzian_ratio"
+            ].value
+        if index == 4 or index == 5 or index == 9 or index == 10 or index == 11:
+            pre[2][5][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_gamma"
+            ].value
+            pre[2][22][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_gamma_ratio"
+            ].value
+        if index == 3:
+            pre[2][6][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_fraction"
+            ].value
+        if index == 6:
+            pre[2][7][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_skew"
+            ].value
+        if index == 7:
+            pre[2][8][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_q"
+            ].value
+        if index == 12:
+            pre[2][9][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_kt"
+            ].value
+
+        if index == 10:
+            pre[2][10][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_soc"
+            ].value
+            pre[2][24][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_soc_ratio"
+            ].value
+            pre[2][11][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_height_ratio"
+            ].value
+            pre[2][26][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_rel_height_ratio"
+            ].value
+            pre[2][12][2 * index_pk + 1] = out_params[
+                strind + str(index_pk + 1) + "_fct_coster_kronig"
+            ].value
+
+
+def load_preset(filepath):
+    """Read a .dat preset file.
+
+    Args:
+        filepath (str): Path to the preset file.
+
+    Returns:
+        list: The preset list. Old presets with a single background index are converted to a list of indices.
+
+    Raises:
+        ValueError: If the file does not contain a preset of the current format.
+    """
+    with open(filepath, "r") as file:
+        pre = ast.literal_eval(file.read())
+    if len(pre) < 4 or not isinstance(pre[0], list):
+        raise ValueError(f"{filepath} is not a valid LG4X-V2 preset.")
+    if type(pre[0][0]) == int:
+        # backwards compatibility for old presets which only allowed one single BG
+        pre[0][0] = [pre[0][0]]
+    return pre
+
+
+def component_names(pre):
+    """Returns the names of the components of a preset.
+
+    Args:
+        pre (list): The preset list.
+
+    Returns:
+        list: The component names, 'C_1', 'C_2', ... if the preset does not contain names.
+    """
+    ncomponent = int(len(pre[2][0]) / 2)
+    if len(pre) == 5 and len(pre[4]) - 1 == ncomponent:
+        return list(pre[4][1:])
+    return ["C_{}".format(str(int(i + 1))) for i in range(ncomponent)]
+
+
+def component_prefix(pre, index_pk):
+    """Returns the lmfit prefix of a component, e.g. 'g1_'.
+
+    Args:
+        pre (list): The preset list.
+        index_pk (int): Index of the component.
+
+    Returns:
+        str: The prefix of the component.
+    """
+    strind = list_shape[pre[2][0][2 * index_pk + 1]]
+    strind = strind.split(":", 1)[0]
+    return strind + str(index_pk + 1) + "_"
+
+
+def check_range(x0, x0_corrected, pre):
+    """Fills an empty fit range from the data and resets limits which are out of the data range.
+
+    Args:
+        x0 (numpy.ndarray): Energy axis as measured.
+        x0_corrected (numpy.ndarray): Energy axis corrected by the energy correction.
+        pre (list): The preset list, pre[0][1] and pre[0][2] are updated in place.
+
+    Returns:
+        tuple: (x1, x2) the limits of the fit range.
+    """
+    # if no range is specified, fill it from data
+    if pre[0][1] is None or len(str(pre[0][1])) == 0:
+        pre[0][1] = x0_corrected[0]
+    if pre[0][2] is None or len(str(pre[0][2])) == 0:
+        pre[0][2] = x0_corrected[-1]
+    # check if limits are out of of data range, If incorrect, back to default
+    x1 = pre[0][1]
+    if (
+        (x1 > x0_corrected[0] or x1 < x0_corrected[-1]) and x0_corrected[0] > x0[-1]
+    ) or (
+        (x1 < x0_corrected[0] or x1 > x0_corrected[-1])
+        and x0_corrected[0] < x0_corrected[-1]
+    ):
+        x1 = x0_corrected[0]
+        pre[0][1] = x1
+    x2 = pre[0][2]
+    if (
+        (x2 < x0_corrected[-1] or x2 > x1) and x0_corrected[0] > x0_corrected[-1]
+    ) or ((x2 > x0_corrected[-1] or x2 < x1) and x0_corrected[0] < x0[-1]):
+        x2 = x0_corrected[-1]
+        pre[0][2] = x2
+    return x1, x2
+
+
+def fit_weights(raw_y, rows_lightened=1):
+    """Returns the weights of the residuals.
+
+    The residuals are weighted by 1/sqrt(data), which is not possible if there are 0's in the data.
+
+    Args:
+        raw_y (numpy.ndarray): Intensities of the fit range.
+        rows_lightened (int, optional): Number of rows which were combined into one data point. Default is 1.
+
+    Returns:
+        tuple: (weights, zeros_in_data)
+    """
+    if np.any(raw_y == 0):
+        return 1 / (np.sqrt(rows_lightened)), True
+    return 1 / (np.sqrt(raw_y) * np.sqrt(rows_lightened)), False
+
+
+class ModelCache(BackgroundCache):
+    """LRU cache of the composite models and their parameters, keyed by the structure of the preset (see model_key).
+
+    Building the model of a preset instantiates and sums the components, copies their default parameters and parses
+    the expressions of the constraints. For a preset with the same structure as a cached one, e.g. in refine-fit-refine
+    loops, build_model only sets the values and bounds of the cached parameters and builds the backgrounds, which
+    depend on the data, again. The cached parameters are modified by every build, the lock keeps builds in different
+    threads apart.
+    """
+
+    def __init__(self, maxsize=16):
+        super().__init__(maxsize)
+        self.lock = threading.Lock()
+
+
+model_cache = ModelCache()
+
+
+def model_key(x, y, pre, tougaard_fft=False):
+    """Returns the structure of a preset, the key of the model cache.
+
+    Presets with the same key have the same composite model and parameters with the same expressions, they only differ
+    in the values and bounds of the parameters. The structure consists of the backgrounds, the line shapes of the
+    components, the references between the components and the filled cells of the constraints and of the limits.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        pre (list): The preset list.
+        tougaard_fft (bool, optional): The Tougaard backgrounds are calculated by FFT. Default is False.
+
+    Returns:
+        tuple: The key.
+    """
+    vbm = None
+    if 5 in pre[0][0]:
+        # the VBM background and the cutoff background are different models
+        vbm = bool((x[0] > x[-1] and y[0] > y[-1]) or (x[0] < x[-1] and y[0] < y[-1]))
+    shapes = tuple(pre[2][0][1::2])
+    references = tuple(tuple(pre[2][row][1::2]) for row in range(13, len(pre[2]), 2))
+    constraints = frozenset(
+        (row, col)
+        for row in range(1, len(pre[2]))
+        for col in range(1, len(pre[2][row]), 2)
+        if pre[2][row][col] is not None and len(str(pre[2][row][col])) > 0
+    )
+    limits = frozenset(
+        (row, col)
+        for row in range(len(pre[3]))
+        for col in range(len(pre[3][row]))
+        if col % 3 > 0
+        and pre[3][row][col - col % 3] == 2
+        and pre[3][row][col] is not None
+        and len(str(pre[3][row][col])) > 0
+    )
+    return tuple(pre[0][0]), tougaard_fft, vbm, shapes, references, constraints, limits
+
+
+def reset_parameters(pars, default_pars):
+    """Reset the parameters of the components before the values of a preset are set again by component_values.
+
+    The parameters of the components get the bounds, the vary flag and the value of their default parameters, the
+    parameters of the ratios and differences are unbounded. Expressions are kept, the background parameters are not
+    changed.
+
+    Args:
+        pars (lmfit.Parameters): Cached parameters of a model.
+        default_pars (tuple): The default parameters of each component, see component_models.
+    """
+    defaults = {}
+    for component_pars in default_pars:
+        defaults.update(component_pars)
+    for name, par in pars.items():
+        if name.startswith("bg_"):
+            continue
+        default = defaults.get(name)
+        if default is None:
+            par.min = -np.inf
+            par.max = np.inf
+            vary = True
+        else:
+            par.min = default.min
+            par.max = default.max
+            vary = default.vary
+        if par.expr is None:
+            par.vary = vary
+            if default is not None:
+                par.value = default.value
+
+
+def build_model(
+    x, y, pre, mode="fit", binding_ener=False, fixed_bg=False, tougaard_fft=False
+):
+    """Build the composite model (backgrounds + components) and its parameters from a preset.
+
+    The model and the parameters are cached by the structure of the preset (see ModelCache).
+
+    Args:
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities of the fit range.
+        pre (list): The preset list.
+        mode (str, optional): One of 'fit', 'eva' or 'sim'. In 'eva' and 'sim' mode all parameters are fixed.
+        binding_ener (bool, optional): The energy axis is a binding energy scale. Default is False.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+
+    Returns:
+        tuple: (mod, pars, static_bg) with the composite model, a copy of its parameters and the static background.
+
+    Raises:
+        ValueError: If a parameter references itself.
+    """
+    bg_mod, static_bg, bg_pars = bg_model_creator(
+        x, y, mode, pre[0][0], pre, fixed_bg=fixed_bg, tougaard_fft=tougaard_fft
+    )
+    key = model_key(x, y, pre, tougaard_fft=tougaard_fft)
+    with model_cache.lock:
+        cached = model_cache.get(key)
+        if cached is None:
+            mod, pars_pk = peak_selector(bg_mod, pre, binding_ener=binding_ener)
+            if bg_pars is not None:
+                pars = bg_pars
+                pars.update(pars_pk)
+            else:
+                pars = pars_pk
+            default_pars = component_models(tuple(pre[2][0][1::2]))[1]
+            model_cache.put(key, (mod, pars, default_pars))
+        else:
+            mod, pars, default_pars = cached
+            if shirley_integral(mod) is not None:
+                # the active Shirley background keeps the integral of the data, the new one is used
+                components = mod.components[len(bg_mod.components) :]
+                mod = bg_mod
+                for component in components:
+                    mod += component
+            reset_parameters(pars, default_pars)
+            if bg_pars is not None:
+                for name, par in bg_pars.items():
+                    pars[name] = par
+            for index_pk in range(len(default_pars)):
+                component_values(pars, pre, index_pk, binding_ener=binding_ener)
+        if mode == "eva" or mode == "sim":
+            for par in pars:
+                pars[par].vary = False
+        else:
+            peak_limits(pars, pre)
+        pars = copy.deepcopy(pars)
+    return mod, pars, static_bg
+
+
+def gaussian_jacobian(x, amplitude=1.0, center=0.0, sigma=1.0):
+    """Partial derivatives of lmfit's gaussian with respect to its parameters."""
+    sigma = max(lineshapes.tiny, sigma)
+    u = x - center
+    shape = np.exp(-(u**2) / (2 * sigma**2)) / (lineshapes.s2pi * sigma)
+    peak = amplitude * shape
+    return {
+        "amplitude": shape,
+        "center": peak * u / sigma**2,
+        "sigma": peak * (u**2 / sigma**3 - 1 / sigma),
+    }
+
+
+def lorentzian_jacobian(x, amplitude=1.0, center=0.0, sigma=1.0):
+    """Partial derivatives of lmfit's lorentzian with respect to its parameters."""
+    sigma = max(lineshapes.tiny, sigma)
+    u = x - center
+    denominator = u**2 + sigma**2
+    shape = sigma / (np.pi * denominator)
+    return {
+        "amplitude": shape,
+        "center": amplitude * shape * 2 * u / denominator,
+        "sigma": amplitude * (u**2 - sigma**2) / (np.pi * denominator**2),
+    }
+
+
+def voigt_jacobian(x, amplitude=1.0, center=0.0, sigma=1.0, gamma=None):
+    """Partial derivatives of lmfit's voigt, using the derivative of the Faddeeva function w'(z) = 2i/sqrt(pi) - 2z w(z)."""
+    tied = gamma is None
+    if tied:
+        gamma = sigma
+    sigma = max(lineshapes.tiny, sigma)
+    z = (x - center + 1j * gamma) / (sigma * lineshapes.s2)
+    w = wofz(z)
+    dw = 2j / np.sqrt(np.pi) - 2 * z * w
+    norm = amplitude / (sigma * lineshapes.s2pi)
+    partials = {
+        "amplitude": w.real / (sigma * lineshapes.s2pi),
+        "center": -norm * dw.real / (sigma * lineshapes.s2),
+        "sigma": -norm * w.real / sigma - norm * (dw * z).real / sigma,
+        "gamma": -norm * dw.imag / (sigma * lineshapes.s2),
+    }
+    if tied:
+        partials["sigma"] = partials["sigma"] + partials.pop("gamma")
+    return partials
+
+
+def pvoigt_jacobian(x, amplitude=1.0, center=0.0, sigma=1.0, fraction=0.5):
+    """Partial derivatives of lmfit's pvoigt with respect to its parameters."""
+    sigma_factor = 1 / np.sqrt(2 * np.log(2))
+    gauss = gaussian_jacobian(x, amplitude, center, sigma * sigma_factor)
+    lorentz = lorentzian_jacobian(x, amplitude, center, sigma)
+    return {
+        "amplitude": (1 - fraction) * gauss["amplitude"] + fraction * lorentz["amplitude"],
+        "center": (1 - fraction) * gauss["center"] + fraction * lorentz["center"],
+        "sigma": (1 - fraction) * gauss["sigma"] * sigma_factor + fraction * lorentz["sigma"],
+        "fraction": amplitude * (lorentz["amplitude"] - gauss["amplitude"]),
+    }
+
+
+def doniach_jacobian(x, amplitude=1.0, center=0, sigma=1.0, gamma=0.0):
+    """Partial derivatives of the doniach line shape (lmfit and lmfitxps) with respect to its parameters."""
+    sigma = max(lineshapes.tiny, sigma)
+    u = (x - center) / sigma
+    gm1 = 1.0 - gamma
+    phase = np.pi * gamma / 2 + gm1 * np.arctan(u)
+    scale = 1 / (sigma**gm1 * (1 + u**2) ** (gm1 / 2))
+    shape = scale * np.cos(phase)
+    peak = amplitude * shape
+    d_u = -amplitude * gm1 * scale * (np.sin(phase) + u * np.cos(phase)) / (1 + u**2)
+    return {
+        "amplitude": shape,
+        "center": -d_u / sigma,
+        "sigma": -gm1 * peak / sigma - d_u * u / sigma,
+        "gamma": peak * (np.log(sigma) + np.log1p(u**2) / 2)
+        - amplitude * scale * np.sin(phase) * (np.pi / 2 - np.arctan(u)),
+    }
+
+
+def convolution_jacobian(x, amplitude, profile, profile_partials, gaussian_sigma):
+    """Partial derivatives of the lmfitxps convolution of a profile with a Gaussian, normalized to amplitude.
+
+    The convolution is linear in the profile and in the Gaussian kernel, so the derivatives are the convolutions of
+    the profile derivatives with the kernel and of the profile with the kernel derivative.
+    """
+    is_binding_energy = x[-1] < x[0]
+    u = x - np.mean(x)
+    kernel = lineshapes.gaussian(x, amplitude=1, center=np.mean(x), sigma=gaussian_sigma) / (
+        lineshapes.s2pi * gaussian_sigma
+    )
+    d_kernel = kernel * (u**2 / gaussian_sigma**3 - 2 / gaussian_sigma)
+    conv = xps_lineshapes.fft_convolve(profile, kernel, is_binding_energy)
+    index = np.argmax(conv)
+    norm = conv[index]
+
+    def normalized(d_conv):
+        return amplitude * (d_conv / norm - conv * d_conv[index] / norm**2)
+
+    partials = {"amplitude": conv / norm}
+    for name, partial in profile_partials.items():
+        partials[name] = normalized(
+            xps_lineshapes.fft_convolve(partial, kernel, is_binding_energy)
+        )
+    partials["gaussian_sigma"] = normalized(
+        xps_lineshapes.fft_convolve(profile, d_kernel, is_binding_energy)
+    )
+    return partials
+
+
+def singlett_jacobian(x, amplitude, sigma, gamma, gaussian_sigma, center):
+    """Partial derivatives of the lmfitxps singlett (ConvGaussianDoniachSinglett)."""
+    doniach = doniach_jacobian(x, 1, center, sigma, gamma)
+    profile = doniach.pop("amplitude")
+    return convolution_jacobian(x, amplitude, profile, doniach, gaussian_sigma)
+
+
+def dublett_jacobian(
+    x, amplitude, sigma, gamma, gaussian_sigma, center, soc, height_ratio, fct_coster_kronig
+):
+    """Partial derivatives of the lmfitxps dublett (ConvGaussianDoniachDublett)."""
+    is_binding_energy = x[-1] < x[0]
+    soc_sign = 1 if is_binding_energy else -1
+    first = doniach_jacobian(x, 1, center, sigma, gamma)
+    second = doniach_jacobian(
+        x, height_ratio, center + soc_sign * soc, fct_coster_kronig * sigma, gamma
+    )
+    profile = first["amplitude"] + height_ratio * second["amplitude"]
+    profile_partials = {
+        "sigma": first["sigma"] + fct_coster_kronig * second["sigma"],
+        "gamma": first["gamma"] + second["gamma"],
+        "center": first["center"] + second["center"],
+        "soc": soc_sign * second["center"],
+        "height_ratio": second["amplitude"],
+        "fct_coster_kronig": sigma * second["sigma"],
+    }
+    return convolution_jacobian(x, amplitude, profile, profile_partials, gaussian_sigma)
+
+
+# analytic derivatives of the model functions, all other components are differentiated numerically
+jacobian_functions = {
+    lineshapes.gaussian: gaussian_jacobian,
+    lineshapes.lorentzian: lorentzian_jacobian,
+    lineshapes.voigt: voigt_jacobian,
+    lineshapes.pvoigt: pvoigt_jacobian,
+    lineshapes.doniach: doniach_jacobian,
+    xps_lineshapes.doniach: doniach_jacobian,
+    xps_lineshapes.singlett: singlett_jacobian,
+    xps_lineshapes.dublett: dublett_jacobian,
+}
+
+
+def component_jacobian(component, params, kwargs, names):
+    """Partial derivatives of one component with respect to its parameters.
+
+    Args:
+        component (lmfit.Model): A component of the composite model.
+        params (lmfit.Parameters): The current parameters.
+        kwargs (dict): The independent variables (x, y).
+        names (set): The (prefixed) parameter names the derivatives are needed for.
+
+    Returns:
+        dict: The derivative of each needed parameter of the component, keyed by the prefixed name.
+    """
+    args = component.make_funcargs(params, kwargs)
+    prefix = component.prefix
+    roots = [
+        name[len(prefix) :]
+        for name in component.param_names
+        if name in names and name[len(prefix) :] in args
+    ]
+    if len(roots) == 0:
+        return {}
+    derivative = jacobian_functions.get(component.func)
+    if derivative is not None:
+        partials = derivative(**args)
+        return {prefix + root: partials[root] for root in roots if root in partials}
+    # forward differences, only this component is evaluated again
+    partials = {}
+    value = np.asarray(component.func(**args), dtype=float)
+    for root in roots:
+        step = np.sqrt(np.finfo(float).eps) * max(abs(args[root]), 1.0)
+        shifted = dict(args)
+        shifted[root] = args[root] + step
+        partials[prefix + root] = (
+            np.asarray(component.func(**shifted), dtype=float) - value
+        ) / step
+    return partials
+
+
+def expression_dependents(params, var_names, arguments):
+    """Find the constrained parameters which depend on each variable, in the order they have to be evaluated.
+
+    Only the parameters which are arguments of the model functions, or which these depend on, are considered, e.g.
+    not the fwhm and height of the peaks.
+
+    Args:
+        params (lmfit.Parameters): The parameters.
+        var_names (list): Names of the variables.
+        arguments (set): Names of the parameters which are arguments of the model functions.
+
+    Returns:
+        dict: The list of dependent parameter names for each variable.
+    """
+    order = []
+    depends = {}
+
+    def visit(name):
+        if name in depends:
+            return depends[name]
+        depends[name] = set()
+        par = params[name]
+        if par.expr is None:
+            depends[name] = {name}
+            return depends[name]
+        for dep in par._expr_deps:
+            if dep in params:
+                depends[name] |= visit(dep)
+        order.append(name)
+        return depends[name]
+
+    required = set()
+
+    def require(name):
+        if name in required or params[name].expr is None:
+            return
+        required.add(name)
+        for dep in params[name]._expr_deps:
+            if dep in params:
+                require(dep)
+
+    for name in params:
+        visit(name)
+        if name in arguments:
+            require(name)
+    return {
+        var_name: [name for name in order if name in required and var_name in depends[name]]
+        for var_name in var_names
+    }
+
+
+def expression_derivatives(params, var_name, dependents):
+    """Derivatives of constrained parameters with respect to one variable, by forward differences of the expressions.
+
+    Returns:
+        dict: The derivative of each dependent parameter.
+    """
+    par = params[var_name]
+    value = par.value
+    step = np.sqrt(np.finfo(float).eps) * max(abs(value), 1.0)
+    if value + step > par.max:
+        step = -step
+    before = [params[name].value for name in dependents]
+    par.value = value + step
+    after = [params[name].value for name in dependents]
+    par.value = value
+    for name in dependents:
+        # evaluate the expressions again to restore their values
+        params[name].value
+    return {
+        name: (new - old) / step for name, old, new in zip(dependents, before, after)
+    }
+
+
+def is_sum_of_components(model):
+    """Checks if a (composite) model is a sum of its components."""
+    if isinstance(model, CompositeModel):
+        return (
+            model.op is operator.add
+            and is_sum_of_components(model.left)
+            and is_sum_of_components(model.right)
+        )
+    return True
+
+
+class ModelJacobian:
+    """Jacobian of the residual of a composite model, passed to leastsq as Dfun instead of finite differences.
+
+    The model is a sum of components, so each column is the derivative of the component the parameter belongs to,
+    analytic for the shapes in jacobian_functions. Constrained parameters (e.g. doublet ratios and linked centers)
+    are chained to the variables they depend on.
+    """
+
+    def __init__(self, model):
+        self.components = model.components
+        self.dependents = None
+        self.evaluations = 0
+        self.evaluation_time = 0.0
+
+    def __call__(self, params, data, weights, **kwargs):
+        start = time.perf_counter()
+        var_names = [name for name, par in params.items() if par.vary]
+        if self.dependents is None:
+            arguments = set()
+            for component in self.components:
+                args = component.make_funcargs(params, kwargs)
+                arguments.update(
+                    name for name in component.param_names if name[len(component.prefix) :] in args
+                )
+            self.dependents = expression_dependents(params, var_names, arguments)
+        names = set(var_names)
+        for dependents in self.dependents.values():
+            names.update(dependents)
+        partials = {}
+        for component in self.components:
+            partials.update(component_jacobian(component, params, kwargs, names))
+        jac = np.zeros((len(var_names), len(data)))
+        for row, var_name in enumerate(var_names):
+            if var_name in partials:
+                jac[row] += partials[var_name]
+            dependents = [name for name in self.dependents[var_name] if name in partials]
+            if len(dependents) > 0:
+                derivatives = expression_derivatives(params, var_name, self.dependents[var_name])
+                for name in dependents:
+                    jac[row] += derivatives[name] * partials[name]
+        self.evaluations += 1
+        self.evaluation_time += time.perf_counter() - start
+        # the residual is (data - model) * weights
+        if weights is None:
+            return -jac
+        return -jac * weights
+
+
+def jacobian_fit_kws(model):
+    """Returns the fit_kws of Model.fit to use the ModelJacobian, None if the model is not a sum of components."""
+    if not is_sum_of_components(model):
+        return None
+    return {"Dfun": ModelJacobian(model), "col_deriv": 1}
+
+
+def component_label(component):
+    """Returns the prefix of a component without the trailing underscore, the function name if it has no prefix."""
+    label = component.prefix.rstrip("_")
+    if len(label) == 0:
+        return component.func.__name__
+    return label
+
+
+class FitProfile:
+    """Instrumentation of a fit: time per model evaluation, per component and per Jacobian, chi-square per iteration.
+
+    The fit has to be run with the model attribute and the fit_kws (see run_fit), model is a copy of the given model
+    whose eval and the eval of its components are timed between start and stop. The given model and its components are not modified. iteration is
+    called from the iteration callback of the fit with the residual of each evaluation. Backgrounds are the
+    components with a 'bg_' prefix, the static backgrounds are calculated before the fit and are not part of the
+    profile.
+    """
+
+    def __init__(self, model, fit_kws=None):
+        self.fit_kws = fit_kws
+        self.jacobian = None if fit_kws is None else fit_kws.get("Dfun")
+        self.total = {"evaluations": 0, "time": 0.0}
+        self.components = OrderedDict()
+        if isinstance(model, CompositeModel):
+            for component in model.components:
+                self.components[component_label(component)] = {"evaluations": 0, "time": 0.0}
+        else:
+            self.components[component_label(model)] = self.total
+        self.iterations = []
+        self.start_time = None
+        self.wall_time = 0.0
+        self.model = self.timed_model(model, self.total)
+
+    def timed(self, evaluate, counter):
+        def eval(params=None, **kwargs):
+            if self.start_time is None:
+                return evaluate(params=params, **kwargs)
+            start = time.perf_counter()
+            value = evaluate(params=params, **kwargs)
+            counter["time"] += time.perf_counter() - start
+            counter["evaluations"] += 1
+            return value
+
+        return eval
+
+    def timed_model(self, model, counter=None):
+        """Returns a shallow copy of a (composite) model with timed eval methods, the model is not modified."""
+        timed = copy.copy(model)
+        if isinstance(model, CompositeModel):
+            timed.left = self.timed_model(model.left)
+            timed.right = self.timed_model(model.right)
+        elif counter is None:
+            counter = self.components[component_label(model)]
+        if counter is not None:
+            timed.eval = self.timed(timed.eval, counter)
+        return timed
+
+    def start(self):
+        """Start the wall time and the timing of the evaluations."""
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        """Stop the wall time and the timing of the evaluations, e.g. of the curves calculated after the fit."""
+        self.wall_time = self.elapsed()
+        self.start_time = None
+
+    def elapsed(self):
+        if self.start_time is None:
+            return self.wall_time
+        return time.perf_counter() - self.start_time
+
+    def iteration(self, iteration, resid):
+        """Record the chi-square of an iteration, resid is the weighted residual passed to the iteration callback."""
+        self.iterations.append([int(iteration), float(np.sum(np.square(resid))), self.elapsed()])
+
+    def to_dict(self):
+        """Returns the profile as a dict of plain types, e.g. to be written as JSON."""
+        components = OrderedDict()
+        kinds = {"background": 0.0, "peak": 0.0}
+        for label, counter in self.components.items():
+            kind = "background" if label.startswith("bg_") else "peak"
+            kinds[kind] += counter["time"]
+            components[label] = {
+                "kind": kind,
+                "evaluations": counter["evaluations"],
+                "time": counter["time"],
+                "time_per_evaluation": counter["time"] / max(counter["evaluations"], 1),
+                "share": counter["time"] / self.total["time"] if self.total["time"] > 0 else 0.0,
+            }
+        return {
+            "wall_time": self.elapsed(),
+            "evaluations": self.total["evaluations"],
+            "evaluation_time": self.total["time"],
+            "time_per_evaluation": self.total["time"] / max(self.total["evaluations"], 1),
+            "jacobian_evaluations": 0 if self.jacobian is None else self.jacobian.evaluations,
+            "jacobian_time": 0.0 if self.jacobian is None else self.jacobian.evaluation_time,
+            "background_time": kinds["background"],
+            "peak_time": kinds["peak"],
+            "components": components,
+            "iterations": list(self.iterations),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def summary(self):
+        """Returns the wall time, the cost per evaluation and the component which dominates the evaluations."""
+        profile = self.to_dict()
+        text = "Fit profile: {:.3g} s wall time, {} model evaluations ({:.3g} ms each)".format(
+            profile["wall_time"], profile["evaluations"], profile["time_per_evaluation"] * 1e3
+        )
+        if profile["jacobian_evaluations"] > 0:
+            text += ", {} Jacobians ({:.3g} ms each)".format(
+                profile["jacobian_evaluations"],
+                profile["jacobian_time"] / profile["jacobian_evaluations"] * 1e3,
+            )
+        if len(profile["components"]) > 1 and profile["evaluation_time"] > 0:
+            label, slowest = max(profile["components"].items(), key=lambda item: item[1]["time"])
+            text += ", slowest component: {} ({:.0%} of the evaluation time)".format(label, slowest["share"])
+        return text
+
+
+class ComponentCurves:
+    """The components of a fit evaluated on the energy axis of the fit range and on a ten times oversampled axis."""
+
+    def __init__(self, x, comps, x_interpolate, comps_interpolate):
+        self.x = x
+        self.comps = comps
+        self.x_interpolate = x_interpolate
+        self.comps_interpolate = comps_interpolate
+
+
+def component_curves(out, x):
+    """Evaluate the components of a fit once and cache them on the fit result.
+
+    The results table, the areas, the FWHMs, the plot and the export all need the component curves, the cache
+    avoids evaluating the whole model again for each of them.
+
+    Args:
+        out (lmfit.model.ModelResult): The fit result, the curves are stored as out.component_curves.
+        x (numpy.ndarray): Energy axis of the fit range.
+
+    Returns:
+        ComponentCurves: The components on x and on np.linspace(x[0], x[-1], 10 * len(x)).
+    """
+    curves = getattr(out, "component_curves", None)
+    if curves is not None and np.array_equal(curves.x, x):
+        return curves
+    x_interpolate = np.linspace(x[0], x[-1], 10 * len(x))
+    curves = ComponentCurves(
+        x,
+        out.eval_components(x=x),
+        x_interpolate,
+        out.eval_components(x=x_interpolate),
+    )
+    out.component_curves = curves
+    return curves
+
+
+def result_frame(out, x, raw_x, raw_y, static_bg, pre, comps=None, names=None):
+    """Collect the data, the backgrounds and the components of a fit in one DataFrame.
+
+    Args:
+        out (lmfit.model.ModelResult): The fit result.
+        x (numpy.ndarray): Corrected energy axis of the fit range.
+        raw_x (numpy.ndarray): Energy axis of the fit range as measured.
+        raw_y (numpy.ndarray): Intensities of the fit range.
+        static_bg (numpy.ndarray or int): Static background, 0 if none was used.
+        pre (list): The preset list.
+        comps (dict, optional): Evaluated components of out, evaluated if not given.
+        names (list, optional): Column names of the components, taken from the preset if not given.
+
+    Returns:
+        tuple: (result, bg_comps) with the DataFrame and a dict of the background components.
+    """
+    if comps is None:
+        comps = component_curves(out, x).comps
+    if names is None:
+        names = component_names(pre)
+    sum_background = np.array([0.0] * len(x))
+    bg_comps = dict()
+    for key in comps:
+        if "bg_" in key:
+            bg_comps[key] = comps[key]
+            sum_background += comps[key]
+    df_raw_x = pd.DataFrame(raw_x, columns=["raw_x"])
+    df_raw_y = pd.DataFrame(raw_y, columns=["raw_y"])
+    df_corrected_x = pd.DataFrame(x, columns=["corrected x"])
+    df_y = pd.DataFrame(raw_y - sum_background - static_bg, columns=["data-bg"])
+    df_pks = pd.DataFrame(out.best_fit - sum_background, columns=["sum_components"])
+    df_b = pd.DataFrame(sum_background + static_bg, columns=["bg"])
+    df_residual = pd.DataFrame(out.residual, columns=["residual"])
+    if isinstance(static_bg, int):
+        df_b_static = pd.DataFrame(
+            [0] * len(sum_background), columns=["bg_static (not used)"]
+        )
+        df_sum = pd.DataFrame(out.best_fit, columns=["sum_fit"])
+    else:
+        df_b_static = pd.DataFrame(static_bg, columns=["bg_static"])
+        df_sum = pd.DataFrame(out.best_fit + static_bg, columns=["sum_fit"])
+    result = pd.concat(
+        [
+            df_raw_x,
+            df_raw_y,
+            df_corrected_x,
+            df_y,
+            df_pks,
+            df_b,
+            df_b_static,
+            df_sum,
+            df_residual,
+        ],
+        axis=1,
+    )
+    df_bg_comps = pd.DataFrame.from_dict(bg_comps, orient="columns")
+    result = pd.concat([result, df_bg_comps], axis=1)
+    for index_pk in range(int(len(pre[2][0]) / 2)):
+        df_c = pd.DataFrame(
+            comps[component_prefix(pre, index_pk)], columns=[names[index_pk]]
+        )
+        result = pd.concat([result, df_c], axis=1)
+    return result, bg_comps
+
+
+def peak_metrics(x, curves):
+    """Height, FWHM and areas of several peaks in one vectorised pass.
+
+    The FWHM is found by linear interpolation between the points enclosing the half maximum of each curve.
+
+    Args:
+        x (numpy.ndarray): Energy axis of the curves, ascending or descending.
+        curves (array_like): The peak curves, one row per component (components x points).
+
+    Returns:
+        dict: Arrays with one entry per curve: 'height', 'fwhm' (NaN if the height is not positive), 'area'
+            (Simpson), 'area_trapz' (trapezoid) and 'fraction' (area relative to the sum of all areas). The areas
+            are absolute values.
+    """
+    x = np.asarray(x, dtype=float)
+    curves = np.atleast_2d(np.asarray(curves, dtype=float))
+    n = curves.shape[1]
+    rows = np.arange(curves.shape[0])
+    height = np.max(curves, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peak_norm = curves / height[:, None]
+        above = peak_norm >= 0.5
+        i1 = np.argmax(above, axis=1)
+        i2 = n - 1 - np.argmax(above[:, ::-1], axis=1)
+        j1 = np.maximum(i1 - 1, 0)
+        j2 = np.minimum(i2 + 1, n - 1)
+        x1 = np.where(
+            i1 > 0,
+            x[j1]
+            + (0.5 - peak_norm[rows, j1])
+            * (x[i1] - x[j1])
+            / (peak_norm[rows, i1] - peak_norm[rows, j1]),
+            x[i1],
+        )
+        x2 = np.where(
+            i2 < n - 1,
+            x[i2]
+            + (0.5 - peak_norm[rows, i2])
+            * (x[j2] - x[i2])
+            / (peak_norm[rows, j2] - peak_norm[rows, i2]),
+            x[i2],
+        )
+    fwhm = np.abs(x2 - x1)
+    fwhm[~(height > 0) | ~np.any(above, axis=1)] = np.nan
+    area = np.abs(integrate.simpson(curves, x=x, axis=1))
+    area_trapz = np.abs(integrate.trapezoid(curves, x=x, axis=1))
+    total = np.sum(area)
+    fraction = area / total if total != 0 else np.full_like(area, np.nan)
+    return {
+        "height": height,
+        "fwhm": fwhm,
+        "area": area,
+        "area_trapz": area_trapz,
+        "fraction": fraction,
+    }
+
+
+def component_metrics(out, x, pre):
+    """Height, FWHM and areas of all components on the ten times oversampled energy axis.
+
+    Args:
+        out (lmfit.model.ModelResult): The fit result.
+        x (numpy.ndarray): Energy axis of the fit range.
+        pre (list): The preset list.
+
+    Returns:
+        dict: For each component's prefix a dict with the entries of peak_metrics.
+    """
+    curves = component_curves(out, x)
+    prefixes = [component_prefix(pre, index_pk) for index_pk in range(int(len(pre[2][0]) / 2))]
+    if len(prefixes) == 0:
+        return dict()
+    metrics = peak_metrics(
+        curves.x_interpolate, [curves.comps_interpolate[prefix] for prefix in prefixes]
+    )
+    return {
+        prefix: {key: value[i] for key, value in metrics.items()}
+        for i, prefix in enumerate(prefixes)
+    }
+
+
+def component_areas(out, x, pre):
+    """Integrate all components on a ten times oversampled energy axis.
+
+    Args:
+        out (lmfit.model.ModelResult): The fit result.
+        x (numpy.ndarray): Energy axis of the fit range.
+        pre (list): The preset list.
+
+    Returns:
+        dict: The absolute area of each component, keyed by the component's prefix.
+    """
+    return {
+        prefix: metrics["area"]
+        for prefix, metrics in component_metrics(out, x, pre).items()
+    }
+
+
+# the rows of the results table of the GUI and the properties of the peak metadata of the _fit.txt export
+result_properties = [
+    "gaussian_fwhm",
+    "lorentzian_fwhm_p1",
+    "lorentzian_fwhm_p2",
+    "fwhm_p1",
+    "fwhm_p2",
+    "height_p1",
+    "height_p2",
+    "approx_area_p1",
+    "approx_area_p2",
+    "area_total",
+]
+
+
+def area_text(area, fraction):
+    """Returns an area with its area fraction in percent, e.g. '1234.5 (50.00%)'."""
+    return str(format(area, ".1f") + r" ({}%)".format(format(fraction * 100, ".2f")))
+
+
+def component_results(out, x, pre, metrics=None):
+    """FWHMs, heights and areas of all components, the content of the results table of the GUI.
+
+    The two peaks of a doublet (Convolution Gaussian/Doniach-Dublett) are evaluated separately, their properties end
+    with _p1 and _p2.
+
+    Args:
+        out (lmfit.model.ModelResult): The fit result.
+        x (numpy.ndarray): Energy axis of the fit range.
+        pre (list): The preset list.
+        metrics (dict, optional): Metrics of the components, see component_metrics. Calculated if None.
+
+    Returns:
+        list: One dict per component, keyed by the entries of result_properties. The values are floats, the areas
+            are texts (see area_text), 'Error in calculation' if the FWHM of a peak with zero height was requested
+            and None if the property does not apply to the line shape.
+    """
+    if metrics is None:
+        metrics = component_metrics(out, x, pre)
+    params = out.params
+    shapes = [pre[2][0][2 * index_pk + 1] for index_pk in range(int(len(pre[2][0]) / 2))]
+    # the two singletts of each doublet (index 10), evaluated for all doublets at once
+    doublet_pks = [index_pk for index_pk, index in enumerate(shapes) if index == 10]
+    if len(doublet_pks) > 0:
+        x_interpolate = component_curves(out, x).x_interpolate
+        doublet_curves = []
+        for index_pk in doublet_pks:
+            prefix = component_prefix(pre, index_pk)
+            doublet_curves.append(
+                xps_lineshapes.singlett(
+                    x_interpolate,
+                    amplitude=params[prefix + "amplitude"].value,
+                    sigma=params[prefix + "sigma"].value,
+                    gamma=params[prefix + "gamma"].value,
+                    gaussian_sigma=params[prefix + "gaussian_sigma"].value,
+                    center=params[prefix + "center"].value,
+                )
+            )
+            doublet_curves.append(
+                xps_lineshapes.singlett(
+                    x_interpolate,
+                    amplitude=params[prefix + "amplitude"].value * params[prefix + "height_ratio"].value,
+                    sigma=params[prefix + "sigma"].value * params[prefix + "fct_coster_kronig"].value,
+                    gamma=params[prefix + "gamma"].value,
+                    gaussian_sigma=params[prefix + "gaussian_sigma"].value,
+                    center=params[prefix + "center"].value - params[prefix + "soc"].value,
+                )
+            )
+        doublet_metrics = peak_metrics(x_interpolate, doublet_curves)
+    results = []
+    for index_pk, index in enumerate(shapes):
+        prefix = component_prefix(pre, index_pk)
+        pk_metrics = metrics[prefix]
+        result = dict.fromkeys(result_properties)
+        if index in [0, 1, 2, 3]:
+            result["fwhm_p1"] = params[prefix + "fwhm"].value
+            result["height_p1"] = params[prefix + "height"].value
+        if index == 0:
+            result["gaussian_fwhm"] = params[prefix + "fwhm"].value
+        if index == 1:
+            result["lorentzian_fwhm_p1"] = params[prefix + "fwhm"].value
+        if index == 2:
+            result["gaussian_fwhm"] = params[prefix + "sigma"].value
+            result["lorentzian_fwhm_p1"] = 2 * params[prefix + "gamma"].value
+        if index == 3:
+            result["gaussian_fwhm"] = params[prefix + "sigma"].value / np.sqrt(2 * np.log(2))
+            result["lorentzian_fwhm_p1"] = 2 * params[prefix + "sigma"].value
+        if index == 9:
+            result["lorentzian_fwhm_p1"] = 2 * params[prefix + "sigma"].value
+            result["height_p1"] = params[prefix + "amplitude"].value
+            result["fwhm_p1"] = pk_metrics["fwhm"]
+        if index == 10 or index == 11:
+            result["gaussian_fwhm"] = params[prefix + "gaussian_sigma"].value * 2 * np.sqrt(2 * np.log(2))
+            result["height_p1"] = params[prefix + "amplitude"].value
+            result["area_total"] = area_text(pk_metrics["area"], pk_metrics["fraction"])
+        if index == 11:
+            result["lorentzian_fwhm_p1"] = 2 * params[prefix + "lorentzian_fwhm"].value
+            if pk_metrics["height"] != 0:
+                result["fwhm_p1"] = pk_metrics["fwhm"]
+            else:
+                logging.warning(
+                    "Invalid value encountered in true division: Probably one of the amplitudes is set to 0."
+                )
+                result["fwhm_p1"] = "Error in calculation"
+            result["approx_area_p1"] = result["area_total"]
+        elif index == 10:
+            result["lorentzian_fwhm_p1"] = params[prefix + "lorentzian_fwhm_p1"].value
+            result["lorentzian_fwhm_p2"] = params[prefix + "lorentzian_fwhm_p2"].value
+            result["height_p2"] = params[prefix + "amplitude"].value * params[prefix + "height_ratio"].value
+            k = 2 * doublet_pks.index(index_pk)
+            if doublet_metrics["height"][k] != 0 and doublet_metrics["height"][k + 1] != 0:
+                result["fwhm_p1"] = doublet_metrics["fwhm"][k]
+                result["fwhm_p2"] = doublet_metrics["fwhm"][k + 1]
+            else:
+                logging.warning(
+                    "Invalid value encountered in true division: Probably one of the amplitudes is set to 0."
+                )
+                result["fwhm_p1"] = "Error in calculation"
+                result["fwhm_p2"] = "Error in calculation"
+            area_p1 = doublet_metrics["area"][k]
+            area_p2 = doublet_metrics["area"][k + 1]
+            area_ges = area_p1 + area_p2
+            result["approx_area_p1"] = area_text(area_p1, area_p1 / area_ges)
+            result["approx_area_p2"] = area_text(area_p2, area_p2 / area_ges)
+        else:
+            # the area of a single peak, shown as 100 % of the component
+            result["approx_area_p1"] = area_text(pk_metrics["area"], 1)
+            result["area_total"] = result["approx_area_p1"]
+        if index == 12:
+            result["height_p1"] = params[prefix + "amplitude"].value
+            result["gaussian_fwhm"] = params[prefix + "sigma"].value * 2 * np.sqrt(2 * np.log(2))
+            result["fwhm_p1"] = result["gaussian_fwhm"]
+        results.append(result)
+    return results
+
+
+def result_export(results, pre, precision=5):
+    """Peak metadata of the _fit.txt export.
+
+    Args:
+        results (list): The results of the components, see component_results.
+        pre (list): The preset list.
+        precision (int, optional): Number of decimals the values are rounded to. Default is 5, two more than the
+            default number format of the GUI.
+
+    Returns:
+        list: One dict per component, keyed by '<prefix><property>'.
+    """
+    meta_result_export = []
+    for index_pk, result in enumerate(results):
+        prefix = component_prefix(pre, index_pk)
+        meta_result_export.append(
+            {
+                prefix + name: value if value is None or isinstance(value, str) else np.round(value, precision)
+                for name, value in result.items()
+            }
+        )
+    return meta_result_export
+
+
+class FitOutput:
+    """Results of a fit run by fit_spectrum."""
+
+    def __init__(
+        self, out, pre, x, y, raw_x, raw_y, static_bg, zeros_in_data, comps, metrics, result, bg_comps, profile=None
+    ):
+        self.out = out
+        self.pre = pre
+        self.x = x
+        self.y = y
+        self.raw_x = raw_x
+        self.raw_y = raw_y
+        self.static_bg = static_bg
+        self.zeros_in_data = zeros_in_data
+        self.comps = comps
+        self.metrics = metrics
+        self.areas = {prefix: values["area"] for prefix, values in metrics.items()}
+        self.result = result
+        self.bg_comps = bg_comps
+        self.profile = profile
+
+
+class FitSetup:
+    """Data, model and parameters of a fit, prepared by prepare_fit."""
+
+    def __init__(
+        self, mod, pars, x0_corrected, x, y, raw_x, raw_y, static_bg, weights, zeros_in_data, binding_ener
+    ):
+        self.mod = mod
+        self.pars = pars
+        self.x0_corrected = x0_corrected
+        self.x = x
+        self.y = y
+        self.raw_x = raw_x
+        self.raw_y = raw_y
+        self.static_bg = static_bg
+        self.weights = weights
+        self.zeros_in_data = zeros_in_data
+        self.binding_ener = binding_ener
+
+
+def prepare_fit(
+    x0, y0, pre, mode="fit", rows_lightened=1, binding_ener=None, fixed_bg=False, tougaard_fft=False
+):
+    """Prepare the fit of a spectrum with a preset: energy correction, fit range, model, parameters and weights.
+
+    The first step of every fit, shared by fit_spectrum and PrettyWidget.ana. The fit itself is run by run_fit.
+
+    Args:
+        x0 (numpy.ndarray): Energy axis of the spectrum.
+        y0 (numpy.ndarray): Intensities of the spectrum.
+        pre (list): The preset list. An empty or invalid fit range is filled from the data in place, see check_range.
+        mode (str, optional): 'fit' to optimize the parameters, 'eva' or 'sim' to evaluate the preset. Default is 'fit'.
+        rows_lightened (int, optional): Number of rows which were combined into one data point. Default is 1.
+        binding_ener (bool, optional): The energy axis is a binding energy scale, detected from x0 if None.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+
+    Returns:
+        FitSetup: The fit range (x, the intensities without the static background y, raw_x and raw_y), the model,
+            its parameters, the static background and the weights of the residuals.
+
+    Raises:
+        ValueError: If a parameter of the preset references itself.
+    """
+    if binding_ener is None:
+        binding_ener = x0[-1] < x0[0]
+    correct_energy = 0
+    if len(pre[0]) > 5 and pre[0][5] is not None and len(str(pre[0][5])) > 0:
+        correct_energy = pre[0][5]
+    x0_corrected = x0 - correct_energy
+    x1, x2 = check_range(x0, x0_corrected, pre)
+    [x, y] = fit_range(x0_corrected, y0, x1, x2)
+    raw_y = y.copy()
+    raw_x = x + correct_energy
+
+    mod, pars, static_bg = build_model(
+        x,
+        y,
+        pre,
+        mode=mode,
+        binding_ener=binding_ener,
+        fixed_bg=fixed_bg,
+        tougaard_fft=tougaard_fft,
+    )
+    y = raw_y - static_bg
+    weights, zeros_in_data = fit_weights(raw_y, rows_lightened)
+    return FitSetup(
+        mod, pars, x0_corrected, x, y, raw_x, raw_y, static_bg, weights, zeros_in_data, binding_ener
+    )
+
+
+def run_fit(setup, params=None, mode="fit", iter_cb=None, profile=None):
+    """Run the fit (or the evaluation) of a spectrum prepared by prepare_fit.
+
+    Args:
+        setup (FitSetup): The prepared fit.
+        params (lmfit.Parameters, optional): The starting parameters, the parameters of the setup if None.
+        mode (str, optional): 'fit' to optimize the parameters, 'eva' or 'sim' to evaluate them. Default is 'fit'.
+        iter_cb (callable, optional): Iteration callback passed to lmfit in 'fit' mode.
+        profile (FitProfile, optional): Profile of the fit, made for the model of the setup. The fit runs on its
+            model with its fit_kws. A profile without fit_kws is created if None.
+
+    Returns:
+        tuple: (out, profile) with the lmfit.model.ModelResult and the FitProfile of the fit.
+    """
+    if params is None:
+        params = setup.pars
+    if profile is None:
+        profile = FitProfile(setup.mod)
+
+    def per_iteration(params, iteration, resid, *args, **kws):
+        profile.iteration(iteration, resid)
+        if iter_cb is not None:
+            return iter_cb(params, iteration, resid, *args, **kws)
+
+    profile.start()
+    try:
+        if mode == "eva" or mode == "sim":
+            out = profile.model.fit(
+                setup.y, params, x=setup.x, weights=setup.weights, y=setup.y
+            )
+        else:
+            out = profile.model.fit(
+                setup.y,
+                params,
+                x=setup.x,
+                weights=setup.weights,
+                iter_cb=per_iteration,
+                fit_kws=profile.fit_kws,
+                y=setup.raw_y,
+            )
+    finally:
+        profile.stop()
+    return out, profile
+
+
+def fit_spectrum(
+    x0,
+    y0,
+    pre,
+    mode="fit",
+    rows_lightened=1,
+    fixed_bg=False,
+    iter_cb=None,
+    tougaard_fft=False,
+    jacobian=True,
+):
+    """Fit (or evaluate) a spectrum with a preset, the headless counterpart of PrettyWidget.ana.
+
+    Args:
+        x0 (array_like): Energy axis of the spectrum.
+        y0 (array_like): Intensities of the spectrum.
+        pre (list): The preset list, e.g. from load_preset. It is not modified.
+        mode (str, optional): 'fit' to optimize the parameters, 'eva' or 'sim' to evaluate the preset. Default is 'fit'.
+        rows_lightened (int, optional): Number of rows which were combined into one data point. Default is 1.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        iter_cb (callable, optional): Iteration callback passed to lmfit in 'fit' mode.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+        jacobian (bool, optional): Fit with the ModelJacobian instead of finite differences, see jacobian_fit_kws.
+            Default is True.
+
+    Returns:
+        FitOutput: The fit result, the preset updated with the fitted values, the component curves, metrics and the
+            FitProfile of the fit.
+
+    Raises:
+        ValueError: If a parameter of the preset references itself.
+    """
+    pre = copy.deepcopy(pre)
+    setup = prepare_fit(
+        np.asarray(x0, dtype=float),
+        np.asarray(y0, dtype=float),
+        pre,
+        mode=mode,
+        rows_lightened=rows_lightened,
+        fixed_bg=fixed_bg,
+        tougaard_fft=tougaard_fft,
+    )
+    fit_kws = jacobian_fit_kws(setup.mod) if mode == "fit" and jacobian else None
+    out, profile = run_fit(
+        setup, mode=mode, iter_cb=iter_cb, profile=FitProfile(setup.mod, fit_kws)
+    )
+
+    x = setup.x
+    bg_result_to_pre(out.params, mode, pre[0][0], pre)
+    peak_result_to_pre(out.params, mode, pre)
+    comps = component_curves(out, x).comps
+    result, bg_comps = result_frame(
+        out, x, setup.raw_x, setup.raw_y, setup.static_bg, pre, comps=comps
+    )
+    metrics = component_metrics(out, x, pre)
+    return FitOutput(
+        out,
+        pre,
+        x,
+        setup.y,
+        setup.raw_x,
+        setup.raw_y,
+        setup.static_bg,
+        setup.zeros_in_data,
+        comps,
+        metrics,
+        result,
+        bg_comps,
+        profile,
+    )
+
+
+def result_row(filepath, out, metrics):
+    """Collect the results of one fit in a flat dict, one row of a ResultsStore.
+
+    Args:
+        filepath (str): Path of the spectrum.
+        out (lmfit.model.ModelResult): The fit result.
+        metrics (dict): Metrics of the components, see component_metrics.
+
+    Returns:
+        dict: Fit statistics, the value and stderr of every parameter and the area and area fraction of every
+            component (columns '<prefix>area' and '<prefix>area_fraction').
+    """
+    row = {
+        "file": filepath,
+        "success": getattr(out, "success", None),
+        "nfev": getattr(out, "nfev", None),
+        "chisqr": getattr(out, "chisqr", np.nan),
+        "redchi": getattr(out, "redchi", np.nan),
+        "aic": getattr(out, "aic", np.nan),
+        "bic": getattr(out, "bic", np.nan),
+    }
+    for name, par in out.params.items():
+        row[name] = par.value
+        row[name + "_stderr"] = np.nan if par.stderr is None else par.stderr
+    for prefix, values in metrics.items():
+        row[prefix + "area"] = values["area"]
+        row[prefix + "area_fraction"] = values["fraction"]
+    return row
+
+
+class ResultsStore:
+    """In-memory table of fit results with one row per spectrum, keyed by the file path of the spectrum.
+
+    A new fit of a spectrum replaces its row. The table is exported in one call, so the results of many fits can
+    be analysed without parsing the _fit.txt files.
+    """
+
+    formats = {".csv": "CSV", ".parquet": "Parquet", ".feather": "Feather"}
+
+    def __init__(self):
+        self.rows = dict()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, filepath, out, metrics):
+        """Add the results of a fit, see result_row."""
+        self.rows[filepath] = result_row(filepath, out, metrics)
+
+    def add_row(self, row):
+        """Add a row created by result_row, e.g. in a worker process."""
+        self.rows[row["file"]] = row
+
+    def frame(self):
+        """Returns the results as DataFrame, parameters which are missing in a fit are NaN."""
+        return pd.DataFrame.from_records(list(self.rows.values()))
+
+    def export(self, filepath):
+        """Write the results table, the format is chosen by the file extension.
+
+        Args:
+            filepath (str): Path of the .csv, .parquet or .feather file. Parquet and Feather need pyarrow.
+
+        Raises:
+            ValueError: If the file extension is not supported.
+            ImportError: If pyarrow is missing for Parquet or Feather.
+        """
+        extension = os.path.splitext(filepath)[1].lower()
+        df = self.frame()
+        if extension == ".csv":
+            df.to_csv(filepath, index=False)
+        elif extension == ".parquet":
+            df.to_parquet(filepath, index=False)
+        elif extension == ".feather":
+            df.to_feather(filepath)
+        else:
+            raise ValueError(
+                f"Unsupported file extension {extension}, use one of {', '.join(self.formats)}."
+            )
+
+
+def fit_series(
+    spectra, pre, fixed_bg=False, seeded=True, iter_cb=None, tougaard_fft=False, jacobian=True
+):
+    """Fit an ordered series of spectra, e.g. a depth profile, a temperature series or an in-situ run.
+
+    Each fit starts from the preset updated with the result of the last converged fit, so neighbouring spectra
+    need only a few iterations instead of a cold start from the preset.
+
+    Args:
+        spectra (iterable): (x, y, rows_lightened) of each spectrum, in the order of the series.
+        pre (list): The preset list of the first fit. It is not modified.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        seeded (bool, optional): Start each fit from the previous result, otherwise every fit starts from pre.
+            Default is True.
+        iter_cb (callable, optional): Iteration callback passed to lmfit.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+        jacobian (bool, optional): Fit with the ModelJacobian, see fit_spectrum. Default is True.
+
+    Yields:
+        tuple: (index, res, error) for every spectrum, with the FitOutput res and error None on success, or res None
+            and the traceback as error if the fit failed.
+    """
+    seed = pre
+    for index, (x, y, rows_lightened) in enumerate(spectra):
+        try:
+            res = fit_spectrum(
+                x,
+                y,
+                seed,
+                rows_lightened=rows_lightened,
+                fixed_bg=fixed_bg,
+                iter_cb=iter_cb,
+                tougaard_fft=tougaard_fft,
+                jacobian=jacobian,
+            )
+        except Exception:
+            yield index, None, traceback.format_exc()
+            continue
+        if seeded and res.out.success:
+            seed = res.pre
+        yield index, res, None
+
+
+def jitter_params(pars, rng, scale=0.2):
+    """Draw new starting values for the centers, widths and amplitudes of the components.
+
+    A parameter with both limits set (limits table) gets a value drawn uniformly between its limits. Otherwise
+    amplitudes and widths are varied by up to +/- scale of their value and centers by up to +/- the width (sigma)
+    of their component, clipped to the limit which is set. Fixed parameters, parameters defined by an expression
+    and the background parameters keep their values.
+
+    Args:
+        pars (lmfit.Parameters): The starting parameters, they are not modified.
+        rng (numpy.random.Generator): Source of the random numbers.
+        scale (float, optional): Relative variation of the parameters without limits. Default is 0.2.
+
+    Returns:
+        lmfit.Parameters: A copy of the parameters with the new starting values.
+    """
+    pars = copy.deepcopy(pars)
+    for name, par in pars.items():
+        if (
+            not par.vary
+            or par.expr is not None
+            or name.startswith("bg_")
+            or not name.endswith(("_center", "_sigma", "_amplitude"))
+        ):
+            continue
+        if np.isfinite(par.min) and np.isfinite(par.max):
+            value = rng.uniform(par.min, par.max)
+        else:
+            if name.endswith("_center"):
+                sigma = name[: -len("center")] + "sigma"
+                step = abs(pars[sigma].value) if sigma in pars else 1.0
+            else:
+                step = scale * abs(par.value)
+            value = np.clip(rng.uniform(par.value - step, par.value + step), par.min, par.max)
+        par.value = float(value)
+    return pars
+
+
+def multi_start_fit_worker(
+    pre,
+    pars,
+    x,
+    y,
+    raw_y,
+    weights,
+    binding_ener=False,
+    fixed_bg=False,
+    tougaard_fft=False,
+    jacobian=True,
+):
+    """Run one start of multi_start_fit, executed in the worker processes.
+
+    The composite model cannot be pickled (e.g. the polynomial background), therefore it is built again from the
+    preset in every worker, only the starting parameters are sent.
+
+    Returns:
+        tuple: (redchi, params, nfev) of the fit.
+    """
+    mod, _, _ = build_model(
+        x,
+        raw_y,
+        pre,
+        mode="fit",
+        binding_ener=binding_ener,
+        fixed_bg=fixed_bg,
+        tougaard_fft=tougaard_fft,
+    )
+    fit_kws = jacobian_fit_kws(mod) if jacobian else None
+    out = mod.fit(y, pars, x=x, weights=weights, fit_kws=fit_kws, y=raw_y)
+    return out.redchi, out.params, out.nfev
+
+
+_multi_start_executor = None
+_multi_start_workers = None
+
+
+def multi_start_executor(workers):
+    """Returns the process pool of multi_start_fit, it is kept alive between the fits to avoid the start-up time.
+
+    The workers are spawned instead of forked, since the pool is used from the fit thread of the GUI.
+
+    Args:
+        workers (int): Number of worker processes.
+
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: The process pool.
+    """
+    global _multi_start_executor, _multi_start_workers
+    if _multi_start_executor is None or _multi_start_workers != workers:
+        if _multi_start_executor is not None:
+            _multi_start_executor.shutdown(wait=False, cancel_futures=True)
+        _multi_start_executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        _multi_start_workers = workers
+    return _multi_start_executor
+
+
+class MultiStartResult:
+    """The fits of all starts of multi_start_fit."""
+
+    def __init__(self, redchis, params, nfevs, errors):
+        self.redchis = redchis
+        self.params = params
+        self.nfevs = nfevs
+        self.errors = errors
+        valid = [i for i, redchi in enumerate(redchis) if redchi is not None and np.isfinite(redchi)]
+        self.best = min(valid, key=lambda i: redchis[i]) if len(valid) > 0 else None
+        self.valid = valid
+
+    @property
+    def best_params(self):
+        """lmfit.Parameters: The fitted parameters of the start with the lowest reduced chi-square."""
+        return None if self.best is None else self.params[self.best]
+
+    def spread(self):
+        """Spread of the fitted values of the varied parameters over all successful starts.
+
+        Returns:
+            dict: (min, max, std) of each varied parameter, keyed by the parameter name.
+        """
+        if self.best is None:
+            return dict()
+        spread = dict()
+        for name, par in self.params[self.best].items():
+            if not par.vary:
+                continue
+            values = np.array([self.params[i][name].value for i in self.valid], dtype=float)
+            spread[name] = (values.min(), values.max(), values.std())
+        return spread
+
+    def summary(self):
+        """Returns a text summary of the starts: reduced chi-square statistics and the spread of the parameters."""
+        lines = [
+            "Multi-start fit: {} of {} starts finished".format(len(self.valid), len(self.redchis))
+        ]
+        if self.best is None:
+            return "\n".join(lines + self.errors)
+        redchis = np.array([self.redchis[i] for i in self.valid])
+        best = self.redchis[self.best]
+        lines.append(
+            "r chi-sqr: best {:.6g} (start {}), median {:.6g}, worst {:.6g}, {} start(s) within 1% of the best".format(
+                best, self.best, np.median(redchis), redchis.max(), int(np.sum(redchis <= 1.01 * best))
+            )
+        )
+        for name, (vmin, vmax, std) in self.spread().items():
+            lines.append(
+                "    {}: best {:.6g}, min {:.6g}, max {:.6g}, std {:.3g}".format(
+                    name, self.params[self.best][name].value, vmin, vmax, std
+                )
+            )
+        return "\n".join(lines + self.errors)
+
+
+def multi_start_fit(
+    pre,
+    pars,
+    x,
+    y,
+    raw_y,
+    weights,
+    n_starts=8,
+    binding_ener=False,
+    fixed_bg=False,
+    workers=None,
+    seed=None,
+    scale=0.2,
+    interrupted=None,
+    tougaard_fft=False,
+    jacobian=True,
+):
+    """Fit from several starting points concurrently in a process pool to escape local minima.
+
+    The first start uses the parameters as given, the others are drawn by jitter_params. All starts run in parallel,
+    so the wall-clock time stays close to the time of a single fit as long as there are enough CPU cores.
+
+    Args:
+        pre (list): The preset list the model was built from.
+        pars (lmfit.Parameters): The starting parameters.
+        x (numpy.ndarray): Energy axis of the fit range.
+        y (numpy.ndarray): Intensities to fit, i.e. without the static background.
+        raw_y (numpy.ndarray): Intensities of the fit range.
+        weights (numpy.ndarray or float): Weights of the residuals, see fit_weights.
+        n_starts (int, optional): Number of starts. Default is 8.
+        binding_ener (bool, optional): The energy axis is a binding energy scale. Default is False.
+        fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+        workers (int, optional): Number of worker processes, by default one per start up to the number of CPUs.
+        seed (int, optional): Seed of the random starting values.
+        scale (float, optional): Relative variation of the parameters without limits, see jitter_params.
+        interrupted (callable, optional): Returns True if the fit was interrupted, the starts which are not running
+            yet are cancelled then.
+        tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT (tougaard_calculate_fft,
+            TougaardFFTBG). Default is False.
+        jacobian (bool, optional): Fit with the ModelJacobian, see jacobian_fit_kws. Default is True.
+
+    Returns:
+        MultiStartResult: The fits of all starts, best_params are the parameters with the lowest reduced chi-square.
+    """
+    rng = np.random.default_rng(seed)
+    starts = [pars] + [jitter_params(pars, rng, scale) for _ in range(n_starts - 1)]
+    if workers is None:
+        workers = min(n_starts, os.cpu_count() or 1)
+    executor = multi_start_executor(workers)
+    futures = {
+        executor.submit(
+            multi_start_fit_worker,
+            pre,
+            start,
+            x,
+            y,
+            raw_y,
+            weights,
+            binding_ener,
+            fixed_bg,
+            tougaard_fft,
+            jacobian,
+        ): n
+        for n, start in enumerate(starts)
+    }
+    redchis = [None] * n_starts
+    params = [None] * n_starts
+    nfevs = [None] * n_starts
+    errors = []
+    for future in as_completed(futures):
+        n = futures[future]
+        if future.cancelled():
+            continue
+        try:
+            redchis[n], params[n], nfevs[n] = future.result()
+        except Exception as e:
+            errors.append("start {} failed: {}".format(n, e))
+        if interrupted is not None and interrupted():
+            for pending in futures:
+                pending.cancel()
+    return MultiStartResult(redchis, params, nfevs, errors)
+
+
+def fit_text(version, data_file, par_text, out, pars, meta_result_export):
+    """Compose the content of the _fit.txt export.
+
+    Args:
+        version (str): Version string of LG4X-V2.
+        data_file (str): Name of the fitted data file, 'simulation mode' in simulation mode.
+        par_text (list): The preset list of the fit.
+        out (lmfit.model.ModelResult): The fit result.
+        pars (lmfit.Parameters): The parameters the fit was started with.
+        meta_result_export (list): One dict of peak metadata per component, keyed by '<prefix><property>'.
+
+    Returns:
+        str: The text of the _fit.txt file.
+    """
+    Text = version + "\n\n[[Data file]]\n\n" + data_file + "\n\n[[Fit results]]\n\n"
+    Text += (
+        "\n\n[[LG4X parameters]]\n\n"
+        + str(par_text)
+        + "\n\n"
+        + str(out.fit_report(min_correl=0.1))
+    )
+    Text += "\n\n[[lmfit parameters]]\n\n" + str(pars)
+    Text += "\n\n[[Peak Metadata]]\n\n"
+    row_labels = list(
+        dict.fromkeys(
+            [key.split("_", 1)[-1] for d in meta_result_export for key in d.keys()]
+        )
+    )
+
+    column_titles = list(
+        dict.fromkeys(
+            [key.split("_", 1)[0] for d in meta_result_export for key in d.keys()]
+        )
+    )
+    column_widths = {
+        "Property\\Component": max(
+            len("Property\\Component"),
+            max(len(row_label) for row_label in row_labels),
+        )
+    }
+    for column_title in column_titles:
+        column_widths[column_title] = max(
+            len(column_title), 20
+        )  # Set minimum width for readability
+
+    for d in meta_result_export:
+        for key, value in d.items():
+            component, property_name = key.split("_", 1)
+            column_widths[property_name] = max(
+                column_widths.get(property_name, 0), len(str(value))
+            )
+
+    header = ["Property\\Component".ljust(column_widths["Property\\Component"])]
+    for column_title in column_titles:
+        header.append(column_title.ljust(column_widths[column_title]))
+    Text += "\t".join(header) + "\n"
+
+    table_data = []
+    for row_label in row_labels:
+        row = [row_label.ljust(column_widths["Property\\Component"])]
+        for column_title in column_titles:
+            value = None
+            for d in meta_result_export:
+                key = f"{column_title}_{row_label}"
+                if key in d:
+                    value = d[key]
+                    break
+            formatted_value = (
+                str(value).ljust(column_widths[column_title])
+                if value is not None
+                else "N/A".ljust(column_widths[column_title])
+            )
+            row.append(formatted_value)  # Ensure the value is aligned
+        table_data.append(row)
+
+    for row in table_data:
+        Text += "\t".join(row) + "\n"
+
+    Text += "\n\n[[Parameters and Metaparameters as dictionaries]]\n\n"
+    Text += "\n\n[[Fit parameters as dictionary]]\n\n" + str(pars.valuesdict())
+    Text += "\n\n[[Metadata/Values of the Components as dictionary ]]\n\n{\n"
+    for dic in meta_result_export:
+        for key in dic.keys():
+            Text += "'" + key + "' : " + str(dic[key]) + ",\n"
+    Text += "}\n"
+    return Text
+
+
+def write_fit_csv(filepath, result, rows_lightened=1):
+    """Write the result DataFrame of a fit to the _fit.csv export.
+
+    Args:
+        filepath (str): Path of the csv file.
+        result (pandas.DataFrame): The result DataFrame, see result_frame.
+        rows_lightened (int, optional): Number of rows which were combined into one data point. Default is 1.
+    """
+    with open(filepath, "w") as f:
+        f.write(
+            "#No of rows lightened (2D detector)"
+            + str(rows_lightened)
+            + "(if not using 2D detector, value is 1 and can be ignored!)\n"
+        )
+        result.to_csv(f, index=False, mode="a")
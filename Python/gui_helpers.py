@@ -1,5 +1,6 @@
 from PyQt5 import QtWidgets
 from helpers import *
+from fit_engine import list_shape
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
@@ -57,7 +58,8 @@ def createMenuBar(parent):
     exportSubmenu = fileMenu.addMenu('&Export')
     actions_export = [
         ('&Results', 'Ctrl+Shift+R', parent.exportResults),
-        ('Re&sults + Data', 'Ctrl+Shift+A', parent.export_all)
+        ('Re&sults + Data', 'Ctrl+Shift+A', parent.export_all),
+        ('Results &table (all fitted files)', 'Ctrl+Shift+E', parent.export_results_table)
     ]
 
     for name, shortcut, func in actions_export:
@@ -154,6 +156,11 @@ def createMenuBar(parent):
     parent.bgMenu.addSeparator()
     parent.bgMenu.addAction(btn_tougaard_cross_section)
 
+    # Tougaard backgrounds calculated by FFT instead of the direct summation, faster for wide energy ranges
+    parent.btn_bg_tougaard_fft = QtWidgets.QAction('&Fast (FFT) Tougaard', parent)
+    parent.btn_bg_tougaard_fft.setCheckable(True)
+    parent.bgMenu.addAction(parent.btn_bg_tougaard_fft)
+
     # Settings Menu
     settings_menu = menubar.addMenu('&Settings')
 
@@ -162,6 +169,10 @@ def createMenuBar(parent):
 
     settings_menu.addAction(btn_settings)
 
+    btn_fit_profile = QtWidgets.QAction('Fit &profile', parent)
+    btn_fit_profile.triggered.connect(parent.show_fit_profile)
+    settings_menu.addAction(btn_fit_profile)
+
     # Help/Info Menu
     links_menu = menubar.addMenu('&Help/Info')
 
@@ -380,6 +391,26 @@ def createTopLeftLayout(parent):
     parent.plottitle = QtWidgets.QLineEdit()
     plottitle_form.addRow("Plot title: ", parent.plottitle)
 
+    # Number of starts of the fit, more than one start runs a parallel multi-start fit
+    parent.fit_starts = QtWidgets.QSpinBox()
+    parent.fit_starts.setRange(1, 64)
+    parent.fit_starts.setValue(1)
+    parent.fit_starts.setToolTip(
+        'Number of fits run in parallel from jittered starting values (centers, widths and amplitudes within '
+        'their limits). The fit with the lowest reduced chi-square is kept. 1 runs a single fit.'
+    )
+    plottitle_form.addRow("Fit starts: ", parent.fit_starts)
+
+    # Analytic Jacobian instead of finite differences, on by default
+    parent.fit_jacobian = QtWidgets.QCheckBox()
+    parent.fit_jacobian.setChecked(True)
+    parent.fit_jacobian.setToolTip(
+        'Fit with the analytic derivatives of the Gaussian, Lorentzian, Voigt, pseudo-Voigt and Doniach shapes and '
+        'of the convolved Doniach shapes (gds, gdd) instead of finite differences, which usually needs several times '
+        'fewer model evaluations. Uncheck to fit with finite differences.'
+    )
+    plottitle_form.addRow("Analytic Jacobian: ", parent.fit_jacobian)
+
     # Add plot settings form
     plot_settings_layout = createPlotSettingsForm(parent=parent)
 
@@ -510,7 +541,11 @@ def createFitButtons(parent):
     btn_interrupt = QtWidgets.QPushButton('Interrupt fitting', parent)
     btn_interrupt.clicked.connect(parent.interrupt_fit)
 
-    for button in [btn_fit, btn_eva, btn_undoFit, btn_interrupt]:
+    btn_fit_series = QtWidgets.QPushButton('Fit series', parent)
+    btn_fit_series.setToolTip('Fit all files of the file list in order, each fit starts from the result of the previous file.')
+    btn_fit_series.clicked.connect(parent.fit_series)
+
+    for button in [btn_fit, btn_eva, btn_undoFit, btn_interrupt, btn_fit_series]:
         button.resize(button.sizeHint())
         layout.addWidget(button)
 
@@ -519,6 +554,7 @@ def createFitButtons(parent):
         'btn_eva': btn_eva,
         'btn_undoFit': btn_undoFit,
         'btn_interrupt': btn_interrupt,
+        'btn_fit_series': btn_fit_series,
     }
 def createComponentButtons(parent):
     """Create add/remove component and limits buttons and limits status indicator and returns both layout and limit status/text."""
@@ -687,10 +723,6 @@ def createFitTables(parent):
     list_colh = ['', 'C_1']
     fitp1.setHorizontalHeaderLabels(list_colh)
     fitp1.setVerticalHeaderLabels(list_row)
-    list_shape = ['g: Gaussian', 'l: Lorentzian', 'v: Voigt', 'p: PseudoVoigt', 'e: ExponentialGaussian',
-                       's: SkewedGaussian', 'a: SkewedVoigt', 'b: BreitWigner', 'n: Lognormal', 'd: Doniach',
-                       'gdd: Convolution Gaussian/Doniach-Dublett', 'gds: Convolution Gaussian/Doniach-Singlett',
-                       'fe:Convolution FermiDirac/Gaussian']
     list_component = ['', 'C_1']
 
     # set DropDown component model
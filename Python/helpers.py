@@ -1,36 +1,27 @@
 from PyQt5.QtGui import QDoubleValidator, QValidator
 from PyQt5.QtWidgets import QItemDelegate, QLineEdit
-from lmfit.models import (
-    ExponentialGaussianModel,
-    SkewedGaussianModel,
-    SkewedVoigtModel,
-    DoniachModel,
-    BreitWignerModel,
-    LognormalModel,
-)
-from lmfit.models import (
-    GaussianModel,
-    LorentzianModel,
-    VoigtModel,
-    PseudoVoigtModel,
-    ThermalDistributionModel,
-    PolynomialModel,
-    StepModel,
-)
-from lmfitxps.models import (
-    ConvGaussianDoniachDublett,
-    ConvGaussianDoniachSinglett,
-    FermiEdgeModel,
-)
-from lmfitxps.lineshapes import singlett, fft_convolve
 from PyQt5 import QtWidgets, QtCore
 import numpy as np
 import os
 import traceback
 import logging
+import time
+import hashlib
+import shutil
+import tempfile
+import weakref
 import pandas as pd
 import configparser
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fit_engine import (
+    multi_start_fit,
+    fit_series,
+    jacobian_fit_kws,
+    FitProfile,
+    run_fit,
+)
+from spectrum_io import load_spectrum, read_engine
 
 config = configparser.ConfigParser()
 
@@ -86,42 +77,6 @@ def autoscale_y(ax, margin=0.1):
     ax.set_ylim(bot, top)
 
 
-def model_selector(index: int, strind: str, index_pk: int):
-    """
-    Returns a model based on the index parameter.
-
-    Args:
-        index (int): An integer index to select the model.
-        prefix (str): A string prefix to identify the model.
-        index_pk (int): An integer index to identify the peak.
-
-    Returns:
-        Model: A model selected based on the index parameter.
-    """
-    model_options = {
-        0: GaussianModel(prefix=strind + str(index_pk + 1) + "_"),
-        1: LorentzianModel(prefix=strind + str(index_pk + 1) + "_"),
-        2: VoigtModel(prefix=strind + str(index_pk + 1) + "_"),
-        3: PseudoVoigtModel(prefix=strind + str(index_pk + 1) + "_"),
-        4: ExponentialGaussianModel(prefix=strind + str(index_pk + 1) + "_"),
-        5: SkewedGaussianModel(prefix=strind + str(index_pk + 1) + "_"),
-        6: SkewedVoigtModel(prefix=strind + str(index_pk + 1) + "_"),
-        7: BreitWignerModel(prefix=strind + str(index_pk + 1) + "_"),
-        8: LognormalModel(prefix=strind + str(index_pk + 1) + "_"),
-        9: DoniachModel(prefix=strind + str(index_pk + 1) + "_"),
-        10: ConvGaussianDoniachDublett(prefix=strind + str(index_pk + 1) + "_"),
-        11: ConvGaussianDoniachSinglett(prefix=strind + str(index_pk + 1) + "_"),
-        12: FermiEdgeModel(prefix=strind + str(index_pk + 1) + "_"),
-    }
-
-    selected_model = model_options.get(index)
-
-    if selected_model is not None:
-        return selected_model
-    else:
-        raise ValueError(f"No model found for index {index}.")
-
-
 class DoubleValidator(QDoubleValidator):
     """Subclass of QDoubleValidator that emits a signal if the input is not valid."""
 
@@ -266,32 +221,85 @@ class FitThread(QtCore.QThread):
     thread_started = QtCore.pyqtSignal()
     fitting_finished = QtCore.pyqtSignal(object)
     error_occurred = QtCore.pyqtSignal(str)
+    profile_updated = QtCore.pyqtSignal(object)
+    progress_updated = QtCore.pyqtSignal(int, float, object, object)
 
     def __init__(
-        self, model=None, data=None, params=None, x=None, weights=None, y=None
+        self,
+        setup=None,
+        params=None,
+        n_starts=1,
+        pre=None,
+        fixed_bg=False,
+        tougaard_fft=False,
+        jacobian=True,
     ):
+        """Thread running the fit of the GUI.
+
+        Args:
+            setup (fit_engine.FitSetup): The prepared fit, see prepare_fit.
+            params (lmfit.Parameters): The starting parameters.
+            n_starts (int, optional): Number of starts of a multi-start fit, 1 runs a single fit. Default is 1.
+            pre (list, optional): The preset list the model was built from, needed for a multi-start fit.
+            fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+            tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT. Default is False.
+            jacobian (bool, optional): Fit with the ModelJacobian instead of finite differences. Default is True.
+        """
         super().__init__()
         self.fit_interrupted = False
-        self.model = model
-        self.data = data
+        self.setup = setup
         self.params = params
-        self.x = x
-        self.weights = weights
-        self.y = y
+        self.n_starts = n_starts
+        self.pre = pre
+        self.fixed_bg = fixed_bg
+        self.tougaard_fft = tougaard_fft
+        self.jacobian = jacobian
+        self.multi_start = None
         self.result = None
+        self.profile = None
+        # seconds between two profile_updated signals during the fit
+        self.profile_interval = 0.5
+        self.profile_emitted = 0.0
+        # maximum number of progress_updated signals per second, the best fit so far is sent
+        self.progress_rate = 5
+        self.progress_emitted = 0.0
+        self.progress_chisqr = np.inf
+        self.progress_resid = None
 
     def run(self):
         try:
             self.fit_interrupted = False
             self.thread_started.emit()
-            self.result = self.model.fit(
-                self.data,
-                params=self.params,
-                x=self.x,
-                weights=self.weights,
-                iter_cb=self.per_iteration,
-                y=self.y,
+            setup = self.setup
+            params = self.params
+            if self.n_starts > 1:
+                # the starts run in a process pool, the best one is refined here to get the full fit result
+                self.multi_start = multi_start_fit(
+                    self.pre,
+                    self.params,
+                    setup.x,
+                    setup.y,
+                    setup.raw_y,
+                    setup.weights,
+                    n_starts=self.n_starts,
+                    binding_ener=setup.binding_ener,
+                    fixed_bg=self.fixed_bg,
+                    interrupted=lambda: self.fit_interrupted,
+                    tougaard_fft=self.tougaard_fft,
+                    jacobian=self.jacobian,
+                )
+                if self.multi_start.best_params is None:
+                    raise RuntimeError(self.multi_start.summary())
+                params = self.multi_start.best_params
+            self.progress_chisqr = np.inf
+            self.progress_resid = None
+            fit_kws = jacobian_fit_kws(setup.mod) if self.jacobian else None
+            self.profile = FitProfile(setup.mod, fit_kws)
+            self.result, _ = run_fit(
+                setup, params, iter_cb=self.per_iteration, profile=self.profile
             )
+            logging.info(f"Fit profile: {self.profile.to_json()}")
+            self.profile_updated.emit(self.profile.to_dict())
             self.fitting_finished.emit(self.result)
         except Exception as e:
             error_message = (
@@ -301,13 +309,574 @@ class FitThread(QtCore.QThread):
             self.error_occurred.emit(error_message)
 
     def per_iteration(self, pars, iteration, resid, *args, **kws):
+        if self.profile is not None:
+            now = time.perf_counter()
+            if now - self.profile_emitted >= self.profile_interval:
+                self.profile_emitted = now
+                self.profile_updated.emit(self.profile.to_dict())
+            self.progress(iteration, resid, now)
         if self.fit_interrupted:
             return True
 
+    def progress(self, iteration, resid, now):
+        """Keep the residual of the best evaluation so far and emit it, at most progress_rate times per second.
+
+        The best fit curve is recovered from the residual (data - model) * weights, the model is not evaluated again.
+        """
+        chisqr = float(np.dot(resid, resid))
+        if chisqr < self.progress_chisqr:
+            self.progress_chisqr = chisqr
+            self.progress_resid = np.array(resid, copy=True)
+        if self.progress_resid is None or now - self.progress_emitted < 1 / self.progress_rate:
+            return
+        self.progress_emitted = now
+        if self.setup.weights is None:
+            best_fit = self.setup.y - self.progress_resid
+        else:
+            best_fit = self.setup.y - self.progress_resid / self.setup.weights
+        self.progress_updated.emit(int(iteration), self.progress_chisqr, best_fit, self.progress_resid)
+        self.progress_resid = None
+
     def interrupt_fit(self):
         self.fit_interrupted = True
 
 
+class SeriesFitThread(FitThread):
+    spectrum_fitted = QtCore.pyqtSignal(int, object)
+    spectrum_failed = QtCore.pyqtSignal(int, str)
+    series_finished = QtCore.pyqtSignal()
+
+    def __init__(self, spectra=None, pre=None, fixed_bg=False, tougaard_fft=False, jacobian=True):
+        """Thread fitting an ordered series of spectra, each fit starts from the result of the previous one.
+
+        Args:
+            spectra (list): (x, y, rows_lightened) of each spectrum, in the order of the series.
+            pre (list): The preset list of the first fit.
+            fixed_bg (bool, optional): Keep all background parameters fixed. Default is False.
+            tougaard_fft (bool, optional): Calculate the Tougaard backgrounds by FFT. Default is False.
+            jacobian (bool, optional): Fit with the ModelJacobian instead of finite differences. Default is True.
+        """
+        super().__init__(pre=pre, fixed_bg=fixed_bg, tougaard_fft=tougaard_fft, jacobian=jacobian)
+        self.spectra = spectra
+
+    def run(self):
+        try:
+            self.fit_interrupted = False
+            self.thread_started.emit()
+            for index, res, error in fit_series(
+                self.spectra,
+                self.pre,
+                fixed_bg=self.fixed_bg,
+                iter_cb=self.per_iteration,
+                tougaard_fft=self.tougaard_fft,
+                jacobian=self.jacobian,
+            ):
+                if self.fit_interrupted:
+                    break
+                if error is None:
+                    logging.info(f"Fit profile of spectrum {index}: {res.profile.to_json()}")
+                    self.spectrum_fitted.emit(index, res)
+                else:
+                    logging.error(error)
+                    self.spectrum_failed.emit(index, error)
+            self.series_finished.emit()
+        except Exception as e:
+            error_message = (
+                f"Exception occurred in SeriesFitThread: {e}\n{traceback.format_exc()}"
+            )
+            logging.error(error_message)
+            self.error_occurred.emit(error_message)
+
+
+class SeriesTableWindow(QtWidgets.QWidget):
+    def __init__(self, names, prefixes):
+        """Summary table of a fit series, one row per spectrum is added as soon as its fit is finished.
+
+        Args:
+            names (list): Names of the components.
+            prefixes (list): lmfit prefixes of the components.
+        """
+        super(SeriesTableWindow, self).__init__()
+        self.prefixes = prefixes
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.resize(900, 400)
+        self.setWindowTitle("Fit series")
+        headers = ["File", "Success", "# func evals", "r chi-sqr"]
+        for name in names:
+            headers += [name + " center", name + " area"]
+        self.table = QtWidgets.QTableWidget(0, len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.layout.addWidget(self.table)
+
+    def add_row(self, values):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for column, value in enumerate(values):
+            self.table.setItem(row, column, QtWidgets.QTableWidgetItem(value))
+        self.table.scrollToBottom()
+
+    def add_result(self, file_name, res):
+        values = [
+            file_name,
+            str(res.out.success),
+            str(res.out.nfev),
+            format(res.out.redchi, ".4g"),
+        ]
+        for prefix in self.prefixes:
+            values += [
+                format(res.out.params[prefix + "center"].value, ".3f"),
+                format(res.metrics[prefix]["area"], ".1f"),
+            ]
+        self.add_row(values)
+
+    def add_failure(self, file_name):
+        self.add_row([file_name, "failed"])
+
+
+def residual_limits(residual, ylim):
+    """Returns new y-limits of the residual axis, None if the current ones can be kept.
+
+    Changing the limits needs a full draw of the canvas, they are therefore only changed if the residual leaves them
+    or fills less than a fifth of them, and the new limits have a wide margin.
+
+    Args:
+        residual (numpy.ndarray): The residual.
+        ylim (tuple): The current y-limits of the residual axis.
+
+    Returns:
+        tuple or None: The new y-limits.
+    """
+    low, high = np.nanmin(residual), np.nanmax(residual)
+    if not (np.isfinite(low) and np.isfinite(high)):
+        return None
+    ymin, ymax = ylim
+    if ymin <= low and high <= ymax and high - low >= 0.2 * (ymax - ymin):
+        return None
+    margin = 0.25 * (high - low) if high > low else 1.0
+    return low - margin, high + margin
+
+
+def minmax_index(x, y, xlim, pixels):
+    """Indices of the points of a curve which are plotted: the minimum and maximum of each pixel column.
+
+    Only the points within xlim and one point beyond each end are kept. If there are more than two of them per pixel,
+    they are split into one bin of consecutive points per pixel and each bin is represented by its minimum and
+    maximum in their original order, so the curve looks the same on the screen. The data itself is not changed.
+
+    Args:
+        x (numpy.ndarray): Energy axis, ascending or descending. Curves on other axes are not decimated.
+        y (numpy.ndarray): Intensities.
+        xlim (tuple): The x-limits of the axes, in any order.
+        pixels (int): Width of the axes in pixels.
+
+    Returns:
+        slice or numpy.ndarray: Index of the points to plot.
+    """
+    n = len(x)
+    if n <= 2 * pixels:
+        return slice(None)
+    ascending = x[-1] >= x[0]
+    x_ascending = x if ascending else x[::-1]
+    if np.any(np.diff(x_ascending) < 0):
+        return slice(None)
+    start = max(int(np.searchsorted(x_ascending, min(xlim), side="left")) - 1, 0)
+    stop = min(int(np.searchsorted(x_ascending, max(xlim), side="right")) + 1, n)
+    if not ascending:
+        start, stop = n - stop, n - start
+    count = stop - start
+    if count <= 2 * pixels:
+        return slice(start, stop)
+    size = -(-count // pixels)
+    bins = -(-count // size)
+    # the last bin is filled up with the last point
+    values = np.empty(bins * size)
+    values[:count] = y[start:stop]
+    values[count:] = y[stop - 1]
+    values = values.reshape(bins, size)
+    offsets = start + np.arange(bins) * size
+    index = np.sort(
+        np.column_stack([offsets + np.argmin(values, axis=1), offsets + np.argmax(values, axis=1)]), axis=1
+    ).ravel()
+    return np.concatenate([[start], np.minimum(index, stop - 1), [stop - 1]])
+
+
+class PlotLayer:
+    """Persistent artists of the spectrum plot, updated in place, decimated to the screen and drawn with blitting.
+
+    The raw data and the legends are normal artists. The components (line and filled area), the background, the fit
+    and the residual are animated artists, they are created once and afterwards only their data is replaced. A full
+    draw of the canvas renders the axes with the raw data, ticks, titles and legends and saves them. An update
+    restores the saved axes and draws only the animated artists on top, unless the limits, titles, canvas size or
+    the artists changed since the last full draw. The legends are part of the saved axes, since drawing them is
+    slower than all curves together. If the axes are cleared elsewhere (e.g. by a theme change), the artists are
+    created again.
+
+    The layer keeps the full data of every curve, the artists only get the minimum and maximum of each pixel column
+    of the visible range (see minmax_index). The curves are decimated again when the x-limits or the size of the
+    canvas change, e.g. by zooming or panning with the toolbar.
+    """
+
+    def __init__(self, canvas, ax, ar):
+        """
+        Args:
+            canvas (FigureCanvas): The canvas of the plot.
+            ax (matplotlib.axes.Axes): Axes of the spectrum.
+            ar (matplotlib.axes.Axes): Axes of the residual.
+        """
+        self.canvas = canvas
+        self.ax = ax
+        self.ar = ar
+        self.raw = None
+        self.raw_style = None
+        self.raw_data = None
+        self.components = []
+        self.curves = {}
+        self.legends = []
+        self.changed = True
+        self.saved = None
+        self.saved_state = None
+        self.decimated_view = None
+        self.callbacks = None
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.mpl_connect("resize_event", self.on_view_changed)
+        self.connect()
+
+    def connect(self):
+        """Connect to the x-limits of both axes, cla replaces their callback registries."""
+        if self.callbacks == (self.ax.callbacks, self.ar.callbacks):
+            return
+        # shared axes do not emit xlim_changed of each other
+        self.ax.callbacks.connect("xlim_changed", self.on_view_changed)
+        self.ar.callbacks.connect("xlim_changed", self.on_view_changed)
+        self.callbacks = (self.ax.callbacks, self.ar.callbacks)
+
+    def forget(self):
+        self.raw = None
+        self.raw_style = None
+        self.raw_data = None
+        self.components = []
+        self.curves = {}
+        self.legends = []
+        self.changed = True
+        self.saved = None
+        self.decimated_view = None
+        self.connect()
+
+    def clear(self):
+        """Clear both axes and forget all artists."""
+        self.ax.cla()
+        self.ar.cla()
+        self.forget()
+
+    def check_attached(self):
+        """Forget the artists if the axes were cleared, cla detaches all artists from their axes."""
+        artists = [self.raw] + [component[1] for component in self.components]
+        artists += [curve[0] for curve in self.curves.values()]
+        if any(artist is not None and artist.axes is None for artist in artists):
+            self.forget()
+
+    def view(self):
+        """The visible x-range and the width of the axes in pixels, the full range while the axes autoscale."""
+        if self.ax.get_autoscalex_on():
+            xlim = None
+        else:
+            xlim = tuple(self.ax.get_xlim())
+        return xlim, max(int(self.ax.bbox.width), 1)
+
+    def index(self, x, y, view=None):
+        xlim, pixels = self.view() if view is None else view
+        if xlim is None:
+            xlim = (np.min(x), np.max(x))
+        return minmax_index(x, y, xlim, pixels)
+
+    def show_raw(self):
+        x, y = self.raw_data
+        index = self.index(x, y)
+        self.raw.set_data(x[index], y[index])
+
+    def show_component(self, component):
+        fill, line, x, lower, upper = component
+        index = self.index(x, upper)
+        x, lower, upper = x[index], lower[index], upper[index]
+        fill.set_verts([np.concatenate([np.column_stack([x, upper]), np.column_stack([x[::-1], lower[::-1]])])])
+        line.set_data(x, upper)
+
+    def show_curve(self, curve):
+        line, style, x, y = curve
+        index = self.index(x, y)
+        line.set_data(x[index], y[index])
+
+    def on_view_changed(self, event):
+        """Decimate all curves again for the new x-limits or canvas size."""
+        view = self.view()
+        if view == self.decimated_view:
+            return
+        self.decimated_view = view
+        if self.raw is not None and self.raw.axes is not None:
+            self.show_raw()
+        for component in self.components:
+            if component[1].axes is not None:
+                self.show_component(component)
+        for curve in self.curves.values():
+            if curve[0].axes is not None:
+                self.show_curve(curve)
+
+    def set_raw(self, x, y, *args, **kwargs):
+        """Show the raw data, the arguments are passed to Axes.plot. The line is only replaced if anything changed."""
+        self.check_attached()
+        x = np.asarray(x)
+        y = np.asarray(y)
+        style = (args, sorted(kwargs.items()))
+        if (
+            self.raw is not None
+            and self.raw_style == style
+            and np.array_equal(self.raw_data[0], x)
+            and np.array_equal(self.raw_data[1], y)
+        ):
+            return
+        if self.raw is not None:
+            self.raw.remove()
+        (self.raw,) = self.ax.plot([], [], *args, **kwargs)
+        self.raw_style = style
+        self.raw_data = (x, y)
+        self.show_raw()
+        self.changed = True
+
+    def set_components(self, x, curves):
+        """Show the components as filled areas with a line on top.
+
+        Args:
+            x (numpy.ndarray): Energy axis.
+            curves (list): (label, lower, upper) of each component.
+        """
+        self.check_attached()
+        labels = [label for label, lower, upper in curves]
+        if labels != [component[0].get_label() for component in self.components]:
+            for component in self.components:
+                component[0].remove()
+                component[1].remove()
+            self.components = []
+            for index, (label, lower, upper) in enumerate(curves):
+                # the colors of the default color cycle, as for new axes
+                fill = self.ax.fill_between([], [], [], label=label, color="C{}".format(index % 10))
+                (line,) = self.ax.plot([], [], color="C{}".format(index % 10))
+                fill.set_animated(True)
+                line.set_animated(True)
+                self.components.append((fill, line, x, lower, upper))
+            self.changed = True
+        else:
+            self.components = [
+                (component[0], component[1], x, lower, upper)
+                for component, (label, lower, upper) in zip(self.components, curves)
+            ]
+        for component in self.components:
+            self.show_component(component)
+
+    def set_curve(self, name, axes, x, y, *args, **kwargs):
+        """Show a curve (e.g. the fit or the residual) on the given axes, the arguments are passed to Axes.plot."""
+        self.check_attached()
+        style = (axes, args, sorted(kwargs.items()))
+        if name in self.curves and self.curves[name][1] == style:
+            line = self.curves[name][0]
+        else:
+            self.remove_curve(name)
+            (line,) = axes.plot([], [], *args, **kwargs)
+            line.set_animated(True)
+            self.changed = True
+        self.curves[name] = (line, style, x, y)
+        self.show_curve(self.curves[name])
+
+    def remove_curve(self, name):
+        if name in self.curves:
+            self.curves.pop(name)[0].remove()
+            self.changed = True
+
+    def remove_fit(self):
+        """Remove the components and all curves, the raw data is kept."""
+        self.check_attached()
+        self.set_components(None, [])
+        for name in list(self.curves):
+            self.remove_curve(name)
+
+    def rescale_residual(self, residual):
+        ylim = residual_limits(residual, self.ar.get_ylim())
+        if ylim is not None:
+            self.ar.set_ylim(ylim)
+
+    def legend(self):
+        """Show the legends of both axes, they are only created again if the artists changed, i.e. before a full draw."""
+        if not self.changed and all(legend.axes is not None for legend in self.legends):
+            return
+        self.legends = []
+        for axes in (self.ax, self.ar):
+            if len(axes.get_legend_handles_labels()[1]) == 0:
+                if axes.get_legend() is not None:
+                    axes.get_legend().remove()
+                continue
+            self.legends.append(axes.legend(loc=0))
+
+    def animated(self):
+        artists = []
+        for component in self.components:
+            artists += [component[0], component[1]]
+        artists += [curve[0] for curve in self.curves.values()]
+        return artists
+
+    def state(self):
+        """The static part of the plot, a full draw is needed if it changed."""
+        return (
+            self.ax.get_xlim(),
+            self.ax.get_ylim(),
+            self.ar.get_xlim(),
+            self.ar.get_ylim(),
+            self.ax.get_title(),
+            self.ar.get_title(),
+            self.ax.get_xlabel(),
+            self.canvas.get_width_height(),
+        )
+
+    def on_draw(self, event):
+        if event.canvas is not self.canvas:
+            # the figure is saved to a file, the animated artists have to be drawn into it as well
+            for artist in self.animated():
+                artist.draw(event.renderer)
+            return
+        self.saved = [self.canvas.copy_from_bbox(axes.bbox) for axes in (self.ax, self.ar)]
+        self.saved_state = self.state()
+        self.changed = False
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in self.animated():
+            if artist.axes is not None:
+                artist.axes.draw_artist(artist)
+
+    def draw(self):
+        """Draw the plot, by blitting the animated artists if the static part did not change."""
+        if self.saved is None or self.changed or self.state() != self.saved_state:
+            self.canvas.draw()
+            return
+        for saved in self.saved:
+            self.canvas.restore_region(saved)
+        self.draw_animated()
+        self.canvas.blit(self.ax.bbox)
+        self.canvas.blit(self.ar.bbox)
+
+
+class FitProgressPlot:
+    """Draws the progress snapshots of a running fit on the axes of the canvas with blitting.
+
+    The canvas is drawn once when the fit starts and the rendered axes are saved. A snapshot only restores them and
+    draws the animated fit and residual curves on top, so it costs a few milliseconds independent of the rest of the
+    plot. Every full draw of the canvas (resize, zoom, rescaled residual axis) saves the axes again. Like the
+    PlotLayer, the curves are decimated to the visible range.
+    """
+
+    def __init__(self, canvas, ax, ar, x, offset):
+        """
+        Args:
+            canvas (FigureCanvas): The canvas of the plot.
+            ax (matplotlib.axes.Axes): Axes of the spectrum.
+            ar (matplotlib.axes.Axes): Axes of the residual.
+            x (numpy.ndarray): Energy axis of the fit range.
+            offset (numpy.ndarray or float): Added to the fit curve, i.e. the static background.
+        """
+        self.canvas = canvas
+        self.ax = ax
+        self.ar = ar
+        self.x = x
+        self.offset = offset
+        (self.fit_line,) = ax.plot([], [], "r-", lw=2, animated=True)
+        (self.residual_line,) = ar.plot([], [], "g.", animated=True)
+        self.backgrounds = None
+        self.connection = None
+
+    def start(self):
+        self.connection = self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.draw()
+
+    def stop(self):
+        if self.connection is not None:
+            self.canvas.mpl_disconnect(self.connection)
+            self.connection = None
+        self.fit_line.remove()
+        self.residual_line.remove()
+
+    def on_draw(self, event):
+        if event.canvas is not self.canvas:
+            return
+        self.backgrounds = [self.canvas.copy_from_bbox(axes.bbox) for axes in (self.ax, self.ar)]
+        self.draw_curves()
+
+    def draw_curves(self):
+        self.ax.draw_artist(self.fit_line)
+        self.ar.draw_artist(self.residual_line)
+
+    def update(self, best_fit, residual):
+        """Draw a snapshot, the best fit without the offset and its weighted residual."""
+        xlim = self.ax.get_xlim()
+        pixels = max(int(self.ax.bbox.width), 1)
+        best_fit = best_fit + self.offset
+        index = minmax_index(self.x, best_fit, xlim, pixels)
+        self.fit_line.set_data(self.x[index], best_fit[index])
+        index = minmax_index(self.x, residual, xlim, pixels)
+        self.residual_line.set_data(self.x[index], residual[index])
+        ylim = residual_limits(residual, self.ar.get_ylim())
+        if ylim is not None:
+            # rescaling the axis needs a full draw, which saves the new backgrounds
+            self.ar.set_ylim(ylim)
+            self.canvas.draw()
+            return
+        if self.backgrounds is None:
+            self.canvas.draw()
+            return
+        for background in self.backgrounds:
+            self.canvas.restore_region(background)
+        self.draw_curves()
+        self.canvas.blit(self.ax.bbox)
+        self.canvas.blit(self.ar.bbox)
+
+
+class FitProfileWindow(QtWidgets.QWidget):
+    def __init__(self):
+        """Panel showing the FitProfile of the running or last fit: wall time, cost per evaluation and per component."""
+        super(FitProfileWindow, self).__init__()
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.resize(600, 300)
+        self.setWindowTitle("Fit profile")
+        self.label = QtWidgets.QLabel("No fit run yet.")
+        self.layout.addWidget(self.label)
+        headers = ["Component", "Kind", "# evals", "ms per eval", "Share"]
+        self.table = QtWidgets.QTableWidget(0, len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.layout.addWidget(self.table)
+
+    def update_profile(self, profile):
+        """Show a profile, see FitProfile.to_dict."""
+        text = "Wall time: {:.3g} s, # model evals: {} ({:.3g} ms each), # Jacobians: {} ({:.3g} s)".format(
+            profile["wall_time"],
+            profile["evaluations"],
+            profile["time_per_evaluation"] * 1e3,
+            profile["jacobian_evaluations"],
+            profile["jacobian_time"],
+        )
+        if len(profile["iterations"]) > 0:
+            iteration, chisqr, elapsed = profile["iterations"][-1]
+            text += "\nIteration {}: chi-sqr = {:.6g}".format(iteration, chisqr)
+        self.label.setText(text)
+        self.table.setRowCount(len(profile["components"]))
+        for row, (label, component) in enumerate(profile["components"].items()):
+            values = [
+                label,
+                component["kind"],
+                str(component["evaluations"]),
+                format(component["time_per_evaluation"] * 1e3, ".3g"),
+                format(component["share"], ".0%"),
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QtWidgets.QTableWidgetItem(value))
+
+
 class RemoveAndEditTableWidget(QtWidgets.QTableWidget):
     headerTextChanged = QtCore.pyqtSignal(int, str)
     removeOptionChanged = QtCore.pyqtSignal(int, str)
@@ -550,73 +1119,6 @@ def cross_section():
     window_cross_section.show()
 
 
-# from numpy import amax, amin
-# make x and y lists (arrays) in the range between xmin and xmax
-import numpy as np
-
-
-def fit_range(x, y, xmin, xmax):
-    # print(xmin, xmax)
-    if xmin > xmax:
-        xmin0 = xmin
-        xmin = xmax
-        xmax = xmin0
-
-    if x[0] < x[-1]:
-        # XAS in photon energy scale or XPS in kinetic energy scale
-        if x[0] < xmin or xmax < x[len(x) - 1]:
-            if xmax < x[len(x) - 1]:
-                for i in range(len(x) - 1, -1, -1):
-                    if x[i] <= xmax:
-                        rmidx = i
-                        break
-            else:
-                rmidx = len(x) - 1
-
-            if x[0] < xmin:
-                for i in range(0, len(x) - 1):
-                    if x[i] >= xmin:
-                        lmidx = i
-                        break
-            else:
-                lmidx = 0
-
-            xn = x[lmidx : rmidx + 1].copy()
-            yn = y[lmidx : rmidx + 1].copy()
-        # print(len(x), len(xn), xn[0], xn[len(xn)-1])
-        else:
-            xn = x
-            yn = y
-    else:
-        # XPS in binding energy scale
-        if x[len(x) - 1] < xmin or xmax < x[0]:
-            if xmax < x[0]:
-                for i in range(0, len(x) - 1):
-                    if x[i] <= xmax:
-                        lmidx = i
-                        break
-            else:
-                lmidx = 0
-
-            if x[len(x) - 1] < xmin:
-                for i in range(len(x) - 1, -1, -1):
-                    if x[i] >= xmin:
-                        rmidx = i
-                        break
-            else:
-                rmidx = len(x) - 1
-
-            xn = x[lmidx : rmidx + 1].copy()
-            yn = y[lmidx : rmidx + 1].copy()
-        # print(len(x), len(xn), xn[0], xn[len(xn)-1])
-        else:
-            xn = x
-            yn = y
-
-    # return [array(xn), array(yn)]
-    return [xn, yn]
-
-
 separator_mapping = {
     "Comma: [,]": ",",
     "Semicolon: [;]": ";",
@@ -765,7 +1267,7 @@ class PreviewDialog(QtWidgets.QDialog):
                     self.file_path,
                     delimiter=self.selected_separator,
                     header=self.header_row,
-                    engine="python",
+                    engine=read_engine(self.selected_separator),
                     nrows=0,
                     on_bad_lines="skip",
                 )
@@ -773,7 +1275,7 @@ class PreviewDialog(QtWidgets.QDialog):
                     self.data = pd.read_csv(
                         self.file_path,
                         delimiter=self.selected_separator,
-                        engine="python",
+                        engine=read_engine(self.selected_separator),
                         names=self.data.columns.values.tolist()[1:],
                         skiprows=self.header_row + 1,
                         on_bad_lines="skip",
@@ -782,7 +1284,7 @@ class PreviewDialog(QtWidgets.QDialog):
                     self.data = pd.read_csv(
                         self.file_path,
                         delimiter=self.selected_separator,
-                        engine="python",
+                        engine=read_engine(self.selected_separator),
                         skiprows=self.header_row,
                         on_bad_lines="skip",
                     )
@@ -790,7 +1292,7 @@ class PreviewDialog(QtWidgets.QDialog):
                 self.data = pd.read_csv(
                     self.file_path,
                     delimiter=self.selected_separator,
-                    engine="python",
+                    engine=read_engine(self.selected_separator),
                     skiprows=self.header_row,
                     header=None,
                     on_bad_lines="skip",
@@ -906,9 +1408,254 @@ class PreviewDialog(QtWidgets.QDialog):
             self.column2_combobox.currentTextChanged.connect(self.update_preview)
 
 
+def read_rows_lightened(filepath):
+    """Returns the rows_lightened of a file, i.e. the factor by which its rows were thinned out, or 1 if its first
+    line does not state it. Data which is only kept in memory (VAMAS blocks) has no file and 1 is returned."""
+    if not os.path.isfile(filepath):
+        return 1
+    with open(filepath, "r") as f:
+        header_line = str(f.readline())
+    if "rows_lightened" in header_line:
+        return int(header_line.split("=")[1])
+    return 1
+
+
 class DataSet:
-    def __init__(self, df, filepath, pe):
-        self.df = df
+    """Energy axis and intensities of a loaded spectrum with its metadata.
+
+    The columns are kept as two numpy arrays instead of a DataFrame per file. Numeric columns keep their type, e.g.
+    integer counts, so the fits are the same as for the columns read from the file. The slots avoid an attribute
+    dictionary per data set, so thousands of spectra cost little more than their data. The arrays can be moved to
+    memory-mapped files of a SpectrumStore, then only the pages of the spectra in use are held in memory.
+    """
+
+    __slots__ = ("_x", "_y", "loader", "filepath", "filename", "pe", "rows_lightened", "hv", "wf")
+
+    def __init__(self, x, y, filepath, pe, loader=None, rows_lightened=1, hv=None, wf=None):
+        """Args:
+            x (numpy.ndarray): Energy axis, can be None if a loader is given.
+            y (numpy.ndarray): Intensities, can be None if a loader is given.
+            filepath (str): Path of the data, used as key and for the name of the data set.
+            pe (float): Pass energy or None.
+            loader (callable, optional): Returns the energy axis and the intensities on the first access, e.g. to
+                decode a VAMAS block only when it is selected.
+            rows_lightened (int, optional): Factor by which the rows of the data were thinned out. Default is 1.
+            hv (float, optional): Source energy, if known from the file.
+            wf (float, optional): Work function, if known from the file.
+        """
+        self._x = None
+        self._y = None
+        self.loader = loader
         self.filepath = filepath
         self.filename = os.path.basename(filepath)
         self.pe = pe
+        self.rows_lightened = rows_lightened
+        self.hv = hv
+        self.wf = wf
+        if x is not None:
+            self.set_data(x, y)
+
+    @staticmethod
+    def column(values):
+        if isinstance(values, np.memmap):
+            return values
+        values = np.asarray(values)
+        if values.dtype.kind not in "iuf":
+            values = values.astype(np.float64)
+        return values
+
+    def set_data(self, x, y):
+        self._x = self.column(x)
+        self._y = self.column(y)
+
+    def load(self):
+        if self._x is None and self.loader is not None:
+            self.set_data(*self.loader())
+            self.loader = None
+
+    @property
+    def x(self):
+        self.load()
+        return self._x
+
+    @property
+    def y(self):
+        self.load()
+        return self._y
+
+
+class SpectrumStore:
+    """Memory-mapped files of the data of imported spectra, e.g. of a directory import.
+
+    The spectra added together are written to one file, which is mapped once, the arrays of the data sets are views
+    into it. The files are kept in a temporary directory, which is removed when the list of files is cleared or the
+    application exits. The mapped arrays are read-only.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.count = 0
+        self.finalizer = None
+
+    def add(self, data_sets):
+        """Moves the data of the data sets into a new memory-mapped file, data sets which are already mapped are kept."""
+        data_sets = [data_set for data_set in data_sets if data_set.x is not None and not isinstance(data_set.x, np.memmap)]
+        if len(data_sets) == 0:
+            return
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="lg4x_spectra_")
+            # errors are ignored, the files of mapped arrays can not be removed while they are open on Windows
+            self.finalizer = weakref.finalize(self, shutil.rmtree, self.directory, True)
+        path = os.path.join(self.directory, "{}.bin".format(self.count))
+        self.count += 1
+        layout = []
+        offset = 0
+        with open(path, "wb") as f:
+            for data_set in data_sets:
+                columns = []
+                for values in (data_set.x, data_set.y):
+                    values = np.ascontiguousarray(values)
+                    # the columns start at multiples of 8 bytes, the alignment of float64
+                    padding = -offset % 8
+                    f.write(bytes(padding) + values.tobytes())
+                    offset += padding
+                    columns.append((offset, values.dtype, values.nbytes))
+                    offset += values.nbytes
+                layout.append(columns)
+        if offset == 0:
+            return
+        mapped = np.memmap(path, dtype=np.uint8, mode="r")
+        for data_set, columns in zip(data_sets, layout):
+            data_set.set_data(*[mapped[start : start + nbytes].view(dtype) for start, dtype, nbytes in columns])
+
+    def clear(self):
+        """Removes all files, the data sets of the store must not be used anymore."""
+        if self.finalizer is not None:
+            self.finalizer()
+        self.directory = None
+        self.count = 0
+        self.finalizer = None
+
+
+class ParseCache:
+    """Binary cache of parsed csv and txt files, so that files which did not change are not parsed again.
+
+    Each file has one .npz entry per set of import settings, named by the hash of its path and the settings. The
+    entry stores the modification time and size of the file and is only used while they match, a changed file
+    overwrites the entry on its next import. The version is part of the entry name and is increased when the reader
+    changes, so that entries parsed by an older reader are not used.
+    """
+
+    version = 2
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Directory of the cache, created on the first entry.
+        """
+        self.directory = directory
+
+    def entry(self, filepath, settings):
+        settings = sorted((str(key), str(value)) for key, value in dict(settings).items())
+        key = repr((self.version, os.path.abspath(filepath), settings))
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npz")
+
+    @staticmethod
+    def stamp(filepath):
+        stat = os.stat(filepath)
+        return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+    def load(self, filepath, settings):
+        """Returns (x, y, rows_lightened) of the file if it was parsed with the same settings before, otherwise None.
+
+        Args:
+            filepath (str): Path of the csv or txt file.
+            settings (Mapping): The import settings, e.g. the [Import] section of the config.
+        """
+        entry = self.entry(filepath, settings)
+        try:
+            with np.load(entry) as cached:
+                if not np.array_equal(cached["stamp"], self.stamp(filepath)):
+                    return None
+                return cached["x"], cached["y"], int(cached["rows_lightened"])
+        except Exception:
+            # missing or unreadable entries are parsed again
+            return None
+
+    def save(self, filepath, settings, data_set):
+        """Stores the data of a data set parsed from the file with the given settings."""
+        entry = self.entry(filepath, settings)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # the entry is replaced at once, so that it is never read half written
+            temp_path = entry + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(
+                    f,
+                    x=data_set.x,
+                    y=data_set.y,
+                    rows_lightened=data_set.rows_lightened,
+                    stamp=self.stamp(filepath),
+                )
+            os.replace(temp_path, entry)
+        except Exception as e:
+            logging.warning(f"Could not write the parse cache of {filepath}: {e}")
+
+
+class ImportThread(QtCore.QThread):
+    file_imported = QtCore.pyqtSignal(int, int, str)
+    file_failed = QtCore.pyqtSignal(str, str)
+    import_finished = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, paths, settings, parse_cache=None, workers=None):
+        """Thread importing csv and txt files with the remembered import settings, the files are parsed concurrently
+        in a thread pool.
+
+        The data sets are emitted together with import_finished in the order of the paths, so that the file list is
+        only filled once. Files which could not be read with the settings are reported by file_failed and are left to
+        the interactive import.
+
+        Args:
+            paths (list): Absolute paths of the files.
+            settings (Mapping): The [Import] settings, they are copied so that the config may change meanwhile.
+            parse_cache (ParseCache, optional): Cache of the parsed files, files which did not change are not parsed.
+            workers (int, optional): Number of threads, by default the number of CPUs up to 8.
+        """
+        super().__init__()
+        self.paths = paths
+        self.config = configparser.ConfigParser()
+        self.config.read_dict({"Import": dict(settings)})
+        self.parse_cache = parse_cache
+        self.workers = workers if workers is not None else min(8, os.cpu_count() or 1)
+
+    def read(self, path):
+        cached = None
+        if self.parse_cache is not None:
+            cached = self.parse_cache.load(path, self.config["Import"])
+        if cached is None:
+            x, y, rows_lightened = load_spectrum(path, self.config)
+        else:
+            x, y, rows_lightened = cached
+        data_set = DataSet(x=x, y=y, filepath=path, pe=None, rows_lightened=rows_lightened)
+        if cached is None and self.parse_cache is not None:
+            self.parse_cache.save(path, self.config["Import"], data_set)
+        return data_set
+
+    def run(self):
+        data_sets = [None] * len(self.paths)
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.read, path): index for index, path in enumerate(self.paths)}
+            for done, future in enumerate(as_completed(futures), 1):
+                index = futures[future]
+                try:
+                    data_sets[index] = future.result()
+                except Exception as e:
+                    logging.warning(f"Could not import {self.paths[index]} with the import settings: {e}")
+                    failed.append(index)
+                    self.file_failed.emit(self.paths[index], str(e))
+                self.file_imported.emit(done, len(self.paths), self.paths[index])
+        self.import_finished.emit(
+            [data_set for data_set in data_sets if data_set is not None],
+            [self.paths[index] for index in sorted(failed)],
+        )
@@ -3,26 +3,43 @@
 # based on LG4X: Copyright (C) 2021, Hideki NAKAJIMA, Synchrotron Light Research Institute, Thailand.
 
 import ast
+import copy
 import math
 import sys
 import base64
 import pickle
 import webbrowser
+from functools import partial
 import matplotlib.pyplot as plt
 import pandas as pd
 from PyQt5.QtCore import QTime
-from lmfitxps.models import TougaardBG, ShirleyBG, SlopeBG
-from lmfitxps.lineshapes import singlett
-import lmfitxps.backgrounds as xpy
-from lmfit import Model
 from matplotlib import style
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from PyQt5.QtWidgets import QApplication, QDesktopWidget
 
 import vamas_export as vpy
+from fit_engine import (
+    load_preset,
+    prepare_fit,
+    run_fit,
+    bg_result_to_pre,
+    peak_result_to_pre,
+    fit_text,
+    write_fit_csv,
+    component_curves,
+    component_metrics,
+    component_names,
+    component_prefix,
+    component_results,
+    result_export,
+    result_properties,
+    shirley_integral,
+    ResultsStore,
+)
 from periodictable import PeriodicTable
-from scipy import integrate
+from spectrum_io import load_spectrum
+from version import __version__
 from helpers import *
 from gui_helpers import *
 import threading
@@ -36,12 +53,14 @@ if os.environ.get("container") == "flatpak":
     log_folder = ".var/app/io.github.julian_hochhaus.LG4X_V2/cache/Logs"
     os.makedirs(log_folder, exist_ok=True)
     log_file_path = ".var/app/io.github.julian_hochhaus.LG4X_V2/cache/Logs/app.log"
+    cache_folder = ".var/app/io.github.julian_hochhaus.LG4X_V2/cache/Logs/cache"
     config_file_path = "/app/config/config.ini"
 else:
     script_directory = os.path.dirname(os.path.abspath(__file__))
     log_folder = os.path.join(script_directory, "../Logs")
     os.makedirs(log_folder, exist_ok=True)
     log_file_path = os.path.join(script_directory, "../Logs/app.log")
+    cache_folder = os.path.join(script_directory, "../Logs/cache")
     config_file_path = os.path.join(script_directory, "../config/config.ini")
 
 max_log_size = 4 * 1024 * 1024  # 4MB
@@ -63,7 +82,6 @@ if len(config_file_path) >= 256:
     )
 config.read(config_file_path)
 
-__version__ = "2.4.2"
 # style.use('ggplot')
 style.use("seaborn-v0_8-colorblind")
 dictBG = {
@@ -115,12 +133,16 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.correct_energy = 0
         self.canvas = None
         self.figure = None
-        self.df = None
+        self.plot_layer = None
+        self.data_set = None
         self.filePath = None
         self.pt = None
         self.floating = None
         self.version = None
         self.settings_dialog = None
+        self.fit_profile = None
+        self.fit_profile_window = None
+        self.fit_progress = None
         self.parameter_history_list = []
         self.go_back_in_parameter_history = False
         self.event_stop = threading.Event()
@@ -133,6 +155,13 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.version = "LG4X: LMFit GUI for XPS curve fitting v{}".format(__version__)
         self.floating = ".3f"
         self.data_arr = {}
+        # memory-mapped data of directory imports
+        self.spectrum_store = SpectrumStore()
+        # parsed csv and txt files
+        self.parse_cache = ParseCache(cache_folder)
+        self.import_thread = None
+        self.import_selected = None
+        self.results_store = ResultsStore()
         self.display_name_to_path = {}
         self.current_theme = "dark"
         self.initUI()
@@ -178,6 +207,7 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.filePath = QtCore.QDir.homePath()
         self.cfilePath = QtCore.QDir.homePath()
         self.figure, self.ar, self.ax, self.canvas, self.toolbar = setupCanvas(self)
+        self.plot_layer = PlotLayer(self.canvas, self.ax, self.ar)
 
         # --- Top row layout ---
         toprow_layout = createTopRowLayout(self, dictBG)
@@ -224,6 +254,7 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.filePath = QtCore.QDir.homePath()
         self.cfilePath = QtCore.QDir.homePath()
         self.figure, self.ar, self.ax, self.canvas, self.toolbar = setupCanvas(self)
+        self.plot_layer = PlotLayer(self.canvas, self.ax, self.ar)
 
         # --- Top row layout ---
         toprow_layout = createTopRowLayout(self, dictBG)
@@ -252,6 +283,20 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.settings_dialog = SettingsDialog(self, config, config_file_path)
         self.settings_dialog.show()
 
+    def show_fit_profile(self):
+        """Show the profiling panel, it is updated live while a fit is running."""
+        if self.fit_profile_window is None:
+            self.fit_profile_window = FitProfileWindow()
+        if self.fit_profile is not None:
+            self.fit_profile_window.update_profile(self.fit_profile)
+        self.fit_profile_window.show()
+        self.fit_profile_window.raise_()
+
+    def fit_profile_updated(self, profile):
+        self.fit_profile = profile
+        if self.fit_profile_window is not None and self.fit_profile_window.isVisible():
+            self.fit_profile_window.update_profile(profile)
+
     def duplicateComponentNames(self, new_label):
         if new_label in self.list_component:
             QtWidgets.QMessageBox.warning(
@@ -1265,8 +1310,8 @@ class PrettyWidget(QtWidgets.QMainWindow):
                     self.removeCol(idx=None)
             # load default preset
             if self.comboBox_file.currentIndex() > 0:
-                x0 = self.df.iloc[:, 0].to_numpy()
-                y0 = self.df.iloc[:, 1].to_numpy()
+                x0 = self.data_set.x
+                y0 = self.data_set.y
                 pre_pk = [
                     [0, 0],
                     [0, x0[abs(y0 - y0.max()).argmin()]],
@@ -1373,7 +1418,7 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 [2, 0, 2, 0, 2, 0, 2, 0, "", ""],
             ]
             if self.comboBox_file.currentIndex() > 0:
-                y0 = self.df.iloc[:, 1].to_numpy()
+                y0 = self.data_set.y
                 pre_pk = [
                     [0, 0, 0, 0, 0, 0, 0, 0],
                     [2, 284.6, 2, 286.5, 2, 288.0, 2, 291.0],
@@ -1784,17 +1829,14 @@ class PrettyWidget(QtWidgets.QMainWindow):
         if cfilePath != "":
             self.cfilePath = cfilePath
             self.filePath = self.cfilePath.rsplit("/", 1)[0]
-            with open(self.cfilePath, "r") as file:
-                temp_pre = file.read()
-            file.close()
             # print(self.pre, type(self.pre))
-            self.pre = ast.literal_eval(temp_pre)
-            if (
-                type(self.pre[0][0]) == int
-            ):  # backwards compatibility for old presets which only allowed one single BG
-                self.idx_bg = [self.pre[0][0]]
-            else:
-                self.idx_bg = self.pre[0][0]
+            try:
+                self.pre = load_preset(self.cfilePath)
+            except ValueError as e:
+                return self.raise_error(
+                    window_title="Error: Could not load preset.", error_message=str(e)
+                )
+            self.idx_bg = self.pre[0][0]
             if len(self.pre) == 5 and len(self.pre[4]) - 1 == int(
                 len(self.pre[2][0]) / 2
             ):
@@ -2074,6 +2116,13 @@ class PrettyWidget(QtWidgets.QMainWindow):
         #     else:
         #         lmfit_attr_dict[attr] = value
 
+        # the Jacobian (Dfun) in the call arguments of the fit refers to the model, which cannot be pickled
+        lmfit_result = copy.copy(self.export_out.result)
+        lmfit_result.call_kws = {
+            key: value
+            for key, value in getattr(lmfit_result, "call_kws", {}).items()
+            if key != "Dfun"
+        }
         with open(path_for_export.replace(".txt", ".pickle"), "wb") as handle:
             pickle.dump(
                 {
@@ -2081,12 +2130,46 @@ class PrettyWidget(QtWidgets.QMainWindow):
                     "lmfit_parameters": self.export_pars,
                     # 'lmfit_report':self.export_out.fit_report(min_correl=0.1)
                     # 'lmfit_report': lmfit_attr_dict
-                    "lmfit_result": self.export_out.result,
+                    "lmfit_result": lmfit_result,
                 },
                 handle,
                 protocol=pickle.HIGHEST_PROTOCOL,
             )
 
+    def export_results_table(self):
+        """
+        Exports the results of all fitted files in one table, one row per file with every parameter value and
+        stderr and the area and area fraction of every component. The format is chosen by the file extension:
+        .csv, .parquet or .feather (the latter two need pyarrow).
+        """
+        if len(self.results_store) == 0:
+            self.raise_error(
+                window_title="Error: No Results exported!",
+                error_message="There is nothing to export here, no file was fitted yet.",
+            )
+            return None
+        cfilePath, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Save results table",
+            self.cfilePath + os.sep + "fit_results.csv",
+            "CSV (*.csv);;Parquet (*.parquet);;Feather (*.feather)",
+        )
+        if cfilePath != "":
+            if os.path.splitext(cfilePath)[1] == "":
+                cfilePath += selected_filter.split("*")[-1].rstrip(")")
+            try:
+                self.results_store.export(cfilePath)
+            except (ImportError, ValueError, OSError) as e:
+                return self.raise_error(
+                    window_title="Error: Results table not exported!",
+                    error_message=str(e),
+                )
+            self.statusBar().showMessage(
+                "Results of {} files exported to {}".format(
+                    len(self.results_store), cfilePath
+                )
+            )
+
     def exportResults(self):
         if self.result.empty:
             self.raise_error(
@@ -2120,97 +2203,15 @@ class PrettyWidget(QtWidgets.QMainWindow):
                     strmode = "simulation mode"
                 else:
                     strmode = self.comboBox_file.currentText()
-                Text = (
-                    self.version
-                    + "\n\n[[Data file]]\n\n"
-                    + strmode
-                    + "\n\n[[Fit results]]\n\n"
-                )
                 self.savePreset()
-                Text += (
-                    "\n\n[[LG4X parameters]]\n\n"
-                    + str(self.parText)
-                    + "\n\n"
-                    + str(self.export_out.fit_report(min_correl=0.1))
-                )
-                Text += "\n\n[[lmfit parameters]]\n\n" + str(self.export_pars)
-                Text += "\n\n[[Peak Metadata]]\n\n"
-                row_labels = list(
-                    dict.fromkeys(
-                        [
-                            key.split("_", 1)[-1]
-                            for d in self.meta_result_export
-                            for key in d.keys()
-                        ]
-                    )
-                )
-
-                column_titles = list(
-                    dict.fromkeys(
-                        [
-                            key.split("_", 1)[0]
-                            for d in self.meta_result_export
-                            for key in d.keys()
-                        ]
-                    )
+                Text = fit_text(
+                    self.version,
+                    strmode,
+                    self.parText,
+                    self.export_out,
+                    self.export_pars,
+                    self.meta_result_export,
                 )
-                column_widths = {
-                    "Property\\Component": max(
-                        len("Property\\Component"),
-                        max(len(row_label) for row_label in row_labels),
-                    )
-                }
-                for column_title in column_titles:
-                    column_widths[column_title] = max(
-                        len(column_title), 20
-                    )  # Set minimum width for readability
-
-                for d in self.meta_result_export:
-                    for key, value in d.items():
-                        component, property_name = key.split("_", 1)
-                        column_widths[property_name] = max(
-                            column_widths.get(property_name, 0), len(str(value))
-                        )
-
-                header = [
-                    "Property\\Component".ljust(column_widths["Property\\Component"])
-                ]
-                for column_title in column_titles:
-                    header.append(column_title.ljust(column_widths[column_title]))
-                Text += "\t".join(header) + "\n"
-
-                table_data = []
-                for row_label in row_labels:
-                    row = [row_label.ljust(column_widths["Property\\Component"])]
-                    for column_title in column_titles:
-                        value = None
-                        for d in self.meta_result_export:
-                            key = f"{column_title}_{row_label}"
-                            if key in d:
-                                value = d[key]
-                                break
-                        formatted_value = (
-                            str(value).ljust(column_widths[column_title])
-                            if value is not None
-                            else "N/A".ljust(column_widths[column_title])
-                        )
-                        row.append(formatted_value)  # Ensure the value is aligned
-                    table_data.append(row)
-
-                for row in table_data:
-                    Text += "\t".join(row) + "\n"
-
-                Text += "\n\n[[Parameters and Metaparameters as dictionaries]]\n\n"
-                Text += "\n\n[[Fit parameters as dictionary]]\n\n" + str(
-                    self.export_pars.valuesdict()
-                )
-                Text += (
-                    "\n\n[[Metadata/Values of the Components as dictionary ]]\n\n{\n"
-                )
-                for dic in self.meta_result_export:
-                    for key in dic.keys():
-                        Text += "'" + key + "' : " + str(dic[key]) + ",\n"
-                Text += "}\n"
                 self.export_pickle(
                     self.cfilePath
                 )  # export las fit parameters as dict int po pickle file
@@ -2220,21 +2221,17 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 file.close()
                 # print(filePath)
                 if self.cfilePath.split("_")[-1] == "fit.txt":
-                    with open(self.cfilePath.rsplit("_", 1)[0] + "_fit.csv", "w") as f:
-                        f.write(
-                            "#No of rows lightened (2D detector)"
-                            + str(self.rows_lightened)
-                            + "(if not using 2D detector, value is 1 and can be ignored!)\n"
-                        )
-                        self.result.to_csv(f, index=False, mode="a")
+                    write_fit_csv(
+                        self.cfilePath.rsplit("_", 1)[0] + "_fit.csv",
+                        self.result,
+                        self.rows_lightened,
+                    )
                 else:
-                    with open(self.cfilePath.rsplit(".", 1)[0] + ".csv", "w") as f:
-                        f.write(
-                            "#No of rows lightened (2D detector)"
-                            + str(self.rows_lightened)
-                            + "(if not using 2D detector, value is 1 and can be ignored!)\n"
-                        )
-                        self.result.to_csv(f, index=False, mode="a")
+                    write_fit_csv(
+                        self.cfilePath.rsplit(".", 1)[0] + ".csv",
+                        self.result,
+                        self.rows_lightened,
+                    )
                 return savename
 
     def clickOnBtnImp(self, idx):
@@ -2264,14 +2261,6 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 )
                 return  # Skip further processing
 
-            if ".txt" in fname:
-                df = pd.read_csv(cfilePath, comment="#")
-                num_columns = len(df.columns)
-            elif ".csv" in fname:
-                df = pd.read_csv(cfilePath, comment="#", usecols=[0, 1])
-                num_columns = len(df.columns)
-            if not num_columns == 2 and not remember_settings:
-                remember_settings = False
             if not remember_settings:
                 preview_dialog = PreviewDialog(cfilePath, config, config_file_path)
                 if preview_dialog.exec_():
@@ -2282,56 +2271,37 @@ class PrettyWidget(QtWidgets.QMainWindow):
                         self.imp_csv_or_txt(cfilePath, remember_settings=False)
                     if df is not None:
                         self.data_arr[cfilePath] = DataSet(
-                            filepath=cfilePath, df=df, pe=None
+                            filepath=cfilePath,
+                            x=df.iloc[:, 0].to_numpy(),
+                            y=df.iloc[:, 1].to_numpy(),
+                            pe=None,
+                            rows_lightened=read_rows_lightened(cfilePath),
                         )
                 else:
                     filename = None
-            elif not num_columns == 2:
-                if config.getboolean("Import", "has_header"):
-                    temp_header = pd.read_csv(
-                        cfilePath,
-                        delimiter=config.get("Import", "separator"),
-                        header=int(config.get("Import", "header_row")),
-                        engine="python",
-                        nrows=0,
-                    )
-                    if temp_header.columns.values.tolist()[0] == "#":
-                        cols = [col + 1 for col in config.get("Import", "columns")]
-                        df = pd.read_csv(
-                            cfilePath,
-                            delimiter=config.get("Import", "separator"),
-                            engine="python",
-                            names=temp_header.columns.values.tolist()[1:],
-                            skiprows=int(config.get("Import", "header_row")) + 1,
-                            comment="#",
-                        )
-                    else:
-                        df = pd.read_csv(
-                            cfilePath,
-                            delimiter=config.get("Import", "separator"),
-                            engine="python",
-                            skiprows=int(config.get("Import", "header_row")),
-                            comment="#",
-                        )
+            else:
+                cached = self.parse_cache.load(cfilePath, config["Import"])
+                if cached is not None:
+                    # the file did not change since it was parsed with the same settings
+                    x, y, rows_lightened = cached
                 else:
-                    df = pd.read_csv(
-                        cfilePath,
-                        delimiter=config.get("Import", "separator"),
-                        engine="python",
-                        skiprows=int(config.get("Import", "header_row")),
-                        header=None,
-                        comment="#",
+                    try:
+                        x, y, rows_lightened = load_spectrum(cfilePath, config)
+                    except ValueError:
+                        print("automatic import failed, please select correct format")
+                        return self.imp_csv_or_txt(cfilePath, remember_settings=False)
+                filename = fname
+                self.data_arr[cfilePath] = DataSet(
+                    filepath=cfilePath,
+                    x=x,
+                    y=y,
+                    pe=None,
+                    rows_lightened=rows_lightened,
+                )
+                if cached is None:
+                    self.parse_cache.save(
+                        cfilePath, config["Import"], self.data_arr[cfilePath]
                     )
-                    df.columns = [f"col{i + 1}" for i in range(len(df.columns))]
-                df = df.iloc[:, eval(config.get("Import", "columns"))]
-                if df.isna().any().any():
-                    print("automatic import failed, please select correct format")
-                    self.imp_csv_or_txt(cfilePath, remember_settings=False)
-                filename = os.path.basename(cfilePath)
-                self.data_arr[cfilePath] = DataSet(filepath=cfilePath, df=df, pe=None)
-            else:
-                filename = os.path.basename(cfilePath)
-                self.data_arr[cfilePath] = DataSet(filepath=cfilePath, df=df, pe=None)
 
             self.comboBox_file.clear()
             self.comboBox_file.addItems(self.list_file)
@@ -2391,14 +2361,13 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 self.filePath = self.cfilePath.rsplit("/", 1)[0]
                 # print (self.cfilePath)
                 try:
-                    self.list_vamas = vpy.list_vms(self.cfilePath)
+                    blocks, wf, hv = vpy.index_vms(self.cfilePath)
                 except Exception as e:
                     return self.raise_error(
                         window_title="Error: could not load VAMAS file.",
                         error_message="Loading VAMAS file failed. The following traceback may help to solve the issue:",
                     )
                 try:
-                    wf = vpy.get_wf(self.cfilePath)
                     if isinstance(wf, float):
                         self.wf = abs(wf)
                         self.wf_item.setText(
@@ -2418,7 +2387,6 @@ class PrettyWidget(QtWidgets.QMainWindow):
                         error_message=e.args[0],
                     )
                 try:
-                    hv = vpy.get_hv(self.cfilePath)
                     if isinstance(hv, float):
                         self.hv = hv
                         self.hv_item.setText(str(hv))
@@ -2437,22 +2405,19 @@ class PrettyWidget(QtWidgets.QMainWindow):
                         error_message=e.args[0],
                     )
 
-                for file in self.list_vamas:
-                    df = pd.read_csv(file, delimiter="\t", skiprows=1)
-                    strpe = np.loadtxt(
-                        file, dtype="str", delimiter="\t", usecols=1, max_rows=1
+                # only the block index is read, the data of a block is decoded when it is selected
+                self.list_vamas = []
+                for file, block, pe in blocks:
+                    self.data_arr[file] = DataSet(
+                        filepath=file,
+                        x=None,
+                        y=None,
+                        pe=pe,
+                        loader=partial(vpy.block_data, block),
+                        hv=block.source_energy,
+                        wf=block.analyser_work_function,
                     )
-                    strpe = str(strpe).split()
-
-                    if strpe[0] == "PE:" and strpe[2] == "eV":
-                        pe = float(strpe[1])
-                        self.data_arr[file] = DataSet(
-                            filepath=file, df=df, pe=pe
-                        )
-                    else:
-                        self.data_arr[file] = DataSet(
-                            filepath=file, df=df, pe=None
-                        )
+                    self.list_vamas.append(file)
 
                 self.comboBox_file.clear()
                 self.comboBox_file.addItems(self.list_file)
@@ -2477,32 +2442,15 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 self.filePath = directory
                 entries = os.listdir(directory)
                 entries.sort(key=lambda x: (os.path.splitext(x)[1] != ".txt", x))
-                self.comboBox_file.blockSignals(True)
-                for entry in entries:
-                    if (
-                        os.path.splitext(entry)[1] == ".csv"
-                        or os.path.splitext(entry)[1] == ".txt"
-                    ):
-                        self.cfilePath = os.path.join(directory, entry)
-                        try:
-                            self.imp_csv_or_txt(self.cfilePath, remember_settings=True)
-                        except Exception as e:
-                            print(
-                                f"Error: could not auto-load file. Please select correct format!\n Traceback:\n ****************** \n  {e}"
-                            )
-                            self.imp_csv_or_txt(self.cfilePath, remember_settings=False)
-
-                self.comboBox_file.clear()
-                self.comboBox_file.addItems(self.list_file)
-                self.display_name_to_path = {
-                    self.format_display_name(fpath): fpath for fpath in self.data_arr.keys()
-                }
-                self.comboBox_file.addItems(self.display_name_to_path.keys())
-                display_name = self.format_display_name(self.cfilePath)
-                index = self.comboBox_file.findText(display_name, QtCore.Qt.MatchFixedString)
-                self.comboBox_file.blockSignals(False)
-                if index >= 0:
-                    self.comboBox_file.setCurrentIndex(index)
+                entries = [
+                    entry
+                    for entry in entries
+                    if os.path.splitext(entry)[1] == ".csv"
+                    or os.path.splitext(entry)[1] == ".txt"
+                ]
+                if entries:
+                    self.cfilePath = os.path.join(directory, entries[-1])
+                    self.import_directory(directory, entries, entries[-1])
         if index == 5:
             directory = QtWidgets.QFileDialog.getExistingDirectory(
                 self,
@@ -2519,28 +2467,7 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 ]
                 if csv_files:
                     csv_files.sort()
-                    for entry in csv_files:
-                        self.comboBox_file.blockSignals(True)
-                        cfile_path = os.path.join(directory, entry)
-                        try:
-                            self.imp_csv_or_txt(cfile_path, remember_settings=True)
-                        except Exception as e:
-                            print(
-                                f"Error: could not auto-load file. Please select correct format!\n Traceback:\n ****************** \n  {e}"
-                            )
-                            self.imp_csv_or_txt(cfile_path, remember_settings=False)
-
-                    self.comboBox_file.clear()
-                    self.comboBox_file.addItems(self.list_file)
-                    self.display_name_to_path = {
-                        self.format_display_name(fpath): fpath for fpath in self.data_arr.keys()
-                    }
-                    self.comboBox_file.addItems(self.display_name_to_path.keys())
-                    display_name = self.format_display_name(f"{directory}/{csv_files[0]}")
-                    index = self.comboBox_file.findText(display_name, QtCore.Qt.MatchFixedString)
-                    self.comboBox_file.blockSignals(False)
-                    if index >= 0:
-                        self.comboBox_file.setCurrentIndex(index)
+                    self.import_directory(directory, csv_files, csv_files[0])
         if index == 6:
             directory = QtWidgets.QFileDialog.getExistingDirectory(
                 self,
@@ -2558,35 +2485,84 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 ]
                 if txt_files:
                     txt_files.sort()
-                    for entry in txt_files:
-                        self.comboBox_file.blockSignals(True)
-                        cfile_path = os.path.join(directory, entry)
-                        try:
-                            self.imp_csv_or_txt(cfile_path, remember_settings=True)
-                        except Exception as e:
-                            print(
-                                f"Error: could not auto-load file. Please select correct format!\n Traceback:\n ****************** \n  {e}"
-                            )
-                            self.imp_csv_or_txt(cfile_path, remember_settings=False)
-
-                    self.comboBox_file.clear()
-                    self.comboBox_file.addItems(self.list_file)
-                    self.display_name_to_path = {
-                        self.format_display_name(fpath): fpath for fpath in self.data_arr.keys()
-                    }
-                    self.comboBox_file.addItems(self.display_name_to_path.keys())
-                    display_name = self.format_display_name(f"{directory}/{txt_files[0]}")
-                    index = self.comboBox_file.findText(display_name, QtCore.Qt.MatchFixedString)
-                    self.comboBox_file.blockSignals(False)
-                    if index >= 0:
-                        self.comboBox_file.setCurrentIndex(index)
+                    self.import_directory(directory, txt_files, txt_files[0])
         self.idx_imp = 0
 
+    def import_directory(self, directory, entries, selected):
+        """
+        Imports the files of a directory in the background with the remembered import settings. The files are
+        parsed concurrently, the progress is shown in the status bar and the file list is filled once at the end.
+
+        Args:
+            directory (str): The directory.
+            entries (list): Names of the files to import, in the order of the file list.
+            selected (str): Name of the file which is selected after the import.
+        """
+        if self.import_thread is not None and self.import_thread.isRunning():
+            self.statusBar().showMessage("An import is already running.")
+            return
+        paths = [os.path.abspath(os.path.join(directory, entry)) for entry in entries]
+        for path in paths:
+            if path in self.data_arr:
+                print(f'The file "{path}" has already been loaded. Skipping')
+        paths = [path for path in paths if path not in self.data_arr]
+        self.import_thread = ImportThread(paths, config["Import"], self.parse_cache)
+        self.import_thread.file_imported.connect(self.file_imported)
+        self.import_thread.import_finished.connect(self.directory_imported)
+        self.import_selected = os.path.join(directory, selected)
+        self.statusBar().showMessage("Importing {} files...".format(len(paths)))
+        self.import_thread.start()
+
+    def file_imported(self, done, total, path):
+        self.statusBar().showMessage(
+            "Importing files: {}/{} ({})".format(done, total, os.path.basename(path))
+        )
+
+    def directory_imported(self, data_sets, failed):
+        for data_set in data_sets:
+            self.data_arr[data_set.filepath] = data_set
+        self.map_data_sets([data_set.filepath for data_set in data_sets])
+        self.comboBox_file.blockSignals(True)
+        # files which could not be read with the import settings are imported interactively
+        for path in failed:
+            print(
+                f"Error: could not auto-load file {path}. Please select correct format!"
+            )
+            self.imp_csv_or_txt(path, remember_settings=False)
+        self.map_data_sets(failed)
+        self.comboBox_file.clear()
+        self.comboBox_file.addItems(self.list_file)
+        self.display_name_to_path = {
+            self.format_display_name(fpath): fpath for fpath in self.data_arr.keys()
+        }
+        self.comboBox_file.addItems(self.display_name_to_path.keys())
+        display_name = self.format_display_name(self.import_selected)
+        index = self.comboBox_file.findText(display_name, QtCore.Qt.MatchFixedString)
+        self.comboBox_file.blockSignals(False)
+        self.statusBar().showMessage(
+            "Imported {} files, {} could not be read with the import settings.".format(
+                len(data_sets), len(failed)
+            )
+        )
+        if index >= 0:
+            self.comboBox_file.setCurrentIndex(index)
+
+    def map_data_sets(self, file_paths):
+        """
+        Moves the data of imported files to the memory-mapped spectrum store, so that the spectra of large directory
+        imports are not all held in memory. Files which were not imported are skipped.
+        """
+        file_paths = [os.path.abspath(file_path) for file_path in file_paths]
+        self.spectrum_store.add(
+            [self.data_arr[file_path] for file_path in file_paths if file_path in self.data_arr]
+        )
+
     def value_change_filelist(self):
         if self.comboBox_file.currentIndex() == 1:
             self.comboBox_file.clear()
             self.list_file = ["File list", "Clear list"]
             self.data_arr = {}
+            self.spectrum_store.clear()
             self.display_name_to_path={}
             self.comboBox_file.addItems(self.list_file)
             self.comboBox_file.setCurrentIndex(0)
@@ -2594,8 +2570,7 @@ class PrettyWidget(QtWidgets.QMainWindow):
             self.plot()
         if self.comboBox_file.currentIndex() == 0 and self.comboBox_file.count() > 1:
             # plt.cla()
-            self.ar.cla()
-            self.ax.cla()
+            self.plot_layer.clear()
             self.canvas.draw()
 
     def plot(self):
@@ -2622,25 +2597,12 @@ class PrettyWidget(QtWidgets.QMainWindow):
             return
 
         filePath = file_path
-        try:
-            with open(filePath, "r") as f:
-                header_line = str(f.readline())
-        except Exception as e:
-            return self.raise_error(
-                window_title="Error: could not open file.",
-                error_message="Could not open the selected file.",
-            )
-
-        if "rows_lightened" in header_line:
-            self.rows_lightened = int(header_line.split("=")[1])
-        else:
-            self.rows_lightened = 1
-
-        self.df = self.data_arr[filePath].df
+        self.data_set = self.data_arr[filePath]
+        self.rows_lightened = self.data_set.rows_lightened
 
         try:
-            x0 = self.df.iloc[:, 0].to_numpy()
-            y0 = self.df.iloc[:, 1].to_numpy()
+            x0 = self.data_set.x
+            y0 = self.data_set.y
         except Exception as e:
             return self.raise_error(
                 window_title="Error: could not load .csv file.",
@@ -2651,10 +2613,10 @@ class PrettyWidget(QtWidgets.QMainWindow):
         if pe is not None:
             print("Current Pass energy is PE= ", pe, "eV")
 
-        self.ax.cla()
+        self.plot_layer.remove_fit()
 
         try:
-            self.ax.plot(x0, y0, linestyle="-", color="b", label="raw")
+            self.plot_layer.set_raw(x0, y0, linestyle="-", color="b", label="raw")
         except Exception as e:
             return self.raise_error(
                 window_title="Error: could not plot data.",
@@ -2668,8 +2630,10 @@ class PrettyWidget(QtWidgets.QMainWindow):
 
         self.ax.set_ylabel("Intensity (arb. unit)", fontsize=11)
         self.ax.grid(True)
-        self.ax.legend(loc=0)
-        self.canvas.draw()
+        self.ax.relim()
+        self.ax.autoscale()
+        self.plot_layer.legend()
+        self.plot_layer.draw()
         self.repaint()
 
     def plot_pt(self):
@@ -2779,8 +2743,9 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 x1 = float(self.xmin)
                 x2 = float(self.xmax)
             points = 999
-            self.df = np.zeros((points, 2)) + 0.01
-            self.df[:, 0] = np.linspace(x1, x2, points)
+            self.data_set = DataSet(
+                np.linspace(x1, x2, points), np.zeros(points) + 0.01, "simulation", None
+            )
             self.ana("sim")
         else:
             self.ana("eva")
@@ -2807,14 +2772,77 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 x1 = float(self.xmin)
                 x2 = float(self.xmax)
             points = 999
-            self.df = np.zeros((points, 2)) + 0.01
-            self.df[:, 0] = np.linspace(x1, x2, points)
+            self.data_set = DataSet(
+                np.linspace(x1, x2, points), np.zeros(points) + 0.01, "simulation", None
+            )
             self.ana("sim")
 
     def interrupt_fit(self):
         if self.fit_thread:
             self.fit_thread.interrupt_fit()
 
+    def fit_series(self):
+        """
+        Fits all files of the file list in their order with the current preset, e.g. a depth profile or a
+        temperature series. Each fit starts from the result of the previous file, the results are added to the
+        summary table of the series as soon as they are available.
+        """
+        if len(self.data_arr) == 0:
+            self.statusBar().showMessage("Fit series: no files loaded.")
+            return
+        self.savePreset()
+        paths = []
+        spectra = []
+        for file_path in self.display_name_to_path.values():
+            if file_path not in self.data_arr:
+                continue
+            data_set = self.data_arr[file_path]
+            paths.append(file_path)
+            spectra.append((data_set.x, data_set.y, data_set.rows_lightened))
+        ncomponent = int(len(self.pre[2][0]) / 2)
+        self.series_results = {}
+        self.series_window = SeriesTableWindow(
+            component_names(self.pre),
+            [component_prefix(self.pre, index_pk) for index_pk in range(ncomponent)],
+        )
+        self.series_window.show()
+        self.fit_thread = SeriesFitThread(
+            spectra=spectra,
+            pre=copy.deepcopy(self.pre),
+            fixed_bg=self.fixedBG.isChecked(),
+            tougaard_fft=self.btn_bg_tougaard_fft.isChecked(),
+            jacobian=self.fit_jacobian.isChecked(),
+        )
+        self.fit_thread.spectrum_fitted.connect(
+            lambda index, res: self.series_spectrum_fitted(paths[index], res)
+        )
+        self.fit_thread.spectrum_failed.connect(
+            lambda index, error: self.series_window.add_failure(
+                os.path.basename(paths[index])
+            )
+        )
+        self.fit_thread.series_finished.connect(
+            lambda: self.series_finished(len(paths))
+        )
+        self.fit_thread.thread_started.connect(self.fit_thread_started)
+        self.fit_thread.error_occurred.connect(self.handle_thread_exception)
+        self.statusBar().showMessage("Fit series running.")
+        self.fit_thread.start()
+
+    def series_spectrum_fitted(self, file_path, res):
+        self.series_results[file_path] = res
+        self.results_store.add(file_path, res.out, res.metrics)
+        self.series_window.add_result(os.path.basename(file_path), res)
+
+    def series_finished(self, nfiles):
+        self.enable_buttons_after_fit_thread()
+        nfev = sum(res.out.nfev for res in self.series_results.values())
+        self.statusBar().showMessage(
+            "Fit series done: {} of {} files fitted, # func evals: {}, Last run finished: {}".format(
+                len(self.series_results), nfiles, nfev, QTime.currentTime().toString()
+            )
+        )
+
     def one_step_back_in_params_history(self):
         """
         Is called if button undo Fit is prest.
@@ -2856,8 +2884,11 @@ class PrettyWidget(QtWidgets.QMainWindow):
             return None
 
     def clickOnBtnBG(self):
+        # the FFT option only selects how the Tougaard backgrounds are calculated
         checked_actions = [
-            action for action in self.bgMenu.actions() if action.isChecked()
+            action
+            for action in self.bgMenu.actions()
+            if action.isChecked() and action is not self.btn_bg_tougaard_fft
         ]
         idx_bg = set()
         for checked_action in checked_actions:
@@ -2969,1928 +3000,65 @@ class PrettyWidget(QtWidgets.QMainWindow):
     def write_pars(self, pars):
         return None
 
-    def bgSelector(self, x, y, mode, idx_bg):
-        if idx_bg == 0:
-            shA = self.pre[1][0][1]
-            shB = self.pre[1][0][3]
-            pars = None
-            mod = None
-            bg_mod = xpy.shirley_calculate(x, y, shA, shB)
-        if idx_bg == 100:
-            mod = ShirleyBG(independent_vars=["y"], prefix="bg_shirley_")
-            k = self.pre[1][0][5]
-            const = self.pre[1][0][7]
-            pars = mod.make_params()
-            pars["bg_shirley_k"].value = float(k)
-            pars["bg_shirley_const"].value = float(const)
-            if self.pre[1][0][4] == 2:
-                pars["bg_shirley_k"].vary = False
-            if self.pre[1][0][6] == 2:
-                pars["bg_shirley_const"].vary = False
-            bg_mod = 0
-        if idx_bg == 1:
-            toB = self.pre[1][1][1]
-            toC = self.pre[1][1][3]
-            toCd = self.pre[1][1][5]
-            toD = self.pre[1][1][7]
-            toT0 = self.pre[1][1][9]
-            pars = None
-            mod = None
-            if mode == "fit":
-                toM = self.pre[1][0][3]
-                [bg_mod, bg_toB] = xpy.tougaard_calculate(
-                    x, y, toB, toC, toCd, toD, toM
-                )
-            else:
-                toM = 1
-                [bg_mod, bg_toB] = xpy.tougaard_calculate(
-                    x, y, toB, toC, toCd, toD, toM
-                )
-            self.pre[1][1][1] = bg_toB
-        if idx_bg == 101:
-            mod = TougaardBG(independent_vars=["x", "y"], prefix="bg_tougaard_")
-            if (
-                self.pre[1][1][1] is None
-                or self.pre[1][1][3] is None
-                or self.pre[1][1][5] is None
-                or self.pre[1][1][7] is None
-                or self.pre[1][1][9] is None
-                or len(str(self.pre[1][1][1])) == 0
-                or len(str(self.pre[1][1][3])) == 0
-                or len(str(self.pre[1][1][5])) == 0
-                or len(str(self.pre[1][1][7])) == 0
-                or len(str(self.pre[1][1][9])) == 0
-            ):
-                pars = mod.guess(y, x=x, y=y)
-            else:
-                pars = mod.make_params()
-                pars["bg_tougaard_B"].value = self.pre[1][1][1]
-                if self.pre[1][1][0] == 2:
-                    pars["bg_tougaard_B"].vary = False
-                pars["bg_tougaard_C"].value = self.pre[1][1][3]
-                pars["bg_tougaard_C"].vary = False
-                pars["bg_tougaard_C_d"].value = self.pre[1][1][5]
-                pars["bg_tougaard_C_d"].vary = False
-                pars["bg_tougaard_D"].value = self.pre[1][1][7]
-                pars["bg_tougaard_D"].vary = False
-                pars["bg_tougaard_extend"].value = self.pre[1][1][9]
-                pars["bg_tougaard_extend"].vary = False
-            bg_mod = 0
-        if idx_bg == 3:
-            mod = StepModel(prefix="bg_arctan_", form="arctan")
-            if (
-                self.pre[1][idx_bg + 1][1] is None
-                or self.pre[1][idx_bg + 1][3] is None
-                or self.pre[1][idx_bg + 1][5] is None
-                or len(str(self.pre[1][idx_bg + 1][1])) == 0
-                or len(str(self.pre[1][idx_bg + 1][3])) == 0
-                or len(str(self.pre[1][idx_bg + 1][5])) == 0
-            ):
-                pars = mod.guess(y, x=x)
-            else:
-                pars = mod.make_params()
-                pars["bg_arctan_amplitude"].value = self.pre[1][idx_bg + 1][1]
-                if self.pre[1][idx_bg + 1][0] == 2:
-                    pars["bg_arctan_amplitude"].vary = False
-                pars["bg_arctan_center"].value = self.pre[1][idx_bg + 1][3]
-                if self.pre[1][idx_bg + 1][2] == 2:
-                    pars["bg_arctan_center"].vary = False
-                pars["bg_arctan_sigma"].value = self.pre[1][idx_bg + 1][5]
-                if self.pre[1][idx_bg + 1][4] == 2:
-                    pars["bg_arctan_sigma"].vary = False
-            bg_mod = 0
-        if idx_bg == 4:
-            mod = StepModel(prefix="bg_step_", form="erf")
-            if (
-                self.pre[1][idx_bg + 1][1] is None
-                or self.pre[1][idx_bg + 1][3] is None
-                or self.pre[1][idx_bg + 1][5] is None
-                or len(str(self.pre[1][idx_bg + 1][1])) == 0
-                or len(str(self.pre[1][idx_bg + 1][3])) == 0
-                or len(str(self.pre[1][idx_bg + 1][5])) == 0
-            ):
-                pars = mod.guess(y, x=x)
-            else:
-                pars = mod.make_params()
-                pars["bg_step_amplitude"].value = self.pre[1][idx_bg + 1][1]
-                if self.pre[1][idx_bg + 1][0] == 2:
-                    pars["bg_step_amplitude"].vary = False
-                pars["bg_step_center"].value = self.pre[1][idx_bg + 1][3]
-                if self.pre[1][idx_bg + 1][2] == 2:
-                    pars["bg_step_center"].vary = False
-                pars["bg_step_sigma"].value = self.pre[1][idx_bg + 1][5]
-                if self.pre[1][idx_bg + 1][4] == 2:
-                    pars["bg_step_sigma"].vary = False
-            bg_mod = 0
-
-        if idx_bg == 5:
-            if (x[0] > x[-1] and y[0] > y[-1]) or (x[0] < x[-1] and y[0] < y[-1]):
-                # VBM
-                def poly2vbm(x, ctr, d1, d2, d3, d4):
-                    return (
-                        d1 * (x - ctr)
-                        + d2 * (x - ctr) ** 2
-                        + d3 * (x - ctr) ** 3
-                        + d4 * (x - ctr) ** 4
-                    ) * (x >= ctr)
-
-            else:
-                # cutoff/wf
-                def poly2vbm(x, ctr, d1, d2, d3, d4):
-                    return (
-                        d1 * (x - ctr)
-                        + d2 * (x - ctr) ** 2
-                        + d3 * (x - ctr) ** 3
-                        + d4 * (x - ctr) ** 4
-                    ) * (x <= ctr)
-
-            mod = Model(poly2vbm, prefix="bg_vbm_")
-            pars = mod.make_params()
-            if (
-                self.pre[1][idx_bg + 1][1] is None
-                or self.pre[1][idx_bg + 1][3] is None
-                or self.pre[1][idx_bg + 1][5] is None
-                or self.pre[1][idx_bg + 1][7] is None
-                or self.pre[1][idx_bg + 1][9] is None
-                or len(str(self.pre[1][idx_bg + 1][1])) == 0
-                or len(str(self.pre[1][idx_bg + 1][3])) == 0
-                or len(str(self.pre[1][idx_bg + 1][5])) == 0
-                or len(str(self.pre[1][idx_bg + 1][7])) == 0
-                or len(str(self.pre[1][idx_bg + 1][9])) == 0
-            ):
-                pars["bg_vbm_ctr"].value = (x[0] + x[-1]) / 2
-                pars["bg_vbm_d1"].value = 0
-                pars["bg_vbm_d2"].value = 0
-                pars["bg_vbm_d3"].value = 0
-                pars["bg_vbm_d4"].value = 0
-            else:
-                pars["bg_vbm_ctr"].value = self.pre[1][idx_bg + 1][1]
-                if self.pre[1][idx_bg + 1][0] == 2:
-                    pars["bg_vbm_ctr"].vary = False
-                pars["bg_vbm_d1"].value = self.pre[1][idx_bg + 1][3]
-                if self.pre[1][idx_bg + 1][2] == 2:
-                    pars["bg_vbm_d1"].vary = False
-                pars["bg_vbm_d2"].value = self.pre[1][idx_bg + 1][5]
-                if self.pre[1][idx_bg + 1][5] == 2:
-                    pars["bg_vbm_d2"].vary = False
-                pars["bg_vbm_d3"].value = self.pre[1][idx_bg + 1][7]
-                if self.pre[1][idx_bg + 1][6] == 2:
-                    pars["bg_vbm_d3"].vary = False
-                pars["bg_vbm_d4"].value = self.pre[1][idx_bg + 1][9]
-                if self.pre[1][idx_bg + 1][8] == 2:
-                    pars["bg_vbm_d4"].vary = False
-            bg_mod = 0
-        if idx_bg == 2:
-            mod = PolynomialModel(4, prefix="bg_poly_")
-            bg_mod = 0
-            if (
-                self.pre[1][2][1] is None
-                or self.pre[1][2][3] is None
-                or self.pre[1][2][5] is None
-                or self.pre[1][2][7] is None
-                or self.pre[1][2][9] is None
-                or len(str(self.pre[1][2][1])) == 0
-                or len(str(self.pre[1][2][3])) == 0
-                or len(str(self.pre[1][2][5])) == 0
-                or len(str(self.pre[1][2][7])) == 0
-                or len(str(self.pre[1][2][9])) == 0
-            ):
-                pars = mod.guess(y, x=x)
-            else:
-                pars = mod.make_params()
-                for index in range(5):
-                    pars["bg_poly_c" + str(index)].value = self.pre[1][2][2 * index + 1]
-                    if self.pre[1][2][2 * index] == 2:
-                        pars["bg_poly_c" + str(index)].vary = False
-                pars["bg_poly_c0"].max = np.mean(y[-5:])
-                # pars['bg_poly_c0'].min = 0
-        if idx_bg == 6:
-            mod = SlopeBG(independent_vars=["y"], prefix="bg_slope_")
-            bg_mod = 0
-            if self.pre[1][3][1] is None or len(str(self.pre[1][3][1])) == 0:
-                pars = mod.guess(y, x=x)
-            else:
-                pars = mod.make_params()
-                pars["bg_slope_k"].value = self.pre[1][3][1]
-                if self.pre[1][3][0] == 2:
-                    pars["bg_slope_k"].vary = False
-        if self.fixedBG.isChecked() and pars != None:
-            for par in pars:
-                pars[par].vary = False
-        return [mod, bg_mod, pars]
-
-    def PeakSelector(self, mod):
-        pars_all = []
-        ncomponent = self.fitp1.columnCount()
-        nrows = self.fitp1.rowCount()
-        ncomponent = int(ncomponent / 2)
-        for index_pk in range(ncomponent):
-            index = self.pre[2][0][2 * index_pk + 1]
-            strind = self.list_shape[index]
-            strind = strind.split(":", 1)[0]
-            modp = model_selector(index, strind, index_pk)
-            if mod is not None:
-                mod += modp
-            else:
-                mod = modp
-            if index_pk == 0:
-                pars = modp.make_params()
-            else:
-                pars.update(modp.make_params())
-            # fit parameters from self.pre
-            if (
-                self.pre[2][1][2 * index_pk + 1] is not None
-                and len(str(self.pre[2][1][2 * index_pk + 1])) > 0
-            ):
-                pars[strind + str(index_pk + 1) + "_center"].value = float(
-                    self.pre[2][1][2 * index_pk + 1]
-                )
-                if self.pre[2][1][2 * index_pk] == 2:
-                    pars[strind + str(index_pk + 1) + "_center"].vary = False
-            if (
-                self.pre[2][2][2 * index_pk + 1] is not None
-                and len(str(self.pre[2][2][2 * index_pk + 1])) > 0
-            ):
-                pars[strind + str(index_pk + 1) + "_amplitude"].value = float(
-                    self.pre[2][2][2 * index_pk + 1]
-                )
-                pars[strind + str(index_pk + 1) + "_amplitude"].min = 0.0
-                if self.pre[2][2][2 * index_pk] == 2:
-                    pars[strind + str(index_pk + 1) + "_amplitude"].vary = False
-            if (
-                self.pre[2][14][2 * index_pk + 1] is not None
-                and len(str(self.pre[2][14][2 * index_pk + 1])) > 0
-            ):
-                pars.add(
-                    strind + str(index_pk + 1) + "_center_diff",
-                    value=float(self.pre[2][14][2 * index_pk + 1]),
-                )
-                if self.pre[2][14][2 * index_pk] == 2:
-                    pars[strind + str(index_pk + 1) + "_center_diff"].vary = False
-            if (
-                self.pre[2][16][2 * index_pk + 1] is not None
-                and len(str(self.pre[2][16][2 * index_pk + 1])) > 0
-            ):
-                pars.add(
-                    strind + str(index_pk + 1) + "_amp_ratio",
-                    value=float(self.pre[2][16][2 * index_pk + 1]),
-                    min=0,
-                )
-                if self.pre[2][16][2 * index_pk] == 2:
-                    pars[strind + str(index_pk + 1) + "_amp_ratio"].vary = False
-            if (
-                index == 0
-                or index == 2
-                or index == 4
-                or index == 5
-                or index == 6
-                or index == 7
-                or index == 8
-                or index == 12
-            ):
-                if (
-                    self.pre[2][4][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][4][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_sigma"].value = float(
-                        self.pre[2][4][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_sigma"].min = 0
-                    if self.pre[2][4][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_sigma"].vary = False
-                if (
-                    self.pre[2][20][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][20][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_gaussian_ratio",
-                        value=float(self.pre[2][20][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][20][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_gaussian_ratio"].vary = (
-                            False
-                        )
-            if index == 10 or index == 11:
-                if (
-                    self.pre[2][4][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][4][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_gaussian_sigma"].value = float(
-                        self.pre[2][4][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_gaussian_sigma"].min = 0
-                    if self.pre[2][4][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_gaussian_sigma"].vary = (
-                            False
-                        )
-                if (
-                    self.pre[2][20][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][20][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_gaussian_ratio",
-                        value=float(self.pre[2][20][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][20][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_gaussian_ratio"].vary = (
-                            False
-                        )
-            if index == 1 or index == 3 or index == 9 or index == 10 or index == 11:
-                if (
-                    self.pre[2][3][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][3][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_sigma"].value = float(
-                        self.pre[2][3][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_sigma"].min = 0
-                    if self.pre[2][3][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_sigma"].vary = False
-                if (
-                    self.pre[2][18][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][18][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_lorentzian_ratio",
-                        value=float(self.pre[2][18][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][18][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_lorentzian_ratio"].vary = (
-                            False
-                        )
-            if index == 2 or index == 6:
-                if (
-                    self.pre[2][3][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][3][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_gamma"].value = float(
-                        self.pre[2][3][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_gamma"].min = 0
-                    if self.pre[2][3][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_gamma"].vary = False
-                if (
-                    self.pre[2][18][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][18][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_lorentzian_ratio",
-                        value=float(self.pre[2][18][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][18][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_lorentzian_ratio"].vary = (
-                            False
-                        )
-            if index == 4 or index == 5 or index == 9 or index == 10 or index == 11:
-                if (
-                    self.pre[2][5][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][5][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_gamma"].value = float(
-                        self.pre[2][5][2 * index_pk + 1]
-                    )
-                    if self.binding_ener:
-                        pars[strind + str(index_pk + 1) + "_gamma"].max = 0
-                        pars[strind + str(index_pk + 1) + "_gamma"].min = -1
-                    else:
-                        pars[strind + str(index_pk + 1) + "_gamma"].min = 0
-                        pars[strind + str(index_pk + 1) + "_gamma"].max = 1
-                    pars[strind + str(index_pk + 1) + "_gamma"].max = 1
-                    if self.pre[2][5][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_gamma"].vary = False
-                if (
-                    self.pre[2][22][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][22][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_gamma_ratio",
-                        value=float(self.pre[2][22][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][22][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_gamma_ratio"].vary = False
-            if index == 3:
-                if (
-                    self.pre[2][6][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][6][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_fraction"].value = float(
-                        self.pre[2][6][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_fraction"].min = 0
-                    pars[strind + str(index_pk + 1) + "_fraction"].max = 1
-                    if self.pre[2][6][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_fraction"].vary = False
-            if index == 6:
-                if (
-                    self.pre[2][7][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][7][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_skew"].value = float(
-                        self.pre[2][7][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_skew"].min = -1
-                    pars[strind + str(index_pk + 1) + "_skew"].max = 1
-                    if self.pre[2][7][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_skew"].vary = False
-            if index == 7:
-                if (
-                    self.pre[2][8][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][8][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_q"].value = float(
-                        self.pre[2][8][2 * index_pk + 1]
-                    )
-                    if self.pre[2][8][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_q"].vary = False
-            if index == 12:
-                if (
-                    self.pre[2][9][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][9][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_kt"].value = float(
-                        self.pre[2][9][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_kt"].min = 0
-                    pars[strind + str(index_pk + 1) + "_kt"].max = 1
-                    if self.pre[2][9][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_kt"].vary = False
-
-            if index == 10:
-                if (
-                    self.pre[2][10][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][10][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_soc"].value = float(
-                        self.pre[2][10][2 * index_pk + 1]
-                    )
-                    if self.pre[2][10][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_soc"].vary = False
-                if (
-                    self.pre[2][24][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][24][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_soc_ratio",
-                        value=float(self.pre[2][24][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][24][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_soc_ratio"].vary = False
-                if (
-                    self.pre[2][11][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][11][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_height_ratio"].value = float(
-                        self.pre[2][11][2 * index_pk + 1]
-                    )
-                    pars[strind + str(index_pk + 1) + "_height_ratio"].min = 0
-                    if self.pre[2][11][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_height_ratio"].vary = False
-                if (
-                    self.pre[2][26][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][26][2 * index_pk + 1])) > 0
-                ):
-                    pars.add(
-                        strind + str(index_pk + 1) + "_rel_height_ratio",
-                        value=float(self.pre[2][26][2 * index_pk + 1]),
-                        min=0,
-                    )
-                    if self.pre[2][26][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_rel_height_ratio"].vary = (
-                            False
-                        )
-                if (
-                    self.pre[2][12][2 * index_pk + 1] is not None
-                    and len(str(self.pre[2][12][2 * index_pk + 1])) > 0
-                ):
-                    pars[strind + str(index_pk + 1) + "_fct_coster_kronig"].value = (
-                        float(self.pre[2][12][2 * index_pk + 1])
-                    )
-                    pars[strind + str(index_pk + 1) + "_fct_coster_kronig"].min = 0
-                    if self.pre[2][12][2 * index_pk] == 2:
-                        pars[strind + str(index_pk + 1) + "_fct_coster_kronig"].vary = (
-                            False
-                        )
-            pars = self.ratio_setup(pars, index_pk, strind, index)
-            pars_all.append(pars)
-        return [mod, pars]
-
-    def assign_expr_safe(
-            self,
-            pars,
-            target_id: str,
-            current_id: str,
-            param_name: str,
-            expr: str,
-    ) -> None:
-        """
-        Assign an expression to a parameter if it's not self-referencing.
-        Otherwise, raise an error.
+    def result2Par(self, out_params, mode):
+        bg_result_to_pre(out_params, mode, self.idx_bg, self.pre)
+        peak_result_to_pre(out_params, mode, self.pre)
 
-        Args:
-            pars: Parameter dictionary (e.g., from lmfit).
-            target_id (str): Target peak ID.
-            current_id (str): Current peak ID.
-            param_name (str): Name of the parameter (e.g. "sigma", "gamma").
-            expr (str): Expression to assign (e.g. "C1_sigma * C2_ratio").
+    def fillTabResults(self, x, y, out):
+        precision = int(self.floating.split(".")[1].split("f")[0]) + 2
+        # height, fwhm and areas of all components at once
+        results = component_results(out, x, self.pre)
+        for index_pk, result in enumerate(results):
+            for row, name in enumerate(result_properties):
+                value = result[name]
+                if value is None:
+                    text = ""
+                elif isinstance(value, str):
+                    text = value
+                else:
+                    text = format(value, self.floating)
+                item = QtWidgets.QTableWidgetItem(str(text))
+                self.res_tab.setItem(row, index_pk, item)
+        self.meta_result_export = result_export(results, self.pre, precision)
 
-        Returns:
-            None
-        """
-        if target_id == current_id:
+    def ana(self, mode):
+        self.savePreset()
+        plottitle = self.plottitle.text()
+        x0 = self.data_set.x
+        y0 = self.data_set.y
+        if x0[-1] < x0[0]:
+            self.binding_ener = True
+        # fit range, BG and component model selection, static shirley and tougaard are calculated here
+        try:
+            setup = prepare_fit(
+                x0,
+                y0,
+                self.pre,
+                mode=mode,
+                rows_lightened=self.rows_lightened,
+                binding_ener=self.binding_ener,
+                fixed_bg=self.fixedBG.isChecked(),
+                tougaard_fft=self.btn_bg_tougaard_fft.isChecked(),
+            )
+        except ValueError as e:
             return self.raise_error(
-                window_title="Error: Self-referencing parameters.",
-                error_message=(
-                    f"Parameter '{current_id}_{param_name}' references itself.\n"
-                    f"This is invalid. Please select another peak or leave it blank."
-                ),
+                window_title="Error: Could not build fit model.",
+                error_message=str(e),
+            )
+        x0_corrected = setup.x0_corrected
+        # ax = self.figure.add_subplot(211)
+        if mode == "fit":
+            # the plot layer keeps the artists between evaluations, the previous fit is removed for a new fit
+            self.plot_layer.remove_fit()
+            self.plot_layer.set_raw(x0_corrected, y0, "o", color="b", label="raw")
+        # simulation mode
+        elif mode == "sim":
+            self.plot_layer.set_raw(x0_corrected, y0, ",", color="b", label="raw")
+        # evaluation mode
+        else:
+            self.plot_layer.set_raw(
+                x0_corrected, y0, "o", mfc="none", color="b", label="raw"
             )
-        pars[f"{current_id}_{param_name}"].expr = expr
-
-    def ratio_setup(self, pars, index_pk, strind, index):
-        if (
-            index == 2 or index == 6
-        ):  # unset default expression which sets sigma and gamma for the voigt and skewed-voigt always to the same value
-            pars[strind + str(index_pk + 1) + "_gamma"].expr = ""
-            if not self.pre[2][3][2 * index_pk] == 2:
-                pars[strind + str(index_pk + 1) + "_gamma"].vary = True
-        # amp ratio setup
-        if self.pre[2][15][2 * index_pk + 1] > 0:
-            pktar = self.pre[2][15][2 * index_pk + 1]
-            strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-            strtar = strtar_raw.split(":", 1)[0]
-
-            if (
-                    self.pre[2][16][2 * index_pk + 1] is not None and
-                    str(self.pre[2][16][2 * index_pk + 1]).strip()
-            ):
-                target_id = strtar + str(pktar)
-                current_id = strind + str(index_pk + 1)
-                expr = f"{target_id}_amplitude * {current_id}_amp_ratio"
-
-                self.assign_expr_safe(pars, target_id, current_id, "amplitude", expr)
-
-        # BE diff setup
-        if self.pre[2][13][2 * index_pk + 1] > 0:
-            pktar = self.pre[2][13][2 * index_pk + 1]
-            strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-            strtar = strtar_raw.split(":", 1)[0]
-
-            if (
-                    self.pre[2][14][2 * index_pk + 1] is not None and
-                    str(self.pre[2][14][2 * index_pk + 1]).strip()
-            ):
-                target_id = strtar + str(pktar)
-                current_id = strind + str(index_pk + 1)
-                expr = f"{target_id}_center + {current_id}_center_diff"
-
-                self.assign_expr_safe(pars, target_id, current_id, "center", expr)
-
-        # lorentzian sigma ref setup
-        if self.pre[2][17][2 * index_pk + 1] > 0:
-            pktar = self.pre[2][17][2 * index_pk + 1]
-            strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-            strtar = strtar_raw.split(":", 1)[0]
-
-            if (
-                    self.pre[2][18][2 * index_pk + 1] is not None and
-                    str(self.pre[2][18][2 * index_pk + 1]).strip()
-            ):
-                target_id = strtar + str(pktar)
-                current_id = strind + str(index_pk + 1)
-
-                # Assign sigma expression
-                if index in [1, 3, 9, 10, 11]:
-                    if strtar in ["v", "a"]:
-                        expr = f"{target_id}_gamma * {current_id}_lorentzian_ratio"
-                    else:
-                        expr = f"{target_id}_sigma * {current_id}_lorentzian_ratio"
-
-                    self.assign_expr_safe(pars, target_id, current_id, "sigma", expr)
-
-                # Assign gamma expression
-                if index in [2, 6]:
-                    if strtar not in ["v", "a"]:
-                        expr = f"{target_id}_sigma * {current_id}_lorentzian_ratio"
-                    else:
-                        expr = f"{target_id}_gamma * {current_id}_lorentzian_ratio"
-
-                    self.assign_expr_safe(pars, target_id, current_id, "gamma", expr)
-
-        # gaussian sigma ref setup
-        if self.pre[2][19][2 * index_pk + 1] > 0:
-            pktar = self.pre[2][19][2 * index_pk + 1]
-            strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-            strtar = strtar_raw.split(":", 1)[0]
-
-            if (
-                    self.pre[2][20][2 * index_pk + 1] is not None and
-                    str(self.pre[2][20][2 * index_pk + 1]).strip()
-            ):
-                target_id = strtar + str(pktar)
-                current_id = strind + str(index_pk + 1)
-
-                # For sigma assignment
-                if index in [0, 2, 4, 5, 6, 7, 8, 12]:
-                    if strtar in ["gds", "gdd"]:
-                        expr = f"{target_id}_gaussian_sigma * {current_id}_gaussian_ratio"
-                    else:
-                        expr = f"{target_id}_sigma * {current_id}_gaussian_ratio"
-
-                    self.assign_expr_safe(pars, target_id, current_id, "sigma", expr)
-
-                # For gaussian_sigma assignment
-                if index in [10, 11]:
-                    if strtar not in ["gds", "gdd"]:
-                        expr = f"{target_id}_sigma * {current_id}_gaussian_ratio"
-                    else:
-                        expr = f"{target_id}_gaussian_sigma * {current_id}_gaussian_ratio"
-
-                    self.assign_expr_safe(pars, target_id, current_id, "gaussian_sigma", expr)
-
-        # gamma ref setup
-        if self.pre[2][21][2 * index_pk + 1] > 0:
-            pktar = self.pre[2][21][2 * index_pk + 1]
-            strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-            strtar = strtar_raw.split(":", 1)[0]
-
-            if (
-                    self.pre[2][22][2 * index_pk + 1] is not None and
-                    str(self.pre[2][22][2 * index_pk + 1]).strip()
-            ):
-                current_id = strind + str(index_pk + 1)
-                target_id = strtar + str(pktar)
-
-                valid_gamma_refs = (
-                        (index in [9, 10, 11] and strtar in ["d", "gdd", "gds"]) or
-                        (index == 4 and strtar == "e") or
-                        (index == 5 and strtar == "s")
-                )
-
-                if valid_gamma_refs:
-                    expr = f"{target_id}_gamma * {current_id}_gamma_ratio"
-                    self.assign_expr_safe(pars, target_id, current_id, "gamma", expr)
-
-        # soc ref and height ratio ref setup
-        if index == 10:
-            current_id = strind + str(index_pk + 1)
-
-            # SOC reference
-            if self.pre[2][23][2 * index_pk + 1] > 0:
-                pktar = self.pre[2][23][2 * index_pk + 1]
-                strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-                strtar = strtar_raw.split(":", 1)[0]
-
-                if self.pre[2][24][2 * index_pk + 1] is not None and str(self.pre[2][24][2 * index_pk + 1]).strip():
-                    target_id = strtar + str(pktar)
-                    expr = f"{target_id}_soc * {current_id}_soc_ratio"
-                    self.assign_expr_safe(pars, target_id, current_id, "soc", expr)
-
-            # Height ratio reference
-            if self.pre[2][25][2 * index_pk + 1] > 0:
-                pktar = self.pre[2][25][2 * index_pk + 1]
-                strtar_raw = self.list_shape[self.pre[2][0][2 * pktar - 1]]
-                strtar = strtar_raw.split(":", 1)[0]
-
-                if self.pre[2][26][2 * index_pk + 1] is not None and str(self.pre[2][26][2 * index_pk + 1]).strip():
-                    target_id = strtar + str(pktar)
-                    expr = f"{target_id}_height_ratio * {current_id}_rel_height_ratio"
-                    self.assign_expr_safe(pars, target_id, current_id, "height_ratio", expr)
-
-        return pars
-
-    def peak_limits(self, pars):
-        nrows = self.fitp1_lims.rowCount()
-        ncols = self.fitp1_lims.columnCount()
-        ncols = int(ncols / 3)
-        for index_pk in range(ncols):
-            index = self.pre[2][0][2 * index_pk + 1]
-            strind = self.list_shape[index]
-            strind = strind.split(":", 1)[0]
-            for row in range(nrows):
-                if row == 0 and self.pre[3][row][3 * index_pk] == 2:
-                    if (
-                        self.pre[3][row][3 * index_pk + 1] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_center"].min = self.pre[3][
-                            row
-                        ][3 * index_pk + 1]
-                    if (
-                        self.pre[3][row][3 * index_pk + 2] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_center"].max = self.pre[3][
-                            row
-                        ][3 * index_pk + 2]
-                if row == 1 and self.pre[3][row][3 * index_pk] == 2:
-                    if (
-                        self.pre[3][row][3 * index_pk + 1] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_amplitude"].min = self.pre[
-                            3
-                        ][row][3 * index_pk + 1]
-                    if (
-                        self.pre[3][row][3 * index_pk + 2] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_amplitude"].max = self.pre[
-                            3
-                        ][row][3 * index_pk + 2]
-                if row == 12 and self.pre[3][row][3 * index_pk] == 2:
-                    if (
-                        self.pre[3][row][3 * index_pk + 1] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_center_diff"].min = (
-                            self.pre[3][row][3 * index_pk + 1]
-                        )
-                    if (
-                        self.pre[3][row][3 * index_pk + 2] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_center_diff"].max = (
-                            self.pre[3][row][3 * index_pk + 2]
-                        )
-                if row == 13 and self.pre[3][row][3 * index_pk] == 2:
-                    if (
-                        self.pre[3][row][3 * index_pk + 1] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_amp_ratio"].min = self.pre[
-                            3
-                        ][row][3 * index_pk + 1]
-                    if (
-                        self.pre[3][row][3 * index_pk + 2] is not None
-                        and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                    ):
-                        pars[strind + str(index_pk + 1) + "_amp_ratio"].max = self.pre[
-                            3
-                        ][row][3 * index_pk + 2]
-                if (
-                    index == 0
-                    or index == 2
-                    or index == 4
-                    or index == 5
-                    or index == 6
-                    or index == 7
-                    or index == 8
-                    or index == 12
-                ):
-                    if row == 3 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_sigma"].min = self.pre[
-                                3
-                            ][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_sigma"].max = self.pre[
-                                3
-                            ][row][3 * index_pk + 2]
-                    if row == 15 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gaussian_ratio"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gaussian_ratio"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                if index == 10 or index == 11:
-                    if row == 3 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gaussian_sigma"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gaussian_sigma"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                    if row == 15 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gaussian_ratio"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gaussian_ratio"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                if index == 1 or index == 3 or index == 9 or index == 10 or index == 11:
-                    if row == 2 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_sigma"].min = self.pre[
-                                3
-                            ][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_sigma"].max = self.pre[
-                                3
-                            ][row][3 * index_pk + 2]
-                    if row == 14 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_lorentzian_ratio"
-                            ].min = self.pre[3][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_lorentzian_ratio"
-                            ].max = self.pre[3][row][3 * index_pk + 2]
-                if index == 2 or index == 6:
-                    if row == 2 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gamma"].min = self.pre[
-                                3
-                            ][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gamma"].max = self.pre[
-                                3
-                            ][row][3 * index_pk + 2]
-                    if row == 14 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_lorentzian_ratio"
-                            ].min = self.pre[3][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_lorentzian_ratio"
-                            ].max = self.pre[3][row][3 * index_pk + 2]
-                if index == 4 or index == 5 or index == 9 or index == 10 or index == 11:
-                    if row == 4 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gamma"].min = self.pre[
-                                3
-                            ][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gamma"].max = self.pre[
-                                3
-                            ][row][3 * index_pk + 2]
-                    if row == 16 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gamma_ratio"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_gamma_ratio"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                if index == 3:
-                    if row == 5 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_fraction"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_fraction"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                if index == 6:
-                    if row == 6 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_skew"].min = self.pre[
-                                3
-                            ][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_skew"].max = self.pre[
-                                3
-                            ][row][3 * index_pk + 2]
-                if index == 7:
-                    if row == 7 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_q"].min = self.pre[3][
-                                row
-                            ][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_q"].max = self.pre[3][
-                                row
-                            ][3 * index_pk + 2]
-                if index == 12:
-                    if row == 8 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_kt"].min = self.pre[3][
-                                row
-                            ][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_kt"].max = self.pre[3][
-                                row
-                            ][3 * index_pk + 2]
-
-                if index == 10:
-                    if row == 9 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_soc"].min = self.pre[3][
-                                row
-                            ][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_soc"].max = self.pre[3][
-                                row
-                            ][3 * index_pk + 2]
-                    if row == 17 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_soc_ratio"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_soc_ratio"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                    if row == 10 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_height_ratio"].min = (
-                                self.pre[3][row][3 * index_pk + 1]
-                            )
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[strind + str(index_pk + 1) + "_height_ratio"].max = (
-                                self.pre[3][row][3 * index_pk + 2]
-                            )
-                    if row == 18 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_rel_height_ratio"
-                            ].min = self.pre[3][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_rel_height_ratio"
-                            ].max = self.pre[3][row][3 * index_pk + 2]
-                    if row == 11 and self.pre[3][row][3 * index_pk] == 2:
-                        if (
-                            self.pre[3][row][3 * index_pk + 1] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 1])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_fct_coster_kronig"
-                            ].min = self.pre[3][row][3 * index_pk + 1]
-                        if (
-                            self.pre[3][row][3 * index_pk + 2] is not None
-                            and len(str(self.pre[3][row][3 * index_pk + 2])) > 0
-                        ):
-                            pars[
-                                strind + str(index_pk + 1) + "_fct_coster_kronig"
-                            ].max = self.pre[3][row][3 * index_pk + 2]
-        return pars
-
-    def bgResult2Pre(self, out_params, mode, idx_bgs):
-        for idx_bg in idx_bgs:
-            if idx_bg == 6:
-                self.pre[1][3][1] = out_params["bg_slope_k"].value
-            if idx_bg == 100:
-                if mode != "eva" and mode != "sim":
-                    self.pre[1][0][5] = out_params["bg_shirley_k"].value
-                    self.pre[1][0][7] = out_params["bg_shirley_const"].value
-            if idx_bg == 101:
-                self.pre[1][1][1] = out_params["bg_tougaard_B"].value
-                self.pre[1][1][3] = out_params["bg_tougaard_C"].value
-                self.pre[1][1][5] = out_params["bg_tougaard_C_d"].value
-                self.pre[1][1][7] = out_params["bg_tougaard_D"].value
-                self.pre[1][1][9] = out_params["bg_tougaard_extend"].value
-            if idx_bg == 3:
-                self.pre[1][idx_bg + 1][1] = out_params["bg_arctan_amplitude"].value
-                self.pre[1][idx_bg + 1][3] = out_params["bg_arctan_center"].value
-                self.pre[1][idx_bg + 1][5] = out_params["bg_arctan_sigma"].value
-
-            if idx_bg == 4:
-                self.pre[1][idx_bg + 1][1] = out_params["bg_step_amplitude"].value
-                self.pre[1][idx_bg + 1][3] = out_params["bg_step_center"].value
-                self.pre[1][idx_bg + 1][5] = out_params["bg_step_sigma"].value
-            if idx_bg == 5:
-                self.pre[1][idx_bg + 1][1] = out_params["bg_vbm_ctr"].value
-                self.pre[1][idx_bg + 1][3] = out_params["bg_vbm_d1"].value
-                self.pre[1][idx_bg + 1][5] = out_params["bg_vbm_d2"].value
-                self.pre[1][idx_bg + 1][7] = out_params["bg_vbm_d3"].value
-                self.pre[1][idx_bg + 1][9] = out_params["bg_vbm_d4"].value
-            if idx_bg == 2:
-                for index in range(5):
-                    self.pre[1][2][2 * index + 1] = out_params[
-                        "bg_poly_c" + str(index)
-                    ].value
-
-    def peakResult2Pre(self, out_params, mode):
-        ncomponent = self.fitp1.columnCount()
-        nrows = self.fitp1.rowCount()
-        ncomponent = int(ncomponent / 2)
-        for index_pk in range(ncomponent):
-            index = self.pre[2][0][2 * index_pk + 1]
-            strind = self.list_shape[index]
-            strind = strind.split(":", 1)[0]
-            # fit parameters from self.pre
-            self.pre[2][1][2 * index_pk + 1] = out_params[
-                strind + str(index_pk + 1) + "_center"
-            ].value
-            self.pre[2][2][2 * index_pk + 1] = out_params[
-                strind + str(index_pk + 1) + "_amplitude"
-            ].value
-            self.pre[2][14][2 * index_pk + 1] = out_params[
-                strind + str(index_pk + 1) + "_center_diff"
-            ].value
-            self.pre[2][16][2 * index_pk + 1] = out_params[
-                strind + str(index_pk + 1) + "_amp_ratio"
-            ].value
-            if (
-                index == 0
-                or index == 2
-                or index == 4
-                or index == 5
-                or index == 6
-                or index == 7
-                or index == 8
-                or index == 12
-            ):
-                self.pre[2][4][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_sigma"
-                ].value
-                self.pre[2][20][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_gaussian_ratio"
-                ].value
-            if index == 10 or index == 11:
-                self.pre[2][4][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_gaussian_sigma"
-                ].value
-                self.pre[2][20][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_gaussian_ratio"
-                ].value
-            if index == 1 or index == 3 or index == 9 or index == 10 or index == 11:
-                self.pre[2][3][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_sigma"
-                ].value
-                self.pre[2][18][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_lorentzian_ratio"
-                ].value
-            if index == 2 or index == 6:
-                self.pre[2][3][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_gamma"
-                ].value
-                self.pre[2][18][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_lorentzian_ratio"
-                ].value
-            if index == 4 or index == 5 or index == 9 or index == 10 or index == 11:
-                self.pre[2][5][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_gamma"
-                ].value
-                self.pre[2][22][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_gamma_ratio"
-                ].value
-            if index == 3:
-                self.pre[2][6][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_fraction"
-                ].value
-            if index == 6:
-                self.pre[2][7][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_skew"
-                ].value
-            if index == 7:
-                self.pre[2][8][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_q"
-                ].value
-            if index == 12:
-                self.pre[2][9][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_kt"
-                ].value
-
-            if index == 10:
-                self.pre[2][10][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_soc"
-                ].value
-                self.pre[2][24][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_soc_ratio"
-                ].value
-                self.pre[2][11][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_height_ratio"
-                ].value
-                self.pre[2][26][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_rel_height_ratio"
-                ].value
-                self.pre[2][12][2 * index_pk + 1] = out_params[
-                    strind + str(index_pk + 1) + "_fct_coster_kronig"
-                ].value
-
-    def result2Par(self, out_params, mode):
-        self.bgResult2Pre(out_params, mode, self.idx_bg)
-        self.peakResult2Pre(out_params, mode)
-
-    def approx_fwhm(self, x, peak):
-        peak_norm = peak / np.max(peak)
-        indices = np.where(peak_norm >= 0.5)[0]
-        i1 = indices[0]
-        if i1 > 0:
-            x1 = x[i1 - 1] + (0.5 - peak_norm[i1 - 1]) * (x[i1] - x[i1 - 1]) / (
-                peak_norm[i1] - peak_norm[i1 - 1]
-            )
-        else:
-            x1 = x[i1]
-
-        i2 = indices[-1]
-        if i2 < len(peak_norm) - 1:
-            x2 = x[i2] + (0.5 - peak_norm[i2]) * (x[i2 + 1] - x[i2]) / (
-                peak_norm[i2 + 1] - peak_norm[i2]
-            )
-        else:
-            x2 = x[i2]
-        return abs(x2 - x1)
-
-    def fillTabResults(self, x, y, out):
-        self.meta_result_export = []
-        precision = int(self.floating.split(".")[1].split("f")[0]) + 2
-        y_components = [0 for idx in range(len(y))]
-        x_interpolate = np.linspace(x[0], x[-1], 10 * len(x))
-        nrows = len(self.pre[2])
-        ncols = int(len(self.pre[2][0]) / 2)
-        for index_pk in range(int(len(self.pre[2][0]) / 2)):
-            index = self.pre[2][0][2 * index_pk + 1]
-            strind = self.list_shape[index]
-            strind = strind.split(":", 1)[0]
-            y_components += out.eval_components()[strind + str(index_pk + 1) + "_"]
-        if self.binding_ener:
-            area_components = integrate.simpson(y_components, x=x[::-1])
-        else:
-            area_components = integrate.simpson(y_components, x=x)
-        for index_pk in range(int(len(self.pre[2][0]) / 2)):
-            index = self.pre[2][0][2 * index_pk + 1]
-            strind = self.list_shape[index]
-            strind = strind.split(":", 1)[0]
-            temp_result_export = {
-                strind + str(index_pk + 1) + "_gaussian_fwhm": None,
-                strind + str(index_pk + 1) + "_lorentzian_fwhm_p1": None,
-                strind + str(index_pk + 1) + "_lorentzian_fwhm_p2": None,
-                strind + str(index_pk + 1) + "_fwhm_p1": None,
-                strind + str(index_pk + 1) + "_fwhm_p2": None,
-                strind + str(index_pk + 1) + "_height_p1": None,
-                strind + str(index_pk + 1) + "_height_p2": None,
-                strind + str(index_pk + 1) + "_approx_area_p1": None,
-                strind + str(index_pk + 1) + "_approx_area_p2": None,
-                strind + str(index_pk + 1) + "_area_total": None,
-            }
-            if index == 0:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_fwhm"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(0, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_gaussian_fwhm"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_fwhm"].value,
-                        precision,
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem("")
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = None
-                self.res_tab.setItem(1, index_pk, item)
-            if index == 1:
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(0, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_gaussian_fwhm"] = None
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            2 * out.params[strind + str(index_pk + 1) + "_fwhm"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(1, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = np.round(
-                    out.params[strind + str(index_pk + 1) + "_fwhm"].value, precision
-                )
-            if index == 0 or index == 1 or index == 2 or index == 3:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_fwhm"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(3, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = np.round(
-                    out.params[strind + str(index_pk + 1) + "_fwhm"].value, precision
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_height"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(5, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p1"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_height"].value,
-                        precision,
-                    )
-                )
-            if index == 0 or index == 1 or index == 2 or index == 3 or index == 4:
-                y_area = out.eval_components(x=x_interpolate)[
-                    strind + str(index_pk + 1) + "_"
-                ]
-                if self.binding_ener:
-                    area = abs(integrate.simpson(y_area, x=x_interpolate[::-1]))
-                else:
-                    area = abs(integrate.simpson(y_area, x=x_interpolate))
-                item = QtWidgets.QTableWidgetItem(
-                    str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                )
-                self.res_tab.setItem(7, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_approx_area_p1"] = (
-                    str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                )
-                self.res_tab.setItem(9, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_area_total"] = str(
-                    format(area, ".1f") + r" ({}%)".format(format(100, ".2f"))
-                )
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(2, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p2"
-                ] = None
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(4, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_fwhm_p2"] = None
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(6, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p2"] = None
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(8, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_approx_area_p2"] = (
-                    None
-                )
-            if (
-                index == 4
-                or index == 5
-                or index == 6
-                or index == 7
-                or index == 8
-                or index == 9
-                or index == 12
-            ):
-                rows = self.res_tab.rowCount()
-                for row in range(rows):
-                    if row != 7:
-                        item = QtWidgets.QTableWidgetItem("")
-                        self.res_tab.setItem(row, index_pk, item)
-                    # included area
-                    y_area = out.eval_components(x=x_interpolate)[
-                        strind + str(index_pk + 1) + "_"
-                    ]
-                    if self.binding_ener:
-                        area = abs(integrate.simpson(y_area, x=x_interpolate[::-1]))
-                    else:
-                        area = abs(integrate.simpson(y_area, x=x_interpolate))
-                    item = QtWidgets.QTableWidgetItem(
-                        str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                    )
-                    self.res_tab.setItem(7, index_pk, item)
-                    temp_result_export[
-                        strind + str(index_pk + 1) + "_approx_area_p1"
-                    ] = str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                    item = QtWidgets.QTableWidgetItem(
-                        str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                    )
-                    self.res_tab.setItem(9, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_area_total"] = (
-                        str(format(area, ".1f") + r" ({}%)".format(format(100, ".2f")))
-                    )
-            if index == 2:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(0, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_gaussian_fwhm"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                        precision,
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            2 * out.params[strind + str(index_pk + 1) + "_gamma"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(1, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = np.round(
-                    2 * out.params[strind + str(index_pk + 1) + "_gamma"].value,
-                    precision,
-                )
-            if index == 3:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_sigma"].value
-                            / np.sqrt(2 * np.log(2)),
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(0, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_gaussian_fwhm"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_sigma"].value
-                        / np.sqrt(2 * np.log(2)),
-                        precision,
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            2 * out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(1, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = np.round(
-                    2 * out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                    precision,
-                )
-            if index == 9:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            2 * out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(1, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = np.round(
-                    2 * out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                    precision,
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(5, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p1"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                        precision,
-                    )
-                )
-                y_area = out.eval_components(x=x_interpolate)[
-                    strind + str(index_pk + 1) + "_"
-                ]
-                fwhm_temp = self.approx_fwhm(x_interpolate, y_area)
-                item = QtWidgets.QTableWidgetItem(str(format(fwhm_temp, self.floating)))
-                self.res_tab.setItem(3, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = np.round(
-                    fwhm_temp, precision
-                )
-            if index == 11:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            2
-                            * out.params[
-                                strind + str(index_pk + 1) + "_lorentzian_fwhm"
-                            ].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(1, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = np.round(
-                    2
-                    * out.params[strind + str(index_pk + 1) + "_lorentzian_fwhm"].value,
-                    precision,
-                )
-                y_area = out.eval_components(x=x_interpolate)[
-                    strind + str(index_pk + 1) + "_"
-                ]
-                if np.max(y_area) != 0:
-                    fwhm_temp = self.approx_fwhm(x_interpolate, y_area)
-                    item = QtWidgets.QTableWidgetItem(
-                        str(format(fwhm_temp, self.floating))
-                    )
-                    self.res_tab.setItem(3, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = (
-                        np.round(fwhm_temp, precision)
-                    )
-                else:
-                    print(
-                        "WARNING: Invalid value encountered in true division: Probably one of the amplitudes is "
-                        "set to 0."
-                    )
-                    item = QtWidgets.QTableWidgetItem("Error in calculation")
-                    self.res_tab.setItem(3, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = (
-                        "Error in calculation"
-                    )
-                # included area
-                if self.binding_ener:
-                    area = abs(integrate.simpson(y_area, x=x[::-1]))
-                else:
-                    area = abs(integrate.simpson(y_area, x=x))
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(area, ".1f")
-                        + r" ({}%)".format(format(area / area_components * 100, ".2f"))
-                    )
-                )
-                self.res_tab.setItem(7, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_approx_area_p1"] = (
-                    str(
-                        format(area, ".1f")
-                        + r" ({}%)".format(format(area / area_components * 100, ".2f"))
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(area, ".1f")
-                        + r" ({}%)".format(format(area / area_components * 100, ".2f"))
-                    )
-                )
-                self.res_tab.setItem(9, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_area_total"] = str(
-                    format(area, ".1f")
-                    + r" ({}%)".format(format(area / area_components * 100, ".2f"))
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(5, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p1"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                        precision,
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(2, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p2"
-                ] = None
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(4, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_fwhm_p2"] = None
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(6, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p2"] = None
-                item = QtWidgets.QTableWidgetItem("")
-                self.res_tab.setItem(8, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_approx_area_p2"] = (
-                    None
-                )
-            if index == 10:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[
-                                strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                            ].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(1, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                ] = np.round(
-                    out.params[
-                        strind + str(index_pk + 1) + "_lorentzian_fwhm_p1"
-                    ].value,
-                    precision,
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[
-                                strind + str(index_pk + 1) + "_lorentzian_fwhm_p2"
-                            ].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(2, index_pk, item)
-                temp_result_export[
-                    strind + str(index_pk + 1) + "_lorentzian_fwhm_p2"
-                ] = np.round(
-                    out.params[
-                        strind + str(index_pk + 1) + "_lorentzian_fwhm_p2"
-                    ].value,
-                    precision,
-                )
-                # included fwhm
-                x_interpol = np.linspace(x[0], x[-1], 10 * len(x))
-                y_area_p1 = singlett(
-                    x_interpol,
-                    amplitude=out.params[
-                        strind + str(index_pk + 1) + "_amplitude"
-                    ].value,
-                    sigma=out.params[strind + str(index_pk + 1) + "_sigma"].value,
-                    gamma=out.params[strind + str(index_pk + 1) + "_gamma"].value,
-                    gaussian_sigma=out.params[
-                        strind + str(index_pk + 1) + "_gaussian_sigma"
-                    ].value,
-                    center=out.params[strind + str(index_pk + 1) + "_center"].value,
-                )
-                y_area_p2 = singlett(
-                    x_interpol,
-                    amplitude=out.params[
-                        strind + str(index_pk + 1) + "_amplitude"
-                    ].value
-                    * out.params[strind + str(index_pk + 1) + "_height_ratio"].value,
-                    sigma=out.params[strind + str(index_pk + 1) + "_sigma"].value
-                    * out.params[
-                        strind + str(index_pk + 1) + "_fct_coster_kronig"
-                    ].value,
-                    gamma=out.params[strind + str(index_pk + 1) + "_gamma"].value,
-                    gaussian_sigma=out.params[
-                        strind + str(index_pk + 1) + "_gaussian_sigma"
-                    ].value,
-                    center=out.params[strind + str(index_pk + 1) + "_center"].value
-                    - out.params[strind + str(index_pk + 1) + "_soc"].value,
-                )
-                if np.max(y_area_p1) != 0 and np.max(y_area_p2) != 0:
-                    fwhm_temp_p1 = self.approx_fwhm(x_interpol, y_area_p1)
-                    item = QtWidgets.QTableWidgetItem(
-                        str(format(fwhm_temp_p1, self.floating))
-                    )
-                    self.res_tab.setItem(3, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = (
-                        np.round(fwhm_temp_p1, precision)
-                    )
-                    fwhm_temp_p2 = self.approx_fwhm(x_interpol, y_area_p2)
-                    item = QtWidgets.QTableWidgetItem(
-                        str(format(fwhm_temp_p2, self.floating))
-                    )
-                    self.res_tab.setItem(4, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_fwhm_p2"] = (
-                        np.round(fwhm_temp_p2, precision)
-                    )
-                else:
-                    print(
-                        "WARNING: Invalid value encountered in true division: Probably one of the amplitudes is "
-                        "set to 0."
-                    )
-                    item = QtWidgets.QTableWidgetItem("Error in calculation")
-                    self.res_tab.setItem(3, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = (
-                        "Error in calculation"
-                    )
-                    self.res_tab.setItem(4, index_pk, item)
-                    temp_result_export[strind + str(index_pk + 1) + "_fwhm_p2"] = (
-                        "Error in calculation"
-                    )
-                    # included area
-
-                if self.binding_ener:
-                    area_p1 = abs(integrate.simpson(y_area_p1, x=x_interpol[::-1]))
-                    area_p2 = abs(integrate.simpson(y_area_p2, x=x_interpol[::-1]))
-                else:
-                    area_p1 = integrate.simpson(y_area_p1, x=x_interpol)
-                    area_p2 = integrate.simpson(y_area_p2, x=x_interpol)
-                area_ges = area_p1 + area_p2
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(area_p1, ".1f")
-                        + r" ({}%)".format(format(area_p1 / area_ges * 100, ".2f"))
-                    )
-                )
-                self.res_tab.setItem(7, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_approx_area_p1"] = (
-                    str(
-                        format(area_p1, ".1f")
-                        + r" ({}%)".format(format(area_p1 / area_ges * 100, ".2f"))
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(area_p2, ".1f")
-                        + r" ({}%)".format(format(area_p2 / area_ges * 100, ".2f"))
-                    )
-                )
-                self.res_tab.setItem(8, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_approx_area_p2"] = (
-                    str(
-                        format(area_p2, ".1f")
-                        + r" ({}%)".format(format(area_p2 / area_ges * 100, ".2f"))
-                    )
-                )
-                y_area = out.eval_components(x=x_interpolate)[
-                    strind + str(index_pk + 1) + "_"
-                ]
-                area = abs(integrate.simpson(y_area, x=x_interpolate))
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(area, ".1f")
-                        + r" ({}%)".format(format(area / area_components * 100, ".2f"))
-                    )
-                )
-                self.res_tab.setItem(9, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_area_total"] = str(
-                    format(area, ".1f")
-                    + r" ({}%)".format(format(area / area_components * 100, ".2f"))
-                )
-                h_p1_expr = "{pre:s}amplitude"
-                h_p2_expr = "{pre:s}amplitude*{pre:s}height_ratio"
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(5, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p1"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                        precision,
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_amplitude"].value
-                            * out.params[
-                                strind + str(index_pk + 1) + "_height_ratio"
-                            ].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(6, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p2"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_amplitude"].value
-                        * out.params[
-                            strind + str(index_pk + 1) + "_height_ratio"
-                        ].value,
-                        precision,
-                    )
-                )
-            if index == 10 or index == 11:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[
-                                strind + str(index_pk + 1) + "_gaussian_sigma"
-                            ].value
-                            * 2
-                            * np.sqrt(2 * np.log(2)),
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(0, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_gaussian_fwhm"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_gaussian_sigma"].value
-                        * 2
-                        * np.sqrt(2 * np.log(2)),
-                        precision,
-                    )
-                )
-            if index == 12:
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(5, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_height_p1"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_amplitude"].value,
-                        precision,
-                    )
-                )
-                item = QtWidgets.QTableWidgetItem(
-                    str(
-                        format(
-                            out.params[strind + str(index_pk + 1) + "_sigma"].value
-                            * 2
-                            * np.sqrt(2 * np.log(2)),
-                            self.floating,
-                        )
-                    )
-                )
-                self.res_tab.setItem(0, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_gaussian_fwhm"] = (
-                    np.round(
-                        out.params[strind + str(index_pk + 1) + "_sigma"].value
-                        * 2
-                        * np.sqrt(2 * np.log(2)),
-                        precision,
-                    )
-                )
-                self.res_tab.setItem(3, index_pk, item)
-                temp_result_export[strind + str(index_pk + 1) + "_fwhm_p1"] = np.round(
-                    out.params[strind + str(index_pk + 1) + "_sigma"].value
-                    * 2
-                    * np.sqrt(2 * np.log(2)),
-                    precision,
-                )
-            self.meta_result_export.append(temp_result_export)
-
-    def BGModCreator(self, x, y, mode):
-        temp_res = self.bgSelector(x, y, mode=mode, idx_bg=self.idx_bg[0])
-        mod = temp_res[0]
-        bg_mod = temp_res[1]
-        pars = temp_res[2]
-
-        for idx_bg in self.idx_bg[1:]:
-            temp_res = self.bgSelector(x, y, mode, idx_bg)
-            if mod is None and temp_res[0] is None:
-                mod = None
-            elif mod is None and temp_res[0] is not None:
-                mod = temp_res[0]
-            elif mod is not None and temp_res[0] is None:
-                mod = mod
-            elif mod is not None and temp_res[0] is not None:
-                mod += temp_res[0]
-            bg_mod += temp_res[1]
-            if pars is not None:
-                pars.update(temp_res[2])
-            else:
-                pars = temp_res[2]
-        return mod, bg_mod, pars
-
-    def ana(self, mode):
-        self.savePreset()
-        plottitle = self.plottitle.text()
-        self.ax.cla()
-        self.ar.cla()
-        # ax = self.figure.add_subplot(211)
-        if mode == "fit":
-            x0 = self.df.iloc[:, 0].to_numpy()
-            if x0[-1] < x0[0]:
-                self.binding_ener = True
-            x0_corrected = np.copy(x0)
-            if self.correct_energy is not None:
-                x0_corrected -= self.correct_energy
-            y0 = self.df.iloc[:, 1].to_numpy()
-            self.ax.plot(x0_corrected, y0, "o", color="b", label="raw")
-        else:
-            # simulation mode
-            if mode == "sim":
-                x0 = self.df[:, 0]
-                if x0[-1] < x0[0]:
-                    self.binding_ener = True
-                x0_corrected = np.copy(x0)
-                if self.correct_energy is not None:
-                    x0_corrected -= self.correct_energy
-                y0 = self.df[:, 1]
-                self.ax.plot(x0_corrected, y0, ",", color="b", label="raw")
-            # evaluation mode
-            else:
-                x0 = self.df.iloc[:, 0].to_numpy()
-                if x0[-1] < x0[0]:
-                    self.binding_ener = True
-                x0_corrected = np.copy(x0)
-                if self.correct_energy is not None:
-                    x0_corrected -= self.correct_energy
-                y0 = self.df.iloc[:, 1].to_numpy()
-                self.ax.plot(x0_corrected, y0, "o", mfc="none", color="b", label="raw")
 
         if x0_corrected[0] > x0_corrected[-1]:
             self.ax.set_xlabel("Binding energy (eV)", fontsize=11)
@@ -4911,57 +3079,11 @@ class PrettyWidget(QtWidgets.QMainWindow):
         else:
             self.ar.set_title(r"{}".format(plottitle), fontsize=11)
 
-        # if no range is specified, fill it from data
-        if self.pre[0][1] is None or len(str(self.pre[0][1])) == 0:
-            self.pre[0][1] = x0_corrected[0]
-        if self.pre[0][2] is None or len(str(self.pre[0][2])) == 0:
-            self.pre[0][2] = x0_corrected[-1]
-        # check if limits are out of of data range, If incorrect, back to default
-        x1 = self.pre[0][1]
-        if (
-            (x1 > x0_corrected[0] or x1 < x0_corrected[-1]) and x0_corrected[0] > x0[-1]
-        ) or (
-            (x1 < x0_corrected[0] or x1 > x0_corrected[-1])
-            and x0_corrected[0] < x0_corrected[-1]
-        ):
-            x1 = x0_corrected[0]
-            self.pre[0][1] = x1
-        x2 = self.pre[0][2]
-        if (
-            (x2 < x0_corrected[-1] or x2 > x1) and x0_corrected[0] > x0_corrected[-1]
-        ) or ((x2 > x0_corrected[-1] or x2 < x1) and x0_corrected[0] < x0[-1]):
-            x2 = x0_corrected[-1]
-            self.pre[0][2] = x2
-
-        [x, y] = fit_range(x0_corrected, y0, x1, x2)
-        raw_y = y.copy()
-        raw_x = x.copy()
-        if self.correct_energy is not None:
-            raw_x += self.correct_energy
-        # BG model selection and call shirley and tougaard
-        # colPosition = self.fitp1.columnCount()
-
-        temp_res = self.BGModCreator(x, y, mode=mode)
-        mod = temp_res[0]
-        self.static_bg = temp_res[1]
-        pars = temp_res[2]
+        x, y, raw_x, raw_y = setup.x, setup.y, setup.raw_x, setup.raw_y
+        self.static_bg = setup.static_bg
+        pars = setup.pars
+        zeros_in_data = setup.zeros_in_data
         self.setPreset(self.pre[0], self.pre[1], self.pre[2], self.pre[3])
-        # component model selection and construction
-        y = raw_y - self.static_bg
-        temp_res = self.PeakSelector(mod)
-        if pars != None:
-            pars.update(temp_res[1])
-        else:
-            pars = temp_res[1]
-
-        mod = temp_res[0]
-
-        if mode == "eva" or mode == "sim":
-            for par in pars:
-                pars[par].vary = False
-        else:
-            temp = self.peak_limits(pars)
-            pars.update(temp)  # update pars before using expr, to prevent missing pars
 
         # evaluate model and optimize parameters for fitting in lmfit
         if mode == "eva":
@@ -4973,27 +3095,13 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.statusBar().showMessage(
             strmode + " running.",
         )
-        init = mod.eval(pars, x=x, y=y)
-        zeros_in_data = False
-        if np.any(raw_y == 0):
-            zeros_in_data = True
+        if zeros_in_data:
             print(
                 "There were 0's in your data. The residuals are therefore not weighted by sqrt(data)!"
             )
         if mode == "eva" or mode == "sim":
             try:
-                if zeros_in_data:
-                    out = mod.fit(
-                        y, pars, x=x, weights=1 / (np.sqrt(self.rows_lightened)), y=y
-                    )
-                else:
-                    out = mod.fit(
-                        y,
-                        pars,
-                        x=x,
-                        weights=1 / (np.sqrt(raw_y) * np.sqrt(self.rows_lightened)),
-                        y=y,
-                    )
+                out, _ = run_fit(setup, mode=mode)
             except Exception as e:
                 return self.raise_error(
                     window_title="Error: Could not evaluate fit model.",
@@ -5017,58 +3125,58 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 pars, pre = try_me_out
                 self.pre = pre
                 self.setPreset(pre[0], pre[1], pre[2], pre[3])
-            if zeros_in_data:
-                self.fit_thread = FitThread(
-                    model=mod,
-                    data=y,
-                    params=pars,
-                    x=x,
-                    weights=1 / (np.sqrt(self.rows_lightened)),
-                    y=raw_y,
-                )
-                self.fit_thread.fitting_finished.connect(
-                    lambda out: self.fitting_finished(
-                        out,
-                        x=x,
-                        y=y,
-                        strmode=strmode,
-                        mode=mode,
-                        zeros_in_data=zeros_in_data,
-                        raw_x=raw_x,
-                        raw_y=raw_y,
-                        pars=pars,
-                    )
-                )
-                self.fit_thread.start()
-                # out = mod.fit(y, pars, x=x, weights=1 / (np.sqrt(self.rows_lightened)), y=raw_y)
-            else:
-                self.fit_thread = FitThread(
-                    model=mod,
-                    data=y,
-                    params=pars,
+            self.fit_thread = FitThread(
+                setup=setup,
+                params=pars,
+                n_starts=self.fit_starts.value(),
+                pre=copy.deepcopy(self.pre),
+                fixed_bg=self.fixedBG.isChecked(),
+                tougaard_fft=self.btn_bg_tougaard_fft.isChecked(),
+                jacobian=self.fit_jacobian.isChecked(),
+            )
+            self.fit_thread.fitting_finished.connect(
+                lambda out: self.fitting_finished(
+                    out,
                     x=x,
-                    weights=1 / (np.sqrt(raw_y) * np.sqrt(self.rows_lightened)),
-                    y=raw_y,
-                )
-                self.fit_thread.fitting_finished.connect(
-                    lambda out: self.fitting_finished(
-                        out,
-                        x=x,
-                        y=y,
-                        strmode=strmode,
-                        mode=mode,
-                        zeros_in_data=zeros_in_data,
-                        raw_x=raw_x,
-                        raw_y=raw_y,
-                        pars=pars,
-                    )
+                    y=y,
+                    strmode=strmode,
+                    mode=mode,
+                    zeros_in_data=zeros_in_data,
+                    raw_x=raw_x,
+                    raw_y=raw_y,
+                    pars=pars,
                 )
-                self.fit_thread.start()
-                # out = mod.fit(y, pars, x=x, weights=1 / (np.sqrt(raw_y) * np.sqrt(self.rows_lightened)), y=raw_y)
+            )
+            self.fit_thread.profile_updated.connect(self.fit_profile_updated)
+            # the raw data of the fit range is drawn now, the progress of the fit is blitted on top
+            self.ax.set_xlim(left=self.xmin, right=self.xmax)
+            autoscale_y(self.ax)
+            self.fit_progress = FitProgressPlot(
+                self.canvas, self.ax, self.ar, x, self.static_bg
+            )
+            self.fit_progress.start()
+            self.fit_thread.progress_updated.connect(self.fit_progress_updated)
+            self.fit_thread.start()
             self.fit_thread.thread_started.connect(self.fit_thread_started)
             self.fit_thread.error_occurred.connect(self.handle_thread_exception)
 
+    def fit_progress_updated(self, iteration, chisqr, best_fit, residual):
+        if self.fit_progress is None:
+            return
+        self.fit_progress.update(best_fit, residual)
+        self.statusBar().showMessage(
+            "Fitting running: iteration {}, chi-sqr: {}".format(
+                iteration, format(chisqr, self.floating)
+            )
+        )
+
+    def stop_fit_progress(self):
+        if self.fit_progress is not None:
+            self.fit_progress.stop()
+            self.fit_progress = None
+
     def handle_thread_exception(self, error_message):
+        self.stop_fit_progress()
         self.raise_error("Error in FitThread", error_message)
         self.statusBar().showMessage("Fitting failed! NaN in data/fit-model occured!")
         self.enable_buttons_after_fit_thread()
@@ -5093,6 +3201,11 @@ class PrettyWidget(QtWidgets.QMainWindow):
             "QPushButton:disabled { background-color: rgba(200, 200, 200, 128); }"
         )
 
+        self.fit_buttons["btn_fit_series"].setEnabled(False)
+        self.fit_buttons["btn_fit_series"].setStyleSheet(
+            "QPushButton:disabled { background-color: rgba(200, 200, 200, 128); }"
+        )
+
     def enable_buttons_after_fit_thread(self):
         """Enable buttons after the fit thread finishes."""
         self.fit_buttons["btn_fit"].setEnabled(True)
@@ -5107,6 +3220,9 @@ class PrettyWidget(QtWidgets.QMainWindow):
         self.fit_buttons["btn_undoFit"].setEnabled(True)
         self.fit_buttons["btn_undoFit"].setStyleSheet("")
 
+        self.fit_buttons["btn_fit_series"].setEnabled(True)
+        self.fit_buttons["btn_fit_series"].setStyleSheet("")
+
     def get_attr(self, obj, attr):
         """Format an attribute of an object for printing."""
         val = getattr(obj, attr, None)
@@ -5121,8 +3237,9 @@ class PrettyWidget(QtWidgets.QMainWindow):
     def fitting_finished(
         self, out, x, y, strmode, mode, zeros_in_data, pars, raw_x, raw_y
     ):
+        self.stop_fit_progress()
         self.enable_buttons_after_fit_thread()
-        comps = out.eval_components(x=x)
+        comps = component_curves(out, x).comps
         # fit results to be checked
         for key in out.params:
             print(key, "=", out.params[key].value)
@@ -5168,6 +3285,15 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 + ", Last run finished: "
                 + QTime.currentTime().toString()
             )
+        if mode == "fit" and self.fit_thread.multi_start is not None:
+            multi_start = self.fit_thread.multi_start
+            print(multi_start.summary())
+            results += ", best of {} starts".format(len(multi_start.valid))
+        shirley = shirley_integral(out.model)
+        if shirley is not None:
+            print(shirley.summary())
+        if mode == "fit" and self.fit_thread.profile is not None:
+            print(self.fit_thread.profile.summary())
         self.statusBar().showMessage(results)
 
         # component results into table
@@ -5236,86 +3362,71 @@ class PrettyWidget(QtWidgets.QMainWindow):
                 sum_background += comps[key]
         if mode == "sim":
             self.ar.set_title(r"Simulation mode", fontsize=11)
-        if mode == "eva":
-            plottitle = self.plottitle.text()
-            if len(plottitle) == 0:
-                plottitle = self.comboBox_file.currentText().split("/")[-1]
-            if plottitle != "":
-                self.ar.set_title(r"{}".format(plottitle), fontsize=11)
-            len_idx_pk = int(self.fitp1.columnCount() / 2)
-            for index_pk in range(len_idx_pk):
-                # print(index_pk, color)
-                strind = self.fitp1.cellWidget(0, 2 * index_pk + 1).currentText()
-                strind = strind.split(":", 1)[0]
-                self.ax.fill_between(
-                    x,
-                    comps[strind + str(index_pk + 1) + "_"]
-                    + sum_background
-                    + self.static_bg,
+        # ax.plot(x, init+bg_mod, 'k:', label='initial')
+        plottitle = self.plottitle.text()
+        if len(plottitle) == 0:
+            plottitle = self.comboBox_file.currentText().split("/")[-1]
+        if plottitle != "":
+            self.ar.set_title(r"{}".format(plottitle), fontsize=11)
+        # the artists are kept by the plot layer and only their data is updated
+        curves = []
+        len_idx_pk = int(self.fitp1.columnCount() / 2)
+        for index_pk in range(len_idx_pk):
+            strind = self.fitp1.cellWidget(0, 2 * index_pk + 1).currentText()
+            strind = strind.split(":", 1)[0]
+            curves.append(
+                (
+                    self.fitp1.horizontalHeaderItem(2 * index_pk + 1).text(),
                     sum_background + self.static_bg,
-                    label=self.fitp1.horizontalHeaderItem(2 * index_pk + 1).text(),
-                )
-                self.ax.plot(
-                    x,
                     comps[strind + str(index_pk + 1) + "_"]
                     + sum_background
                     + self.static_bg,
                 )
-                if index_pk == len_idx_pk - 1:
-                    self.ax.plot(x, +sum_background + self.static_bg, label="BG")
-            self.ax.set_xlim(left=self.xmin)
-            self.ar.set_xlim(left=self.xmin)
-            self.ax.set_xlim(right=self.xmax)
-            self.ar.set_xlim(right=self.xmax)
-            self.ax.plot(x, out.best_fit + self.static_bg, "r-", lw=2, label="sum")
-            self.ar.plot(x, out.residual, "g.", label="residual")
-            autoscale_y(self.ax)
-
+            )
+        self.plot_layer.set_components(x, curves)
+        if len_idx_pk > 0:
+            self.plot_layer.set_curve(
+                "bg",
+                self.ax,
+                x,
+                sum_background + self.static_bg,
+                color="C{}".format(len_idx_pk % 10),
+                label="BG",
+            )
         else:
-            # ax.plot(x, init+bg_mod, 'k:', label='initial')
-            plottitle = self.plottitle.text()
-            if len(plottitle) == 0:
-                plottitle = self.comboBox_file.currentText().split("/")[-1]
-            if plottitle != "":
-                self.ar.set_title(r"{}".format(plottitle), fontsize=11)
-            len_idx_pk = int(self.fitp1.columnCount() / 2)
-            for index_pk in range(len_idx_pk):
-                strind = self.fitp1.cellWidget(0, 2 * index_pk + 1).currentText()
-                strind = strind.split(":", 1)[0]
-                self.ax.fill_between(
-                    x,
-                    comps[strind + str(index_pk + 1) + "_"]
-                    + self.static_bg
-                    + sum_background,
-                    self.static_bg + sum_background,
-                    label=self.fitp1.horizontalHeaderItem(2 * index_pk + 1).text(),
-                )
-                self.ax.plot(
-                    x,
-                    comps[strind + str(index_pk + 1) + "_"]
-                    + self.static_bg
-                    + sum_background,
-                )
-                if index_pk == len_idx_pk - 1:
-                    self.ax.plot(x, +self.static_bg + sum_background, label="BG")
-            self.ax.set_xlim(left=self.xmin)
-            self.ar.set_xlim(left=self.xmin)
-            self.ax.set_xlim(right=self.xmax)
-            self.ar.set_xlim(right=self.xmax)
-            self.ax.plot(x, out.best_fit + self.static_bg, "r-", lw=2, label="fit")
-            self.ar.plot(
-                x, out.residual, "g.", label="residual"
-            )  # modify residual and red chi-squared [feature]
-            lines = self.ax.get_lines()
-            autoscale_y(self.ax)
-        self.ax.legend(loc=0)
-        self.ar.legend(loc=0)
-        self.canvas.draw()
+            self.plot_layer.remove_curve("bg")
+        self.ax.set_xlim(left=self.xmin)
+        self.ar.set_xlim(left=self.xmin)
+        self.ax.set_xlim(right=self.xmax)
+        self.ar.set_xlim(right=self.xmax)
+        self.plot_layer.set_curve(
+            "fit",
+            self.ax,
+            x,
+            out.best_fit + self.static_bg,
+            "r-",
+            lw=2,
+            label="sum" if mode == "eva" else "fit",
+        )
+        # modify residual and red chi-squared [feature]
+        self.plot_layer.set_curve(
+            "residual", self.ar, x, out.residual, "g.", label="residual"
+        )
+        self.plot_layer.rescale_residual(out.residual)
+        autoscale_y(self.ax)
+        self.plot_layer.legend()
+        self.plot_layer.draw()
         self.resizeAllColumns()
 
         # make fit results to be global to export
         self.export_pars = pars
         self.export_out = out
+        if mode == "fit" and self.comboBox_file.currentIndex() > 0:
+            file_path = self.display_name_to_path.get(self.comboBox_file.currentText())
+            if file_path is not None:
+                self.results_store.add(
+                    file_path, out, component_metrics(out, x, self.pre)
+                )
         # for key in out.params:
         # print(key, "=", out.params[key].value)
         # make dataFrame and concat to export
@@ -0,0 +1,169 @@
+"""Reading of spectra from csv and txt files.
+
+Shared by the GUI import and the batch fitting. The start of a file is sniffed once to find the delimiter and the
+first data line, then the table is read by pandas, with the C engine whenever the delimiter allows it.
+"""
+import csv
+import os
+import re
+
+import pandas as pd
+
+
+def read_engine(delimiter):
+    """The pandas engine for a delimiter, the C engine handles single characters and whitespace (\\s+), other
+    regular expressions need the much slower python engine."""
+    return "c" if delimiter == r"\s+" or len(delimiter) == 1 else "python"
+
+
+def split_fields(line, delimiter):
+    """Splits a line of a text file into its fields like pandas with the given delimiter."""
+    if delimiter == r"\s+":
+        return line.split()
+    if len(delimiter) == 1:
+        return next(csv.reader([line], delimiter=delimiter))
+    return re.split(delimiter, line.strip())
+
+
+def is_numeric(fields):
+    try:
+        [float(field) for field in fields]
+    except ValueError:
+        return False
+    return True
+
+
+def sniff_table(filepath, size=65536):
+    """Reads the start of a text file once and sniffs its layout.
+
+    The delimiter is the first of comma, semicolon, tab and whitespace which splits the last lines of the sample into
+    the same number of numeric fields, the data starts at the first line with these fields. Lines starting with #
+    are comments.
+
+    Args:
+        filepath (str): Path of the csv or txt file.
+        size (int, optional): Number of characters to read. Default is 64 KiB.
+
+    Returns:
+        dict: lines (the complete lines of the sample), delimiter, data_start (index of the first data line) and
+            columns (number of fields of the data lines). delimiter, data_start and columns are None if the sample
+            does not end with a numeric table.
+    """
+    with open(filepath, "r", errors="replace") as f:
+        text = f.read(size)
+    lines = text.splitlines()
+    if len(text) == size and len(lines) > 1:
+        # the last line may be cut
+        lines = lines[:-1]
+    table = {"lines": lines, "delimiter": None, "data_start": None, "columns": None}
+    content = [line for line in lines if line.strip() and not line.lstrip().startswith("#")]
+    tail = content[-20:]
+    if len(tail) == 0:
+        return table
+    for delimiter in [",", ";", "\t", r"\s+"]:
+        columns = {len(split_fields(line, delimiter)) for line in tail}
+        if len(columns) == 1 and min(columns) > 1 and all(is_numeric(split_fields(line, delimiter)) for line in tail):
+            break
+    else:
+        return table
+    columns = columns.pop()
+    for index, line in enumerate(lines):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        fields = split_fields(line, delimiter)
+        if len(fields) == columns and is_numeric(fields):
+            table.update(delimiter=delimiter, data_start=index, columns=columns)
+            break
+    return table
+
+
+def header_fields(lines, header_row, delimiter):
+    """The fields of the header row like pandas reads them with header=header_row, blank lines are not counted.
+
+    Raises:
+        ValueError: If the lines end before the header row.
+    """
+    lines = [line for line in lines if line.strip()]
+    if not 0 <= header_row < len(lines):
+        raise ValueError(f"The header row {header_row} is beyond the start of the file.")
+    return split_fields(lines[header_row], delimiter)
+
+
+def load_spectrum(filepath, config):
+    """Read a spectrum the same way the GUI imports a csv or txt file with the remembered settings.
+
+    The start of the file is sniffed first (see sniff_table). A plain table of two numeric columns is read in a single
+    pass of the C engine of pandas with the sniffed delimiter, which also keeps a first data row without a header.
+    Other files are read with the [Import] settings, the header is taken from the sniffed lines and the python engine
+    is only used for separators which are regular expressions.
+
+    Args:
+        filepath (str): Path of the csv or txt file.
+        config (configparser.ConfigParser): LG4X-V2 config with the [Import] settings.
+
+    Returns:
+        tuple: (x, y, rows_lightened)
+
+    Raises:
+        ValueError: If the file could not be read as two numeric columns.
+    """
+    fname = os.path.basename(filepath)
+    table = sniff_table(filepath)
+    separator = config.get("Import", "separator")
+    header_row = int(config.get("Import", "header_row"))
+    if table["columns"] == 2:
+        df = pd.read_csv(
+            filepath,
+            delimiter=table["delimiter"],
+            skiprows=table["data_start"],
+            header=None,
+            comment="#",
+        )
+    elif table["delimiter"] in [None, ","]:
+        if ".csv" in fname:
+            df = pd.read_csv(filepath, comment="#", usecols=[0, 1])
+        else:
+            df = pd.read_csv(filepath, comment="#")
+    else:
+        # other delimiters are only read with the settings
+        df = None
+    if df is None or len(df.columns) != 2:
+        if config.getboolean("Import", "has_header"):
+            fields = header_fields(table["lines"], header_row, separator)
+            if fields[0] == "#":
+                df = pd.read_csv(
+                    filepath,
+                    delimiter=separator,
+                    engine=read_engine(separator),
+                    names=list(range(len(fields) - 1)),
+                    skiprows=header_row + 1,
+                    comment="#",
+                )
+            else:
+                df = pd.read_csv(
+                    filepath,
+                    delimiter=separator,
+                    engine=read_engine(separator),
+                    skiprows=header_row,
+                    comment="#",
+                )
+        else:
+            df = pd.read_csv(
+                filepath,
+                delimiter=separator,
+                engine=read_engine(separator),
+                skiprows=header_row,
+                header=None,
+                comment="#",
+            )
+        df = df.iloc[:, eval(config.get("Import", "columns"))]
+    if df.isna().any().any():
+        raise ValueError(
+            f"{filepath} could not be read with the current import settings."
+        )
+    header_line = table["lines"][0] if table["lines"] else ""
+    if "rows_lightened" in header_line:
+        rows_lightened = int(header_line.split("=")[1])
+    else:
+        rows_lightened = 1
+    return df.iloc[:, 0].to_numpy(), df.iloc[:, 1].to_numpy(), rows_lightened
@@ -26,7 +26,9 @@
 # NOTES
 #
 # 1. Yes, a lot of this stuff could have been made easier with NumPy. I've tried
-# to avoid it so people can use this code with stock python.
+# to avoid it so people can use this code with stock python. If NumPy is
+# available, the ordinates and axes are read into float64 arrays in bulk, which
+# is much faster and lighter for large map/depth-profile files.
 # 
 # 2. We implicitly assume here that any kinetic scale is given with respect to
 # the Fermi level, not the vacuum level at the spectrometer. 
@@ -40,22 +42,31 @@
 ################################################################################
 
 from __future__ import division
+from itertools import islice
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
 
 class VAMAS:
 
-	def __init__(self, filename):
-		''' Can only init by providing a VAMAS file. '''
-		
-		f = open(filename)
-		if f:
-			lines = f.readlines()
-			f.close()
-			self.LoadFromText(lines)
+	def __init__(self, filename, lazy=False):
+		''' Can only init by providing a VAMAS file. With lazy=True only an index of the blocks is built: the block
+		parameters are read, but the ordinates are skipped and only decoded by VAMASBlock.Load(). '''
+		
+		self.filename = filename
+		# The file is read line by line, so the whole text never has to be kept in memory.
+		if lazy:
+			with open(filename, 'rb') as f:
+				self.LoadFromText(LineReader(f), lazy=True)
 		else:
-			print('Error (vamas.py, VAMAS.__init__): File %s failed to open.')
+			with open(filename) as f:
+				self.LoadFromText(f)
 			
-	def LoadFromText(self, lines):
-		''' Reads VAMAS text. Format taken from Dench et al, Surf. Interface Anal. 13 (1988) p 63.'''
+	def LoadFromText(self, lines, lazy=False):
+		''' Reads VAMAS text, 'lines' can be any iterable of lines (e.g. a list or an open file). Format taken from Dench et al, Surf. Interface Anal. 13 (1988) p 63.
+		 For lazy=True, 'lines' has to be a LineReader of the file. '''
 		
 		content = iter(lines)
 		
@@ -67,7 +78,7 @@ class VAMAS:
 		
 		self.blocks = []
 		for i in range(self.header.num_blocks):
-			self.blocks.append(VAMASBlock(self.header, content)) # Block is an object
+			self.blocks.append(VAMASBlock(self.header, content, lazy=lazy, filename=getattr(self, 'filename', None))) # Block is an object
 		
 		# Should now get the experiment terminator: check.
 
@@ -154,16 +165,35 @@ class VAMASHeader:
 		
 class VAMASBlock:
 
-	def __init__(self, header, content):
+	def __init__(self, header, content, lazy=False, filename=None):
 		''' Parameter 'header' should be an initialized VAMASHeader object. 
-		 Parameter 'content' should be an iterator containing lines of text. '''
+		 Parameter 'content' should be an iterator containing lines of text, a LineReader if lazy is True.
+		 Parameter 'filename' is the file the ordinates of a lazy block are read from by Load(). '''
+		
+		self.filename = filename
+		self.offset = getattr(content, 'offset', None) # byte offset of the block, only known for a LineReader
+		self.LoadFromIterator(header, content, lazy)
+		if not lazy:
+			self.Decode()
+	
+	def Load(self):
+		''' Reads the ordinates of a block which was indexed with lazy=True and builds its axes and data. Does nothing if the block is already loaded. '''
+		
+		if self.ordinates is not None:
+			return
+		with open(self.filename, 'rb') as f:
+			f.seek(self.data_offset)
+			self.ordinates = ReadOrdinates(LineReader(f), self.num_ordinate_values)
+		self.Decode()
+	
+	def Decode(self):
+		''' Builds the axes and the data of each corresponding variable from the ordinates. '''
 		
-		self.LoadFromIterator(header, content)
-		if header.scan_mode == 'REGULAR':
+		if self.header.scan_mode == 'REGULAR':
 			self.MakeAxes()
 		self.ReorderOrdinates()
 	
-	def LoadFromIterator(self, header, content):
+	def LoadFromIterator(self, header, content, lazy=False):
 	
 		self.header = header # So we always have a link back to the header data.
 		self.name = next(content).strip()
@@ -301,11 +331,15 @@ class VAMASBlock:
 			self.minimum_ordinate_values.append(float(next(content)))
 			self.maximum_ordinate_values.append(float(next(content)))
 		
-		# The ordinates are next (FINALLY!). Just read them as a list and process later.
+		# The ordinates are next (FINALLY!). Read them in bulk and process later.
 		
-		self.ordinates = []
-		for i in range(self.num_ordinate_values):
-			self.ordinates.append(float(next(content)))
+		if lazy:
+			# only remember where the ordinates start, they are read by Load()
+			self.data_offset = content.offset
+			content.skip(self.num_ordinate_values)
+			self.ordinates = None
+		else:
+			self.ordinates = ReadOrdinates(content, self.num_ordinate_values)
 	
 	def MakeAxes(self):
 		''' Uses the abscissa data to construct binding energy and kinetic energy labels '''
@@ -318,6 +352,24 @@ class VAMASBlock:
 		# case someone messes with the source code. Int division paranoia!
 		num_ords = int(float(self.num_ordinate_values) / float(self.num_corresponding_variables))
 		
+		if isinstance(self.ordinates, list):
+			self.MakeAxesLists(num_ords)
+		else:
+			axis = self.abscissa_start + np.arange(num_ords) * self.abscissa_increment
+			self.axis = axis
+			if 'kinetic' in self.abscissa_label.lower():
+				self.kinetic_axis = axis
+				self.binding_axis = -1 * axis + self.source_energy
+			elif 'binding' in self.abscissa_label.lower():
+				self.binding_axis = axis
+				self.kinetic_axis = -1 * axis + self.source_energy
+				
+		# As a last item, calculate the dwell time per set of corresponding variables.
+		self.dwell_time = float(num_ords) / self.signal_collection_time
+		
+	def MakeAxesLists(self, num_ords):
+		''' Stock python version of MakeAxes. '''
+		
 		self.axis = []
 		for i in range(num_ords):
 			self.axis.append(self.abscissa_start + i * self.abscissa_increment)
@@ -335,14 +387,14 @@ class VAMASBlock:
 			for i in range(num_ords):
 				self.binding_axis.append(self.abscissa_start + i * self.abscissa_increment)
 				self.kinetic_axis.append( -1 * (self.abscissa_start + i * self.abscissa_increment) + self.source_energy)
-				
-		# As a last item, calculate the dwell time per set of corresponding variables.
-		self.dwell_time = float(num_ords) / self.signal_collection_time
 		
 	def ReorderOrdinates(self):
 		''' Creates a list of lists by reordering the ordinate values. In the VAMAS file if there are N corresponding variables, the ordinates are listed as 1_1, .... 1_N, 2_1, .... , 2_N, etc where for each abscissa value all the corresponding values are listed in sequence. ReorderOrdinates creates a list [[1_1, 2_1, ...], ... , [1_N, 2_N, ...]], i.e. a list each for all the corresponding variables. '''
 		
-		num_ords = int(float(self.num_ordinate_values) / float(self.num_corresponding_variables))
+		if not isinstance(self.ordinates, list):
+			# every variable is a strided slice of the ordinates, copied to a contiguous array
+			self.data = [np.ascontiguousarray(self.ordinates[i::self.num_corresponding_variables]) for i in range(self.num_corresponding_variables)]
+			return
 		
 		self.data = []
 		
@@ -352,4 +404,43 @@ class VAMASBlock:
 				tmp.append(self.ordinates[j])
 			self.data.append(tmp)
 		
-		
\ No newline at end of file
+		
+
+def ReadOrdinates(content, num_values):
+	''' Reads 'num_values' ordinate lines from the iterator 'content'. With NumPy the values are converted in bulk into a float64 array, otherwise (or if the bulk conversion fails) they are returned as a list of floats. '''
+	
+	lines = list(islice(content, num_values))
+	if len(lines) < num_values:
+		raise StopIteration
+	if np is not None:
+		try:
+			return np.array(lines, dtype=np.float64)
+		except ValueError:
+			pass
+	return [float(line) for line in lines]
+
+class LineReader:
+	''' Iterator over the lines of a file opened in binary mode, which keeps track of the byte offset of the next line. '''
+	
+	def __init__(self, f):
+		self.f = f
+		self.offset = f.tell()
+	
+	def __iter__(self):
+		return self
+	
+	def __next__(self):
+		line = self.f.readline()
+		if not line:
+			raise StopIteration
+		self.offset += len(line)
+		return line.decode('utf-8', errors='replace')
+	
+	def skip(self, num_lines):
+		''' Skips 'num_lines' lines without decoding them. '''
+		
+		for i in range(num_lines):
+			line = self.f.readline()
+			if not line:
+				raise StopIteration
+			self.offset += len(line)
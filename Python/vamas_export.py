@@ -2,78 +2,114 @@
 import sys, os, re
 import vamas
 
-def list_vms(filePath):
+def block_path(filePath, block):
+	''' Returns the path of the txt file a block is exported to. The path also serves as the name of the block in the GUI. '''
+	dir = os.path.dirname(filePath)
+	fileName = os.path.splitext(os.path.basename(filePath))[0]
+	id = block.sample + block.name
+	id = ''.join(e for e in id if e.isalnum())                                # remove special characters and leave alpha and num
+	ElemD = block.species + block.transition
+	ElemD = ''.join(e for e in ElemD if e.isalnum())                                 # remove special characters and leave alpha and num
+	return str(dir + os.sep + fileName + '_' + id + '_' + ElemD + '.txt')                                # filename exported from vms
+
+def check_scan_mode(header):
+	if header.scan_mode != 'REGULAR':
+		raise ValueError('Only VAMAS files with REGULAR scan mode are supported.')
+
+def block_pe(block):
+	''' Returns the pass energy of a XPS/UPS block, None for other techniques. '''
+	return block.analyser_pass_energy if block.technique in ['XPS', 'UPS'] else None
+
+def block_columns(block):
+	''' Returns the column labels, the energy axis and the intensities of a block. Lazy blocks are loaded first. '''
+	check_scan_mode(block.header)
+	block.Load()
+	strMode = block.abscissa_label
+	if block.abscissa_label.lower() == 'binding energy':
+		strMode = 'BE/eV'
+	if block.abscissa_label.lower() == 'kinetic energy':
+		strMode = 'KE/eV'
+	if block.abscissa_label.lower() == 'photon energy':
+		strMode = 'PE/eV'
+	if block.technique in ['XPS', 'UPS']:
+		return 'BE/eV', 'PE: ' + str(block.analyser_pass_energy) + ' eV', block.binding_axis, block.data[0]
+	return strMode, 'EE: ' + str(block.analyser_pass_energy) + ' eV', block.axis, block.data[0]
+
+def common_value(values):
+	''' Returns the value if all blocks agree on it, otherwise the list of the different values. '''
+	if values.count(values[0]) == len(values):
+		return values[0]
+	else:
+		return list(set(values))
+
+def load_vms(filePath):
+	''' Parses a VAMAS file once and returns its blocks without writing any files.
+
+	Returns (blocks, wf, hv). Each block is a tuple (path, columns, x, y, pe) with the path of block_path, the column
+	labels, the energy axis, the intensities and the pass energy (None if not XPS/UPS). wf and hv are as in get_wf and
+	get_hv. '''
 	vamas1 = vamas.VAMAS(filePath) # create instance
-	get_wf(filePath)
+	blocks = []
+	for block in vamas1.blocks:
+		xlabel, ylabel, x, y = block_columns(block)
+		blocks.append((block_path(filePath, block), [xlabel, ylabel], x, y, block_pe(block)))
+	wf = common_value([block.analyser_work_function for block in vamas1.blocks])
+	hv = common_value([block.source_energy for block in vamas1.blocks])
+	return blocks, wf, hv
+
+def index_vms(filePath):
+	''' Indexes a VAMAS file without decoding the data of its blocks.
+
+	Returns (blocks, wf, hv) like load_vms, but each block is a tuple (path, block, pe) with the lazy VAMASBlock,
+	whose data is decoded by block_data when it is needed. '''
+	vamas1 = vamas.VAMAS(filePath, lazy=True) # create index
+	check_scan_mode(vamas1.header)
+	blocks = [(block_path(filePath, block), block, block_pe(block)) for block in vamas1.blocks]
+	wf = common_value([block.analyser_work_function for block in vamas1.blocks])
+	hv = common_value([block.source_energy for block in vamas1.blocks])
+	return blocks, wf, hv
+
+def block_data(block):
+	''' Decodes a (lazy) block and returns its energy axis and intensities. '''
+	xlabel, ylabel, x, y = block_columns(block)
+	return x, y
+
+def block_text(block):
+	''' Returns the tab-delimited text of a block, built in one go from the axis and data arrays. '''
+	xlabel, ylabel, x, y = block_columns(block)
+	Text = xlabel + '\t' + ylabel + '\n'                                # header of exported txt
+	if not isinstance(x, list):
+		# tolist() converts to python floats at once, which keeps the number format of str() and is faster than formatting numpy scalars
+		x, y = x.tolist(), y.tolist()
+	Text += ''.join(map('{}\t{}\n'.format, x, y))
+	return Text
+
+def list_vms(filePath, blocks=None):
+	''' Exports the blocks of a VAMAS file to tab-delimited txt files next to the file.
+
+	'blocks' are the indices of the blocks to export, all blocks are exported if None. Blocks which are not exported
+	are not decoded. Returns the paths of the written files. '''
+	vamas1 = vamas.VAMAS(filePath, lazy=True) # create index
 	
 	print(str(vamas1.header.format))
 	print('Number of blocks: ' + str(vamas1.header.num_blocks))
-	#for x in vamas1.blocks:
-	#	print(str(x.name))
 	
-	dir = os.path.dirname(filePath)
-	fileName = os.path.basename(filePath)
-	fileName = os.path.splitext(fileName)[0]
 	list_file = []
-	#exit()
-	p = 0
-	for block in vamas1.blocks:
-		p += 1
-		id = block.sample + block.name
-		id = ''.join(e for e in id if e.isalnum())                                # remove special characters and leave alpha and num
-		print(str(p) + ' : ' + str(id))
-		
-		ElemD = block.species + block.transition
-		ElemD = ''.join(e for e in ElemD if e.isalnum())                                 # remove special characters and leave alpha and num
-		tfilePath = str(dir + os.sep + fileName + '_' + id + '_' + ElemD + '.txt')                                # filename exported from vms
-		print(tfilePath)
+	for p, block in enumerate(vamas1.blocks):
+		if blocks is not None and p not in blocks:
+			continue
+		tfilePath = block_path(filePath, block)
+		print(str(p + 1) + ' : ' + tfilePath)
 		list_file.append(tfilePath)
-		numData = int(float(block.num_ordinate_values) / float(block.num_corresponding_variables))                                # equivalent to num_ods
-		if vamas1.header.scan_mode == 'REGULAR':
-			if block.abscissa_label.lower() == 'binding energy':
-				strMode = 'BE/eV'
-			if block.abscissa_label.lower() == 'kinetic energy':
-				strMode = 'KE/eV'
-			if block.abscissa_label.lower() == 'photon energy':
-				strMode = 'PE/eV'
-		
-			Para = block.technique + ' source:' + str(block.source_energy) + ', spec:' + str(ElemD) + ', ' + strMode + ':' + str(block.abscissa_start) + ', dE:' + str(block.abscissa_increment) + ', pnts:' + str(numData)
-			print(Para)
-			if block.technique in ['XPS', 'UPS']:
-				Text = 'BE/eV' + '\t' + 'PE: ' + str(block.analyser_pass_energy) + ' eV'  + '\n'                                # header of exported txt
-			else:
-				Text = strMode + '\t' + 'EE: ' + str(block.analyser_pass_energy) + ' eV'  + '\n'
-			print(Text)
-			for j in range(numData):
-				if block.technique in ['XPS', 'UPS']:
-					x = str(block.binding_axis[j])
-				else:
-					x = str(block.axis[j])
-				y = str(block.data[0][j])
-				Text += x + '\t' + y + '\n'
-				#if j == 0 or j == numData - 1:
-				#	print(x + '\t' + y)
-			with open(tfilePath, 'w') as file:
-				file.write(str(Text))
-			file.close
+		with open(tfilePath, 'w') as file:
+			file.write(block_text(block))
 		
 	return list_file
 
 def get_wf(filePath):
 	vamas1 = vamas.VAMAS(filePath) # create instance
-	temp_wf=[]
-	for block in vamas1.blocks:
-		temp_wf.append(block.analyser_work_function)
-	if temp_wf.count(temp_wf[0]) == len(temp_wf):
-		return temp_wf[0]
-	else:
-		return list(set(temp_wf))
+	return common_value([block.analyser_work_function for block in vamas1.blocks])
+
 def get_hv(filePath):
 	vamas1 = vamas.VAMAS(filePath) # create instance
-	temp_hv=[]
-	for block in vamas1.blocks:
-		temp_hv.append(block.source_energy)
-	if temp_hv.count(temp_hv[0]) == len(temp_hv):
-		return temp_hv[0]
-	else:
-		return list(set(temp_hv))
\ No newline at end of file
+	return common_value([block.source_energy for block in vamas1.blocks])
@@ -0,0 +1,2 @@
+"""Version of LG4X-V2, shared by the GUI and the batch fitting (updated by bumpver)."""
+__version__ = "2.4.2"
@@ -0,0 +1,119 @@
+"""Compares fit_range with the loop version it replaced on the spectra of Example/ and test/."""
+import configparser
+import os
+import sys
+
+import numpy as np
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, "Python"))
+
+from batch import default_import_settings  # noqa: E402
+from fit_engine import fit_range  # noqa: E402
+from spectrum_io import load_spectrum  # noqa: E402
+
+
+def fit_range_loop(x, y, xmin, xmax):
+    # fit_range before the binary search, kept as the reference
+    if xmin > xmax:
+        xmin0 = xmin
+        xmin = xmax
+        xmax = xmin0
+
+    if x[0] < x[-1]:
+        # XAS in photon energy scale or XPS in kinetic energy scale
+        if x[0] < xmin or xmax < x[len(x) - 1]:
+            if xmax < x[len(x) - 1]:
+                for i in range(len(x) - 1, -1, -1):
+                    if x[i] <= xmax:
+                        rmidx = i
+                        break
+            else:
+                rmidx = len(x) - 1
+
+            if x[0] < xmin:
+                for i in range(0, len(x) - 1):
+                    if x[i] >= xmin:
+                        lmidx = i
+                        break
+            else:
+                lmidx = 0
+
+            xn = x[lmidx : rmidx + 1].copy()
+            yn = y[lmidx : rmidx + 1].copy()
+        else:
+            xn = x
+            yn = y
+    else:
+        # XPS in binding energy scale
+        if x[len(x) - 1] < xmin or xmax < x[0]:
+            if xmax < x[0]:
+                for i in range(0, len(x) - 1):
+                    if x[i] <= xmax:
+                        lmidx = i
+                        break
+            else:
+                lmidx = 0
+
+            if x[len(x) - 1] < xmin:
+                for i in range(len(x) - 1, -1, -1):
+                    if x[i] >= xmin:
+                        rmidx = i
+                        break
+            else:
+                rmidx = len(x) - 1
+
+            xn = x[lmidx : rmidx + 1].copy()
+            yn = y[lmidx : rmidx + 1].copy()
+        else:
+            xn = x
+            yn = y
+
+    return [xn, yn]
+
+
+def spectra():
+    config = configparser.ConfigParser()
+    config.read_dict({"Import": default_import_settings})
+    found = []
+    for folder in ["Example", "test"]:
+        for fname in sorted(os.listdir(os.path.join(root, folder))):
+            if not fname.endswith((".csv", ".txt")):
+                continue
+            try:
+                x, y, _ = load_spectrum(os.path.join(root, folder, fname), config)
+            except ValueError:
+                continue
+            found.append(pytest.param(np.asarray(x, dtype=float), np.asarray(y, dtype=float), id=f"{folder}/{fname}"))
+    return found
+
+
+@pytest.mark.parametrize("x, y", spectra())
+@pytest.mark.parametrize("direction", ["as_read", "reversed"])
+def test_fit_range_matches_loop(x, y, direction):
+    if direction == "reversed":
+        x, y = x[::-1].copy(), y[::-1].copy()
+    rng = np.random.default_rng(0)
+    lo, hi = min(x[0], x[-1]), max(x[0], x[-1])
+    margin = 0.2 * (hi - lo)
+    limits = rng.uniform(lo - margin, hi + margin, size=(300, 2))
+    # limits on data points and ranges completely outside the data
+    limits = np.vstack(
+        [
+            limits,
+            rng.choice(x, size=(50, 2)),
+            [[lo - 2 * margin, lo - margin], [hi + margin, hi + 2 * margin], [lo - margin, hi + margin], [hi, hi]],
+        ]
+    )
+    for xmin, xmax in limits:
+        xn, yn = fit_range(x, y, xmin, xmax)
+        try:
+            xn_loop, yn_loop = fit_range_loop(x, y, xmin, xmax)
+        except UnboundLocalError:
+            # the loop version fails if no point or only the last point is in the range
+            assert len(xn) <= 1
+            assert np.all((min(xmin, xmax) <= xn) & (xn <= max(xmin, xmax)))
+            continue
+        np.testing.assert_array_equal(xn, xn_loop)
+        np.testing.assert_array_equal(yn, yn_loop)
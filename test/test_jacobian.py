@@ -0,0 +1,94 @@
+"""Compares the analytic derivatives of the ModelJacobian with central differences."""
+import os
+import sys
+
+import numpy as np
+import pytest
+from lmfit import lineshapes
+from lmfit.models import GaussianModel
+from lmfitxps import lineshapes as xps_lineshapes
+from lmfitxps.models import ConvGaussianDoniachSinglett
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Python"))
+
+from fit_engine import jacobian_functions, ModelJacobian  # noqa: E402
+
+shape_params = {
+    lineshapes.gaussian: dict(amplitude=1000.0, center=88.3, sigma=0.4),
+    lineshapes.lorentzian: dict(amplitude=1000.0, center=88.3, sigma=0.4),
+    lineshapes.voigt: dict(amplitude=1000.0, center=88.3, sigma=0.4, gamma=0.2),
+    lineshapes.pvoigt: dict(amplitude=1000.0, center=88.3, sigma=0.4, fraction=0.3),
+    lineshapes.doniach: dict(amplitude=1000.0, center=88.3, sigma=0.4, gamma=0.1),
+    xps_lineshapes.doniach: dict(amplitude=1000.0, center=88.3, sigma=0.4, gamma=0.1),
+    xps_lineshapes.singlett: dict(amplitude=1000.0, sigma=0.3, gamma=0.05, gaussian_sigma=0.4, center=88.3),
+    xps_lineshapes.dublett: dict(
+        amplitude=1000.0,
+        sigma=0.3,
+        gamma=0.05,
+        gaussian_sigma=0.4,
+        center=88.3,
+        soc=3.67,
+        height_ratio=0.75,
+        fct_coster_kronig=1.2,
+    ),
+}
+
+
+def central_difference(func, x, params, name):
+    step = 1e-6 * max(abs(params[name]), 1.0)
+    above = dict(params, **{name: params[name] + step})
+    below = dict(params, **{name: params[name] - step})
+    return (func(x, **above) - func(x, **below)) / (2 * step)
+
+
+def test_all_shapes_covered():
+    assert set(jacobian_functions) == set(shape_params)
+
+
+@pytest.mark.parametrize("func", list(shape_params), ids=lambda func: f"{func.__module__}.{func.__name__}")
+@pytest.mark.parametrize("descending", [False, True], ids=["ascending", "descending"])
+def test_shape_derivatives(func, descending):
+    x = np.linspace(80.0, 96.0, 400)
+    if descending:
+        x = x[::-1]
+    params = shape_params[func]
+    partials = jacobian_functions[func](x, **params)
+    for name in params:
+        numeric = central_difference(func, x, params, name)
+        np.testing.assert_allclose(partials[name], numeric, rtol=0, atol=1e-6 * np.max(np.abs(numeric)))
+
+
+def test_linked_components():
+    # the second peak is linked to the first by the amplitude ratio and the center difference, its derivatives are
+    # chained to the variables of the first peak
+    x = np.linspace(96.0, 80.0, 300)
+    model = ConvGaussianDoniachSinglett(prefix="gds1_") + ConvGaussianDoniachSinglett(prefix="gds2_") + GaussianModel(
+        prefix="g3_"
+    )
+    params = model.make_params()
+    for prefix, center in (("gds1_", 84.0), ("gds2_", 87.7)):
+        params[prefix + "amplitude"].set(value=1000.0, min=0)
+        params[prefix + "sigma"].set(value=0.3, min=0)
+        params[prefix + "gamma"].set(value=0.05, min=0, max=1)
+        params[prefix + "gaussian_sigma"].set(value=0.4, min=0)
+        params[prefix + "center"].set(value=center)
+    params["g3_amplitude"].set(value=200.0)
+    params["g3_center"].set(value=90.0)
+    params["g3_sigma"].set(value=1.0)
+    params.add("ratio", value=0.75)
+    params.add("diff", value=3.67)
+    params["gds2_amplitude"].set(expr="gds1_amplitude * ratio")
+    params["gds2_center"].set(expr="gds1_center + diff")
+    data = model.eval(params, x=x) + 5.0
+    weights = np.ones_like(x)
+    jac = ModelJacobian(model)(params, data, weights, x=x)
+    var_names = [name for name, par in params.items() if par.vary]
+    for row, name in enumerate(var_names):
+        step = 1e-6 * max(abs(params[name].value), 1.0)
+        shifted = params.copy()
+        shifted[name].set(value=params[name].value + step)
+        above = model._residual(shifted, data, weights, x=x)
+        shifted[name].set(value=params[name].value - step)
+        below = model._residual(shifted, data, weights, x=x)
+        numeric = (above - below) / (2 * step)
+        np.testing.assert_allclose(jac[row], numeric, rtol=0, atol=1e-6 * max(np.max(np.abs(numeric)), 1e-12))
@@ -0,0 +1,134 @@
+"""Compares the models and parameters built from the model cache with new builds."""
+import copy
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, "Python"))
+
+from fit_engine import build_model, model_cache  # noqa: E402
+
+
+def make_preset(bgs, shapes, centers, amplitude, sigma, gamma, fixed=()):
+    # the rows of the component table: checkbox/reference and value of each component
+    column = [[0, 0]] + [[0, ""] for _ in range(26)]
+    column[3] = [0, gamma]
+    column[4] = [0, sigma]
+    column[5] = [0, 0.05]
+    column[6] = [0, 0.5]
+    column[7] = [0, 0.0]
+    column[8] = [0, 0.0]
+    column[9] = [0, 0.026]
+    column[10] = [0, 3.67]
+    column[11] = [0, 0.75]
+    column[12] = [0, 1.0]
+    for row in range(13, 27, 2):
+        column[row] = ["", 0]
+    peaks = [[] for _ in column]
+    for index_pk, (shape, center) in enumerate(zip(shapes, centers)):
+        values = copy.deepcopy(column)
+        values[0][1] = shape
+        values[1] = [2 if (index_pk, 1) in fixed else 0, center]
+        values[2] = [2 if (index_pk, 2) in fixed else 0, amplitude]
+        for row in range(len(values)):
+            peaks[row] += values[row]
+    limits = [[0, "", ""] * len(shapes) for _ in range(19)]
+    bg = [
+        ["", 1e-06, "", 10.0, 2, 0.0003, 2, 1000.0, "", ""],
+        [2, 2866.0, "", 1643.0, "", 1.0, "", 1.0, "", 50.0],
+        [2, 0.0, 2, 0.0, 2, 0.0, 2, 0.0, 2, 0.0],
+        [2, 0.0, 0, "", 0, "", 0, "", 0, ""],
+        [0, "", 0, "", 0, "", 0, "", 0, ""],
+        [0, "", 0, "", 0, "", 0, "", 0, ""],
+        [0, "", 0, "", 0, "", 0, "", 0, ""],
+    ]
+    return [[bgs, "", "", 1486.6, 4.0, 0.0], bg, peaks, limits, [""] + [f"C_{i + 1}" for i in range(len(shapes))]]
+
+
+def link(pre, index_pk, target, center_diff, amp_ratio):
+    pre[2][13][2 * index_pk + 1] = target
+    pre[2][14][2 * index_pk + 1] = center_diff
+    pre[2][15][2 * index_pk + 1] = target
+    pre[2][16][2 * index_pk + 1] = amp_ratio
+
+
+def limit(pre, index_pk, row, low, high):
+    pre[3][row][3 * index_pk : 3 * index_pk + 3] = [2, low, high]
+
+
+def presets(bgs, shapes, rng):
+    # two presets with the same structure, different values, fixed parameters and limits which exclude the values of
+    # the other preset
+    found = []
+    for fixed, center, sigma in [(((0, 1), (1, 2)), 85.0, 0.3), ((), 90.0, 0.8)]:
+        pre = make_preset(
+            bgs,
+            shapes,
+            list(center + rng.uniform(-1.0, 1.0, len(shapes))),
+            float(rng.uniform(500.0, 5000.0)),
+            sigma,
+            float(rng.uniform(0.01, 0.3)),
+            fixed=fixed,
+        )
+        link(pre, 1, 1, float(rng.uniform(1.0, 4.0)), float(rng.uniform(0.3, 1.0)))
+        limit(pre, 0, 0, pre[2][1][1] - 0.5, pre[2][1][1] + 0.5)
+        limit(pre, 0, 3, sigma - 0.1, sigma + 0.1)
+        found.append(pre)
+    return found
+
+
+def state(pars):
+    return [
+        (name, par.value, par.min, par.max, par.vary, par.expr) for name, par in copy.deepcopy(pars).items()
+    ]
+
+
+@pytest.fixture
+def spectrum():
+    data = pd.read_csv(os.path.join(root, "test", "Highres_Au4f_hv_180_testfile.csv"), header=None)
+    x, y = data[0].to_numpy(dtype=float), data[1].to_numpy(dtype=float)
+    keep = (x > 82.0) & (x < 94.0)
+    return x[keep], y[keep]
+
+
+@pytest.mark.parametrize(
+    "bgs, shapes",
+    [([0], [10, 10]), ([2], [2, 6, 0]), ([100, 3], [11, 11]), ([1, 6], [3, 1]), ([5], [4, 12])],
+)
+@pytest.mark.parametrize("mode", ["fit", "eva"])
+@pytest.mark.parametrize("binding_ener", [False, True])
+def test_cached_build_matches_new_build(spectrum, bgs, shapes, mode, binding_ener):
+    x, y = spectrum
+    if binding_ener:
+        x, y = x[::-1].copy(), y[::-1].copy()
+    first, second = presets(bgs, shapes, np.random.default_rng(len(shapes)))
+    model_cache.clear()
+    build_model(x, y, copy.deepcopy(first), mode=mode, binding_ener=binding_ener)
+    mod, pars, static_bg = build_model(x, y, copy.deepcopy(second), mode=mode, binding_ener=binding_ener)
+    assert model_cache.hits == 1
+    model_cache.clear()
+    new_mod, new_pars, new_static_bg = build_model(x, y, copy.deepcopy(second), mode=mode, binding_ener=binding_ener)
+    assert model_cache.hits == 0
+    assert [component.prefix for component in mod.components] == [
+        component.prefix for component in new_mod.components
+    ]
+    np.testing.assert_array_equal(mod.eval(pars, x=x, y=y), new_mod.eval(new_pars, x=x, y=y))
+    np.testing.assert_array_equal(static_bg, new_static_bg)
+    assert state(pars) == state(new_pars)
+
+
+def test_parameters_are_copies(spectrum):
+    x, y = spectrum
+    pre = presets([2], [10, 10], np.random.default_rng(0))[0]
+    model_cache.clear()
+    _, pars, _ = build_model(x, y, copy.deepcopy(pre))
+    expected = state(pars)
+    pars["gdd1_center"].set(value=80.0, min=79.0, max=81.0, vary=False)
+    _, cached_pars, _ = build_model(x, y, copy.deepcopy(pre))
+    assert model_cache.hits == 1
+    assert cached_pars is not pars
+    assert state(cached_pars) == expected